@@ -5,7 +5,7 @@ Michael Smith
 Peter Dingue
 Kathy Doan
 
-v4_client.py - Go-Back-N Client for EECE 4830-5830 Network Design Project Phase 4
+v4_client.py - Go-Back-N / Selective Repeat Client for EECE 4830-5830 Network Design Project Phase 4
 Simulation Modes:
     1: No errors.
     2: Simulated ACK packet bit-errors.
@@ -20,15 +20,19 @@ if the timer expires, all packets in the window are retransmitted.
 When loss recovery is disabled, the client sends each packet once and then sends "END" immediately.
 ACK errors in modes 2 and 4 are now simulated by returning a random value in the range [base, correct_ack - 1]
 (without duplicate ACK detection), ensuring the returned ACK is always less than the correct value.
+
+With protocol=PROTOCOL_SR the client runs Selective Repeat instead: every segment has its own
+timer and is resent alone when it expires, and the server ACKs each segment individually.
+A corrupted or lost ACK is simply dropped, since a per-segment ACK cannot be guessed from a lower one.
 """
 
 import socket
 import time
-import os
 import select
 import random
 import logging
-from v4_udp_helpers import make_packet
+from v4_udp_helpers import PacketSource, PROTOCOL_GBN, PROTOCOL_SR
+from v4_timer_wheel import TimerWheel
 
 # Configure logging if not already configured.
 if not logging.getLogger().hasHandlers():
@@ -57,9 +61,85 @@ TIMEOUT = 0.01  # Timeout value in seconds
 WINDOW_SIZE = 10  # Fixed window size for Go-Back-N
 
 
-def send_file(simulation_mode, error_rate, loss_recovery=True):
+def send_selective_repeat(client_socket, packet_source, simulation_mode, error_rate):
+    """
+    Selective Repeat sender loop. Each unacknowledged segment in the window keeps its
+    own timer on a TimerWheel and only that segment is retransmitted when it expires.
+    Returns the number of retransmissions.
     """
-    Reads the file and sends it in packets using the Go-Back-N protocol.
+    base = 0
+    next_seq = 0
+    packets = {}  # Buffer: sequence number -> packet, for segments not yet ACKed
+    # One timer per unacknowledged segment. The wheel also tells select how long it may sleep.
+    wheel = TimerWheel()
+    timers = {}  # Sequence number -> its Timer handle
+    acked = set()  # ACKed segments above base
+    file_end = False
+    total_retransmissions = 0
+
+    while True:
+        # Send new packets if window is not full and file is not finished.
+        while next_seq < base + WINDOW_SIZE and not file_end:
+            packet = packet_source.packet(next_seq)
+            if packet is None:
+                file_end = True
+                break
+            client_socket.sendto(packet, (SERVER_ADDRESS, SERVER_PORT))
+            logger.debug(f"Packet {next_seq} sent")
+            packets[next_seq] = packet
+            timers[next_seq] = wheel.arm(time.monotonic() + TIMEOUT, next_seq)
+            next_seq += 1
+
+        # Check for incoming ACKs, waiting at most until the next timer is due.
+        deadline = wheel.next_deadline()
+        wait = TIMEOUT if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            ready = select.select([client_socket], [], [], wait)[0]
+        except Exception:
+            ready = []
+        if ready:
+            try:
+                ack_data, _ = client_socket.recvfrom(2048)
+                try:
+                    ack_num = int(ack_data.decode())
+                except:
+                    ack_num = -1
+
+                # Modes 2 and 4: a corrupted or lost ACK never reaches the window logic.
+                if simulation_mode in (2, 4) and random.random() < error_rate:
+                    logger.debug(f"Simulating ACK {'bit-error' if simulation_mode == 2 else 'loss'} for ACK {ack_num}")
+                    time.sleep(.002)
+                    ack_num = -1
+
+                if base <= ack_num < next_seq and ack_num not in acked:
+                    logger.debug(f"ACK {ack_num} received")
+                    acked.add(ack_num)
+                    del packets[ack_num]
+                    wheel.cancel(timers.pop(ack_num))
+                    # Slide the window past every ACKed segment at the bottom
+                    while base in acked:
+                        acked.remove(base)
+                        base += 1
+            except Exception as e:
+                logger.debug(f"Error receiving ACK: {e}")
+
+        # Retransmit only the segments whose own timer expired.
+        now = time.monotonic()
+        for seq in wheel.expire(now):
+            logger.debug(f"Timeout occurred for packet {seq}, retransmitting it")
+            client_socket.sendto(packets[seq], (SERVER_ADDRESS, SERVER_PORT))
+            wheel.rearm(timers[seq], now + TIMEOUT)
+            total_retransmissions += 1
+
+        if file_end and base == next_seq:
+            client_socket.sendto("END".encode(), (SERVER_ADDRESS, SERVER_PORT))
+            return total_retransmissions
+
+
+def send_file(simulation_mode, error_rate, loss_recovery=True, packet_source=None, protocol=PROTOCOL_GBN):
+    """
+    Reads the file and sends it in packets using the Go-Back-N protocol,
+    or Selective Repeat when protocol is PROTOCOL_SR.
     When loss recovery is enabled, the client uses a sliding window mechanism,
     a timer, and retransmits on timeout.
     When disabled, it sends each packet once.
@@ -68,8 +148,14 @@ def send_file(simulation_mode, error_rate, loss_recovery=True):
       2: Simulate ACK packet bit-errors.
       4: Simulate ACK packet loss.
 
+    A PacketSource built once for FILE_TO_SEND can be passed in and shared across runs.
+
     Returns a tuple: (client_completion_time, total_retransmissions, throughput in bytes/s).
     """
+    owns_source = packet_source is None
+    if owns_source:
+        packet_source = PacketSource(FILE_TO_SEND, PACKET_SIZE)
+
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     if loss_recovery:
         client_socket.setblocking(False)
@@ -77,17 +163,21 @@ def send_file(simulation_mode, error_rate, loss_recovery=True):
     start_time = time.time()
     total_retransmissions = 0
 
-    if loss_recovery:
+    if loss_recovery and protocol == PROTOCOL_SR:
+        total_retransmissions = send_selective_repeat(client_socket, packet_source, simulation_mode, error_rate)
+    elif loss_recovery:
         base = 0
         next_seq = 0
         packets = {}  # Buffer: sequence number -> packet
-        timer = None  # Timer for the oldest unacknowledged packet
+        # Timer for the oldest unacknowledged packet. The wheel also tells select how long it may sleep.
+        wheel = TimerWheel()
+        timer = None
         file_end = False
 
         while True:
             # Send new packets if window is not full and file is not finished.
             while next_seq < base + WINDOW_SIZE and not file_end:
-                packet = make_packet(FILE_TO_SEND, next_seq, PACKET_SIZE)
+                packet = packet_source.packet(next_seq)
                 if packet is None:
                     file_end = True
                     break
@@ -95,12 +185,14 @@ def send_file(simulation_mode, error_rate, loss_recovery=True):
                 logger.debug(f"Packet {next_seq} sent")
                 packets[next_seq] = packet
                 if base == next_seq:
-                    timer = time.time()
+                    timer = wheel.arm(time.monotonic() + TIMEOUT, "base")
                 next_seq += 1
 
-            # Check for incoming ACKs.
+            # Check for incoming ACKs, waiting at most until the timer is due.
+            deadline = wheel.next_deadline()
+            wait = TIMEOUT if deadline is None else max(0.0, deadline - time.monotonic())
             try:
-                ready = select.select([client_socket], [], [], 0.01)[0]
+                ready = select.select([client_socket], [], [], wait)[0]
             except Exception:
                 ready = []
             if ready:
@@ -136,20 +228,20 @@ def send_file(simulation_mode, error_rate, loss_recovery=True):
                         logger.debug(f"ACK {ack_num} received, sliding window")
                         base = ack_num + 1
                         if base == next_seq:
-                            timer = None
+                            wheel.cancel(timer)
                         else:
-                            timer = time.time()
+                            wheel.rearm(timer, time.monotonic() + TIMEOUT)
                     # If the received ACK is less than base, ignore it.
                 except Exception as e:
                     logger.debug(f"Error receiving ACK: {e}")
 
             # Check for timeout on the base packet.
-            if timer is not None and (time.time() - timer) > TIMEOUT:
+            if wheel.expire(time.monotonic()):
                 logger.debug(f"Timeout occurred. Retransmitting packets from {base} to {next_seq - 1}")
                 for seq in range(base, next_seq):
                     client_socket.sendto(packets[seq], (SERVER_ADDRESS, SERVER_PORT))
                     total_retransmissions += 1
-                timer = time.time()
+                wheel.rearm(timer, time.monotonic() + TIMEOUT)
 
             if file_end and base == next_seq:
                 client_socket.sendto("END".encode(), (SERVER_ADDRESS, SERVER_PORT))
@@ -158,7 +250,7 @@ def send_file(simulation_mode, error_rate, loss_recovery=True):
         # Loss recovery disabled: send each packet once without waiting for ACKs.
         next_seq = 0
         while True:
-            packet = make_packet(FILE_TO_SEND, next_seq, PACKET_SIZE)
+            packet = packet_source.packet(next_seq)
             if packet is None:
                 break
             client_socket.sendto(packet, (SERVER_ADDRESS, SERVER_PORT))
@@ -170,8 +262,10 @@ def send_file(simulation_mode, error_rate, loss_recovery=True):
     end_time = time.time()
     client_socket.close()
     completion_time = end_time - start_time
-    file_size = os.path.getsize(FILE_TO_SEND)
+    file_size = packet_source.file_size
     throughput = file_size / completion_time
+    if owns_source:
+        packet_source.close()
     logger.debug(
         f"File sent in {completion_time:.2f} seconds with {total_retransmissions} retransmissions. Throughput: {throughput:.2f} bytes/s.")
     return completion_time, total_retransmissions, throughput
@@ -8,6 +8,8 @@ Kathy Doan
 v4_harness.py - Test harness to run the Go-Back-N client and server for multiple error rates.
 This script coordinates the file transfer for each error rate (from 0% to 60% in 5% increments)
 and plots the average completion times, average retransmission counts, and average throughput over several runs.
+Each run is repeated for every protocol in PROTOCOLS (Go-Back-N and Selective Repeat) and the
+two are plotted side by side for every simulation mode.
 Simulation Modes:
     1: No errors.
     2: Simulated ACK packet bit-errors.
@@ -16,11 +18,13 @@ Simulation Modes:
     5: Simulated DATA packet loss.
 """
 
+import os
 import threading
 import time
 import matplotlib.pyplot as plt
 import matplotlib
 import logging
+from v4_udp_helpers import PROTOCOL_GBN, PROTOCOL_SR, PROTOCOL_NAMES
 
 if not logging.getLogger().hasHandlers():
     logging.basicConfig(
@@ -44,23 +48,37 @@ SERVER_PORT = 12000
 SIMULATION_MODES = [1, 2, 3, 4, 5]
 ERROR_RATES = [i/100.0 for i in range(0, 65, 5)]
 TRIALS = 3
+PROTOCOLS = [PROTOCOL_GBN, PROTOCOL_SR]
+PLOTS_DIR = "plots"
 
 mode_labels = {1: "None", 2: "Ack", 3: "Data", 4: "ACK Loss", 5: "Data Loss"}
 LOSS_RECOVERY_ENABLED = True
 
-def run_single_transfer(simulation_mode: int, error_rate: float):
+# Packet table for the client's FILE_TO_SEND, built once and shared by every run
+packet_source = None
+
+def get_packet_source():
+    global packet_source
+    if packet_source is None:
+        from v4_client import FILE_TO_SEND, PACKET_SIZE
+        from v4_udp_helpers import PacketSource
+        packet_source = PacketSource(FILE_TO_SEND, PACKET_SIZE)
+    return packet_source
+
+def run_single_transfer(simulation_mode: int, error_rate: float, protocol: str = PROTOCOL_GBN):
     server_completion_time = None
     client_metrics = None
 
     def server_thread():
         nonlocal server_completion_time
         from v4_server import run_server
-        server_completion_time = run_server(simulation_mode, error_rate)
+        server_completion_time = run_server(simulation_mode, error_rate, protocol=protocol)
 
     def client_thread():
         nonlocal client_metrics
         from v4_client import send_file
-        client_metrics = send_file(simulation_mode, error_rate, loss_recovery=LOSS_RECOVERY_ENABLED)
+        client_metrics = send_file(simulation_mode, error_rate, loss_recovery=LOSS_RECOVERY_ENABLED,
+                                   packet_source=get_packet_source(), protocol=protocol)
 
     server = threading.Thread(target=server_thread)
     client = threading.Thread(target=client_thread)
@@ -71,16 +89,33 @@ def run_single_transfer(simulation_mode: int, error_rate: float):
     server.join()
     return server_completion_time, client_metrics
 
+def plot_protocol_comparison(error_percentages, results, title, ylabel, file_name):
+    # One subplot per simulation mode with a line per protocol, so GBN and SR sit side by side
+    fig, axes = plt.subplots(1, len(SIMULATION_MODES), figsize=(4 * len(SIMULATION_MODES), 4), sharey=True)
+    for axis, mode in zip(axes, SIMULATION_MODES):
+        for protocol in PROTOCOLS:
+            axis.plot(error_percentages, results[protocol][mode], marker='o', label=PROTOCOL_NAMES[protocol])
+        axis.set_title(mode_labels[mode])
+        axis.set_xlabel("Error Rate (%)")
+        axis.grid(True)
+    axes[0].set_ylabel(ylabel)
+    axes[0].legend()
+    fig.suptitle(f"{title} (Trials: {TRIALS})")
+    fig.tight_layout()
+    os.makedirs(PLOTS_DIR, exist_ok=True)
+    fig.savefig(os.path.join(PLOTS_DIR, file_name))
+
 def main():
     logger.debug("Starting tests for simulation modes: " + str(SIMULATION_MODES))
-    all_avg_server_times = {mode: [] for mode in SIMULATION_MODES}
-    all_avg_client_times = {mode: [] for mode in SIMULATION_MODES}
-    all_avg_retransmissions = {mode: [] for mode in SIMULATION_MODES}
-    all_avg_throughput = {mode: [] for mode in SIMULATION_MODES}
+    # Results are kept per protocol, the single-protocol plots below use Go-Back-N
+    all_avg_server_times = {protocol: {mode: [] for mode in SIMULATION_MODES} for protocol in PROTOCOLS}
+    all_avg_client_times = {protocol: {mode: [] for mode in SIMULATION_MODES} for protocol in PROTOCOLS}
+    all_avg_retransmissions = {protocol: {mode: [] for mode in SIMULATION_MODES} for protocol in PROTOCOLS}
+    all_avg_throughput = {protocol: {mode: [] for mode in SIMULATION_MODES} for protocol in PROTOCOLS}
     error_percentages = [int(er * 100) for er in ERROR_RATES]
 
-    for mode in SIMULATION_MODES:
-        logger.debug(f"\n=== Testing Simulation Mode {mode} ===")
+    for protocol, mode in [(protocol, mode) for protocol in PROTOCOLS for mode in SIMULATION_MODES]:
+        logger.debug(f"\n=== Testing {PROTOCOL_NAMES[protocol]}, Simulation Mode {mode} ===")
         for er in ERROR_RATES:
             logger.debug(f"  Error rate: {er*100:.0f}%")
             server_times = []
@@ -89,7 +124,7 @@ def main():
             throughput_vals = []
             for trial in range(1, TRIALS + 1):
                 logger.debug(f"    Run {trial}")
-                s_time, client_metrics = run_single_transfer(mode, er)
+                s_time, client_metrics = run_single_transfer(mode, er, protocol)
                 server_times.append(s_time)
                 client_times.append(client_metrics[0])
                 retransmissions.append(client_metrics[1])
@@ -103,17 +138,24 @@ def main():
             logger.debug(f"  Average client time at {er*100:.0f}% error: {avg_client_time:.2f} sec")
             logger.debug(f"  Average retransmissions at {er*100:.0f}% error: {avg_retransmissions:.2f}")
             logger.debug(f"  Average throughput at {er*100:.0f}% error: {avg_throughput:.2f} bytes/s")
-            all_avg_server_times[mode].append(avg_server_time)
-            all_avg_client_times[mode].append(avg_client_time)
-            all_avg_retransmissions[mode].append(avg_retransmissions)
-            all_avg_throughput[mode].append(avg_throughput)
+            all_avg_server_times[protocol][mode].append(avg_server_time)
+            all_avg_client_times[protocol][mode].append(avg_client_time)
+            all_avg_retransmissions[protocol][mode].append(avg_retransmissions)
+            all_avg_throughput[protocol][mode].append(avg_throughput)
+
+    plot_protocol_comparison(error_percentages, all_avg_client_times, "Completion Time vs Error Rate",
+                             "Completion Time (s)", "gbn_vs_sr_completion.png")
+    plot_protocol_comparison(error_percentages, all_avg_retransmissions, "Retransmissions vs Error Rate",
+                             "Average Retransmissions", "gbn_vs_sr_retransmissions.png")
+    plot_protocol_comparison(error_percentages, all_avg_throughput, "Throughput vs Error Rate",
+                             "Throughput (bytes/s)", "gbn_vs_sr_throughput.png")
 
     from v4_server import plot_performance
-    plot_performance(error_percentages, all_avg_server_times, SIMULATION_MODES, TRIALS)
+    plot_performance(error_percentages, all_avg_server_times[PROTOCOL_GBN], SIMULATION_MODES, TRIALS)
 
     plt.figure(figsize=(10, 5))
     for mode in SIMULATION_MODES:
-        plt.plot(error_percentages, all_avg_retransmissions[mode], marker='o', label=mode_labels[mode])
+        plt.plot(error_percentages, all_avg_retransmissions[PROTOCOL_GBN][mode], marker='o', label=mode_labels[mode])
     plt.title("Average Retransmissions vs Error Rate")
     plt.xlabel("Error Rate (%)")
     plt.ylabel("Average Retransmissions")
@@ -123,7 +165,7 @@ def main():
 
     plt.figure(figsize=(10, 5))
     for mode in SIMULATION_MODES:
-        plt.plot(error_percentages, all_avg_throughput[mode], marker='o', label=mode_labels[mode])
+        plt.plot(error_percentages, all_avg_throughput[PROTOCOL_GBN][mode], marker='o', label=mode_labels[mode])
     plt.title("Average Throughput vs Error Rate")
     plt.xlabel("Error Rate (%)")
     plt.ylabel("Throughput (bytes/s)")
@@ -5,7 +5,7 @@ Michael Smith
 Peter Dingue
 Kathy Doan
 
-v4_server.py - Go-Back-N Server for EECE 4830-5830 Network Design Project Phase 4
+v4_server.py - Go-Back-N / Selective Repeat Server for EECE 4830-5830 Network Design Project Phase 4
 Simulation Modes:
     1: No errors.
     2: ACK packet bit-error.
@@ -14,6 +14,8 @@ Simulation Modes:
     5: Data packet loss.
 
 The server accepts packets in order and sends cumulative ACKs.
+With protocol=PROTOCOL_SR it ACKs every valid segment individually and buffers segments
+that arrive out of order, up to RECEIVE_WINDOW ahead of the next expected one.
 """
 
 import os
@@ -24,7 +26,7 @@ import matplotlib
 matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
 import logging
-from v4_udp_helpers import checksum, flip_bit
+from v4_udp_helpers import checksum, flip_bit, ReceiveRing, SegmentSink, PROTOCOL_GBN, PROTOCOL_SR
 
 if not logging.getLogger().hasHandlers():
     logging.basicConfig(
@@ -47,24 +49,24 @@ random.seed(123)
 SERVER_PORT = 12000
 BUFFER_SIZE = 2048
 OUTPUT_FOLDER = "cat"
+PACKET_SIZE = 1024  # must match the client's PACKET_SIZE, seq * PACKET_SIZE is the file offset
+HEADER_SCAN = 24  # "seq|checksum|" always fits in the first 24 bytes
+RECEIVE_WINDOW = 10  # Selective Repeat receive buffer, matches the client's WINDOW_SIZE
 
 def receive_packet(data, client_address, server_socket, simulation_mode, error_rate,
                    expected_seq, last_valid_ack):
-    try:
-        decoded_message = data.decode(errors='ignore')
-        if decoded_message == "END":
-            server_socket.sendto("ACK".encode(), client_address)
-            return None, False, None, True
-    except:
-        pass
+    # data is a memoryview into the receive ring, only the short header is copied to parse it
+    if len(data) == 3 and data == b"END":
+        server_socket.sendto("ACK".encode(), client_address)
+        return None, False, None, True
 
     try:
-        parts = data.split(b'|', 2)
+        parts = bytes(data[:HEADER_SCAN]).split(b'|', 2)
         if len(parts) < 3:
             raise ValueError("Malformed packet")
         sequence_number = int(parts[0])
         checksum_value = int(parts[1])
-        payload = parts[2]
+        payload = data[len(parts[0]) + len(parts[1]) + 2:]
     except Exception as e:
         logger.debug(f"Error parsing packet: {e}")
         server_socket.sendto(str(last_valid_ack).encode(), client_address)
@@ -91,21 +93,81 @@ def receive_packet(data, client_address, server_socket, simulation_mode, error_r
         server_socket.sendto(str(last_valid_ack).encode(), client_address)
         return sequence_number, False, b"", False
 
-def run_server(simulation_mode, error_rate):
+def receive_packet_sr(data, client_address, server_socket, simulation_mode, error_rate, expected_seq):
+    # Selective Repeat receiver: returns (sequence_number, payload, finished).
+    # sequence_number is None unless the segment is valid and inside the receive window.
+    if len(data) == 3 and data == b"END":
+        server_socket.sendto("ACK".encode(), client_address)
+        return None, b"", True
+
+    try:
+        parts = bytes(data[:HEADER_SCAN]).split(b'|', 2)
+        if len(parts) < 3:
+            raise ValueError("Malformed packet")
+        sequence_number = int(parts[0])
+        checksum_value = int(parts[1])
+        payload = data[len(parts[0]) + len(parts[1]) + 2:]
+    except Exception as e:
+        logger.debug(f"Error parsing packet: {e}")
+        return None, b"", False
+
+    # A lost or corrupted segment gets no ACK, its own timer at the client resends it
+    if simulation_mode == 5 and random.random() < error_rate:
+        logger.debug(f"Simulating DATA packet loss for packet {sequence_number}")
+        return None, b"", False
+
+    if simulation_mode == 3 and random.random() < error_rate:
+        logger.debug(f"Simulating DATA bit-error for packet {sequence_number}")
+        payload = flip_bit(payload)
+
+    if checksum(payload) != checksum_value:
+        logger.debug(f"Checksum mismatch for packet {sequence_number}")
+        return None, b"", False
+
+    if expected_seq - RECEIVE_WINDOW <= sequence_number < expected_seq + RECEIVE_WINDOW:
+        # Segments below expected_seq were already delivered, ACK them again in case the first ACK was lost
+        server_socket.sendto(str(sequence_number).encode(), client_address)
+        if sequence_number >= expected_seq:
+            return sequence_number, payload, False
+    return None, b"", False
+
+def run_server(simulation_mode, error_rate, protocol=PROTOCOL_GBN):
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     server_socket.bind(("", SERVER_PORT))
     logger.debug(f"Server listening on port {SERVER_PORT} with simulation mode {simulation_mode} and error rate {error_rate * 100:.0f}%")
 
-    file_data = bytearray()
+    ring = ReceiveRing(server_socket, slot_size=BUFFER_SIZE)
+    # Accepted segments are streamed straight to their offset in the output file
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    error_percent = int(error_rate * 100)
+    output_file = os.path.join(OUTPUT_FOLDER, f"transmitted_cat_mode{simulation_mode}_error{error_percent}.bmp")
+    sink = SegmentSink(output_file, PACKET_SIZE)
     expected_seq = 0
     last_valid_ack = -1
+    out_of_order = set()  # Selective Repeat: segments already written above expected_seq
     finished = False
     start_time = time.time()
 
     while not finished:
         try:
-            message, client_address = server_socket.recvfrom(BUFFER_SIZE)
+            message, client_address = ring.recv()
             logger.debug(f"Received packet for expected_seq {expected_seq}")
+            if protocol == PROTOCOL_SR:
+                seq_num, payload, finished = receive_packet_sr(
+                    message,
+                    client_address,
+                    server_socket,
+                    simulation_mode,
+                    error_rate,
+                    expected_seq
+                )
+                if seq_num is not None and seq_num not in out_of_order:
+                    sink.write(seq_num, payload)
+                    out_of_order.add(seq_num)
+                    while expected_seq in out_of_order:
+                        out_of_order.remove(expected_seq)
+                        expected_seq += 1
+                continue
             seq_num, in_order, payload, finished = receive_packet(
                 message,
                 client_address,
@@ -119,18 +181,13 @@ def run_server(simulation_mode, error_rate):
                 break
             if seq_num is not None and in_order:
                 logger.debug(f"Packet {seq_num} accepted. Moving to next sequence.")
-                file_data.extend(payload)
+                sink.write(seq_num, payload)
                 last_valid_ack = seq_num
                 expected_seq += 1
         except Exception as e:
             logger.debug(f"Server error: {e}")
 
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    error_percent = int(error_rate * 100)
-    output_file = os.path.join(OUTPUT_FOLDER, f"transmitted_cat_mode{simulation_mode}_error{error_percent}.bmp")
-    with open(output_file, "wb") as f:
-        f.write(file_data)
-
+    sink.close()
     server_socket.close()
     completion_time = time.time() - start_time
     logger.debug(f"File saved as {output_file} in {completion_time:.2f} seconds.")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benjamin Dearden
+Michael Smith
+Peter Dingue
+Kathy Doan
+
+v4_timer_wheel.py - Timer wheel for the Phase 4 client retransmission timers
+
+Hierarchical timer wheel for client loops that need many retransmission
+timers at once (one per segment for Selective Repeat) instead of a single
+timer on base. Both loops in v4_client.py keep their timers here: Go-Back-N
+its one timer on base, Selective Repeat one per unacknowledged segment.
+
+Time is cut into ticks of TICK seconds. Level 0 has SLOTS buckets of one tick
+each, and every level above has SLOTS buckets, each as wide as the whole level
+below. A timer goes into the lowest level whose span covers its deadline.
+Whenever level 0 wraps around, the next bucket of level 1 is emptied back into
+the lower levels, and so on up the levels. Arming and cancelling a timer is a
+set add/remove, and expire() hands back every timer that came due in one batch.
+
+A loop uses it like this:
+
+    wheel = TimerWheel()
+    handle = wheel.arm(time.monotonic() + rto, seq)
+    ...
+    deadline = wheel.next_deadline()
+    select.select([sock], [], [], None if deadline is None else max(0.0, deadline - time.monotonic()))
+    for seq in wheel.expire(time.monotonic()):
+        ...  # retransmit seq
+
+Timers never fire early. They fire at most one tick late, plus however late
+the caller calls expire().
+
+"""
+import math
+import time
+
+TICK = 0.001  # seconds per level 0 slot
+SLOT_BITS = 8
+SLOTS = 1 << SLOT_BITS  # slots per level
+LEVELS = 4  # 256 ticks, 65 s, 4.6 h, 49 days of range at 1 ms ticks
+
+
+class Timer:
+    """Handle for an armed timer, pass it to TimerWheel.cancel()."""
+    __slots__ = ("ticks", "key", "bucket", "level")
+
+    def __init__(self, ticks, key):
+        self.ticks = ticks
+        self.key = key
+        self.bucket = None
+        self.level = 0
+
+    @property
+    def armed(self):
+        return self.bucket is not None
+
+
+class TimerWheel:
+    """
+    Timers keyed by any value. arm() and cancel() are O(1), expire(now) returns
+    the keys of every timer due by now, and next_deadline() gives the time the
+    caller's poll/select should wake up at.
+    """
+
+    def __init__(self, tick=TICK, slot_bits=SLOT_BITS, levels=LEVELS, now=None):
+        self.tick = tick
+        self.bits = slot_bits
+        self.mask = (1 << slot_bits) - 1
+        self.levels = levels
+        self.origin = time.monotonic() if now is None else now
+        self.current = 0  # next tick expire() has to process
+        self.wheels = [[set() for _ in range(1 << slot_bits)] for _ in range(levels)]
+        self.counts = [0] * levels
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def arm(self, deadline, key):
+        """Arm a timer for the monotonic time deadline, returns its Timer handle."""
+        timer = Timer(math.ceil((deadline - self.origin) / self.tick), key)
+        self._insert(timer)
+        self.size += 1
+        return timer
+
+    def cancel(self, timer):
+        """Disarm timer, a no-op if it already fired or was cancelled."""
+        if timer.bucket is not None:
+            timer.bucket.discard(timer)
+            timer.bucket = None
+            self.counts[timer.level] -= 1
+            self.size -= 1
+
+    def rearm(self, timer, deadline):
+        """Move an armed or spent timer to a new deadline, reusing the handle."""
+        self.cancel(timer)
+        timer.ticks = math.ceil((deadline - self.origin) / self.tick)
+        self._insert(timer)
+        self.size += 1
+        return timer
+
+    def _insert(self, timer):
+        delta = timer.ticks - self.current
+        if delta < 0:
+            ticks = self.current  # already due, fires on the next expire()
+        else:
+            ticks = timer.ticks
+        # Lowest level whose span covers delta: level n holds deltas below SLOTS ** (n + 1)
+        level = (delta.bit_length() - 1) // self.bits if delta > 0 else 0
+        if level >= self.levels:
+            # Past the top level's range, park it in the furthest bucket and let it cascade down later
+            level = self.levels - 1
+            ticks = self.current + (1 << (self.bits * self.levels)) - 1
+        bucket = self.wheels[level][(ticks >> (self.bits * level)) & self.mask]
+        bucket.add(timer)
+        timer.bucket = bucket
+        timer.level = level
+        self.counts[level] += 1
+
+    def _cascade(self):
+        # Level 0 just wrapped: empty the next bucket of each level above into the levels below
+        for level in range(1, self.levels):
+            index = (self.current >> (self.bits * level)) & self.mask
+            bucket = self.wheels[level][index]
+            if bucket:
+                timers = list(bucket)
+                bucket.clear()
+                self.counts[level] -= len(timers)
+                for timer in timers:
+                    self._insert(timer)
+            if index != 0:
+                break
+
+    def expire(self, now):
+        """Remove and return the keys of every timer due at or before now."""
+        target = math.floor((now - self.origin) / self.tick)
+        expired = []
+        while self.current <= target:
+            if self.counts[0] == 0:
+                # Nothing at level 0, skip straight to the next wrap (or to target)
+                boundary = (self.current | self.mask) + 1
+                if boundary > target:
+                    self.current = target + 1
+                    if self.current == boundary:
+                        self._cascade()
+                    break
+                self.current = boundary
+                self._cascade()
+                continue
+            bucket = self.wheels[0][self.current & self.mask]
+            if bucket:
+                for timer in bucket:
+                    timer.bucket = None
+                    expired.append(timer.key)
+                self.counts[0] -= len(bucket)
+                self.size -= len(bucket)
+                bucket.clear()
+            self.current += 1
+            if self.current & self.mask == 0:
+                self._cascade()
+        return expired
+
+    def next_deadline(self):
+        """
+        Monotonic time the caller should next call expire() at, None with no timers armed.
+        For timers above level 0 this is the next cascade, which may come before they are due.
+        """
+        if self.size == 0:
+            return None
+        # Level 0 buckets up to the next wrap, after that the cascade comes first
+        boundary = (self.current | self.mask) + 1
+        if self.counts[0]:
+            wheel = self.wheels[0]
+            for ticks in range(self.current, boundary):
+                if wheel[ticks & self.mask]:
+                    return self.origin + ticks * self.tick
+        return self.origin + boundary * self.tick
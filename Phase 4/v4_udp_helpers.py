@@ -5,7 +5,7 @@ Michael Smith
 Peter Dingue
 Kathy Doan
 
-v4_udp_helpers.py - Helper functions for Go-Back-N implementation
+v4_udp_helpers.py - Helper functions for the Go-Back-N and Selective Repeat implementations
 Simulation Modes:
     1: No errors.
     2: ACK packet bit-error.
@@ -16,10 +16,14 @@ Simulation Modes:
 Note: The previous send_packet function (used for stop-and-wait) is no longer used,
 as the client now manages transmission and ACK handling directly.
 """
+import os
+import mmap
+import queue
 import random
 import select
 import time
 import logging
+import threading
 
 if not logging.getLogger().hasHandlers():
     logging.basicConfig(
@@ -39,12 +43,20 @@ logger = logging.getLogger("UDPHelpers")
 
 random.seed(123)
 
+# Sliding window protocols shared by the client, server and harness
+PROTOCOL_GBN = "GBN"  # Go-Back-N: cumulative ACKs, the whole window is resent on timeout
+PROTOCOL_SR = "SR"  # Selective Repeat: per-segment ACKs and timers, receiver buffers out-of-order segments
+PROTOCOL_NAMES = {PROTOCOL_GBN: "Go-Back-N", PROTOCOL_SR: "Selective Repeat"}
+
+WRITE_QUEUE_SEGMENTS = 256  # segments waiting for the write-behind thread before write() blocks
+PREALLOCATE_BYTES = 8 * 1024 * 1024  # output file is grown ahead of the writes in steps of this size
+
 def debug_print(msg):
     logger.debug(msg)
 
 def checksum(data):
     if len(data) % 2 == 1:
-        data += b'\x00'
+        data = bytes(data) + b'\x00'
     total = 0
     for i in range(0, len(data), 2):
         word = (data[i] << 8) + data[i + 1]
@@ -78,3 +90,141 @@ def make_packet(file_name, sequence_number, packet_size=1024):
     chk_value = checksum(data)
     header = f"{sequence_number}|{chk_value}|".encode()
     return header + data
+
+
+class PacketSource:
+    """
+    Precomputed packet table for one file (same as the phase 5 helper). The file
+    is memory-mapped once and the offsets, payload views, checksums and headers
+    are built up front, so each send is a list lookup instead of make_packet().
+    """
+
+    def __init__(self, file_name, packet_size=1024):
+        self.file_name = file_name
+        self.packet_size = packet_size
+        self.file_size = os.path.getsize(file_name)
+
+        if self.file_size:
+            with open(file_name, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._mmap = b""  # mmap refuses to map an empty file
+        self._view = memoryview(self._mmap)
+
+        self.offsets = list(range(0, self.file_size, packet_size))
+        self.payloads = [self._view[offset:offset + packet_size] for offset in self.offsets]
+        self.checksums = [checksum(bytes(payload)) for payload in self.payloads]
+        self.headers = [f"{seq}|{chk_value}|".encode() for seq, chk_value in enumerate(self.checksums)]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def segment(self, sequence_number):
+        """Return (header, payload memoryview) for a segment, or None past the end of the file."""
+        if sequence_number >= len(self.offsets):
+            return None
+        return self.headers[sequence_number], self.payloads[sequence_number]
+
+    def packet(self, sequence_number):
+        """Same result as make_packet(file_name, sequence_number, packet_size)."""
+        if sequence_number >= len(self.offsets):
+            return None
+        return self.headers[sequence_number] + self.payloads[sequence_number]
+
+    def close(self):
+        # The payload views must be released before the mapping can be closed
+        for payload in self.payloads:
+            payload.release()
+        self._view.release()
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+
+
+class ReceiveRing:
+    """
+    Ring of preallocated receive buffers (same as the phase 5 helper). recv()
+    fills the next slot with recvfrom_into and returns a memoryview of the
+    datagram, valid until the ring wraps around.
+    """
+
+    def __init__(self, sock, slots=64, slot_size=2048):
+        self.sock = sock
+        self.buffers = [bytearray(slot_size) for _ in range(slots)]
+        self.views = [memoryview(buffer) for buffer in self.buffers]
+        self.index = 0
+
+    def recv(self):
+        """Receive one datagram, returns (memoryview, address) like recvfrom."""
+        view = self.views[self.index]
+        self.index = (self.index + 1) % len(self.views)
+        nbytes, address = self.sock.recvfrom_into(view)
+        return view[:nbytes], address
+
+
+class SegmentSink:
+    """
+    Streaming output file for the server (same as the phase 5 helper). Each
+    accepted segment is written at seq * packet_size by a write-behind thread
+    fed through a bounded queue, so the whole file is never held in memory and
+    disk I/O stays out of the receive loop. The file is preallocated where
+    posix_fallocate exists and truncated to its real length on close().
+    """
+
+    def __init__(self, file_name, packet_size=1024, queue_segments=WRITE_QUEUE_SEGMENTS):
+        self.file_name = file_name
+        self.packet_size = packet_size
+        self.length = 0  # highest byte written so far
+        self._allocated = 0
+        self._error = None
+        self._fd = os.open(file_name, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+        self._queue = queue.Queue(maxsize=queue_segments)
+        self._thread = threading.Thread(target=self._write_behind, name="SegmentSink", daemon=True)
+        self._thread.start()
+
+    def write(self, sequence_number, payload):
+        """Queue a segment for writing. The payload is copied, so ring buffer views are safe to pass."""
+        if self._error is not None:
+            raise self._error
+        self._queue.put((sequence_number * self.packet_size, bytes(payload)))
+
+    def _preallocate(self, end):
+        if end <= self._allocated or not hasattr(os, "posix_fallocate"):
+            return
+        self._allocated = max(end, self._allocated + PREALLOCATE_BYTES)
+        try:
+            os.posix_fallocate(self._fd, 0, self._allocated)
+        except OSError:
+            pass  # some filesystems refuse fallocate, the writes still extend the file
+
+    def _write_behind(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            offset, data = item
+            if self._error is not None:
+                continue  # keep draining so write() never blocks on a dead writer
+            try:
+                self._preallocate(offset + len(data))
+                if hasattr(os, "pwrite"):
+                    os.pwrite(self._fd, data, offset)
+                else:
+                    os.lseek(self._fd, offset, os.SEEK_SET)
+                    os.write(self._fd, data)
+                self.length = max(self.length, offset + len(data))
+            except OSError as e:
+                self._error = e
+
+    def close(self):
+        """Flush the queue, trim the preallocated tail and close the file."""
+        if self._fd is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            os.ftruncate(self._fd, self.length)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,285 @@
+"""
+Benjamin Dearden
+Michael Smith
+Peter Dingue
+Kathy Doan
+v5_async.py for Phase 5 EECE 4830 Project
+
+asyncio versions of the phase 5 client and server. Both speak the same wire
+format and run the same state machines as the blocking versions: the client
+drives a SenderCore and the server a ConnectionTable of Connections, so one
+event loop can carry many transfers at once.
+
+The retransmission timer is a single loop.call_at() handle re-armed at
+SenderCore.timer_deadline whenever the core's timer moves, so an idle
+transfer costs nothing until an ACK arrives or its RTO actually expires.
+
+"""
+import os
+import time
+import socket
+import asyncio
+import logging
+from v5_helpers import PacketSource
+from v5_sender import SenderCore, MAX_WINDOW_SIZE, MIN_RTO, MAX_RTO, PROTOCOL_RENO
+from v5_server import ConnectionTable, IDLE_TIMEOUT, IDLE_CHECK_INTERVAL, MULTI_RCVBUF, SERVER_PORT
+from v5_wire import (DEFAULT_WIRE_VERSION, WIRE_V1, FLAG_SACK, FLAG_TIMESTAMP, FRAME_SYN, FRAME_SYN_ACK, FRAME_ACK,
+                     FRAME_FIN, FRAME_FIN_ACK, FRAME_END, encode_control, parse_handshake, parse_frame)
+
+logger = logging.getLogger("Async")
+
+SERVER_ADDRESS = '127.0.0.1'
+PACKET_SIZE = 1024
+HANDSHAKE_ATTEMPTS = 3
+HANDSHAKE_TIMEOUT = 1.0  # seconds to wait for a SYN-ACK or FIN-ACK
+TIMER_SLACK = 0.001  # seconds added to each RTO deadline
+
+
+class SenderProtocol(asyncio.DatagramProtocol):
+    """
+    Client side datagram endpoint. Until attach() is called, datagrams are queued
+    for the handshake and teardown; while a SenderCore is attached every ACK is
+    fed to it directly from datagram_received and the segments it returns are
+    sent straight away.
+    """
+
+    def __init__(self):
+        self.transport = None
+        self.loop = None
+        self.core = None
+        self.timer = None
+        self.timer_deadline = None
+        self.finished = None
+        self.datagrams = asyncio.Queue()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.loop = asyncio.get_running_loop()
+
+    def datagram_received(self, data, addr):
+        if self.core is None:
+            self.datagrams.put_nowait(data)
+            return
+        self.send(self.core.on_ack_datagram(data))
+        self.pump()
+
+    def error_received(self, exc):
+        logger.debug(f"Client socket error: {exc}")
+
+    def connection_lost(self, exc):
+        self.cancel_timer()
+        if self.finished is not None and not self.finished.done():
+            self.finished.set_exception(exc or ConnectionError("transport closed"))
+
+    def send(self, segments):
+        for header, payload in segments:
+            self.transport.sendto(header + payload)
+
+    async def receive(self, timeout):
+        """Next queued datagram, or None after timeout seconds."""
+        try:
+            return await asyncio.wait_for(self.datagrams.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def attach(self, core):
+        """Start driving core, returns a future that completes when the transfer is done."""
+        self.core = core
+        self.finished = self.loop.create_future()
+        self.pump()
+        return self.finished
+
+    def pump(self):
+        # Fill the window, then move the timer to wherever the core now wants it: the RTO
+        # deadline or, when pacing, the next send slot if that comes first
+        self.send(self.core.poll_segments())
+        if self.core.done:
+            self.cancel_timer()
+            self.core = None
+            if not self.finished.done():
+                self.finished.set_result(None)
+            return
+        deadline = self.core.timer_deadline
+        if deadline is not None:
+            # The slack keeps the callback from landing just before the RTO deadline,
+            # where check_timeout() would do nothing
+            deadline += TIMER_SLACK
+        if self.core.pacing_deadline is not None and (deadline is None or self.core.pacing_deadline < deadline):
+            deadline = self.core.pacing_deadline
+        if deadline != self.timer_deadline:
+            self.cancel_timer()
+            if deadline is not None:
+                # The core keeps time.monotonic() times, the loop schedules on its own clock
+                delay = max(0.0, deadline - time.monotonic())
+                self.timer = self.loop.call_at(self.loop.time() + delay, self.on_timer)
+                self.timer_deadline = deadline
+
+    def on_timer(self):
+        self.timer = None
+        self.timer_deadline = None
+        if self.core is not None:
+            self.send(self.core.check_timeout())
+            self.pump()
+
+    def cancel_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = None
+        self.timer_deadline = None
+
+
+async def tcp_handshake(protocol, wire_version=DEFAULT_WIRE_VERSION, sack=True, timestamps=True):
+    # Same exchange as v5_client.tcp_handshake: returns (version, flags, SYN RTT), or (None, 0, None) on failure
+    connection_id = int.from_bytes(os.urandom(4), "big")
+    options = (FLAG_SACK if sack else 0) | (FLAG_TIMESTAMP if timestamps else 0)
+    for attempt in range(HANDSHAKE_ATTEMPTS):
+        sent = time.monotonic()
+        protocol.transport.sendto(encode_control(wire_version, FRAME_SYN, options, connection_id))
+        data = await protocol.receive(HANDSHAKE_TIMEOUT)
+        if data is None:
+            logger.warning("No SYN-ACK, resending SYN")
+            continue
+        reply = parse_handshake(data)
+        if reply is not None and reply.frame_type == FRAME_SYN_ACK:
+            protocol.transport.sendto(encode_control(reply.version, FRAME_ACK))
+            return reply.version, reply.flags, time.monotonic() - sent if attempt == 0 else None
+    logger.warning("Handshake failed")
+    return None, 0, None
+
+
+async def tcp_teardown(protocol, wire_version):
+    protocol.transport.sendto(encode_control(wire_version, FRAME_END))
+    protocol.transport.sendto(encode_control(wire_version, FRAME_FIN))
+    deadline = time.time() + HANDSHAKE_TIMEOUT
+    while time.time() < deadline:
+        data = await protocol.receive(deadline - time.time())
+        if data is None:
+            break
+        response = parse_frame(data, wire_version)
+        if response is not None and response[0] == FRAME_FIN_ACK:
+            return True
+        # Anything else is a late ACK for the data, keep waiting
+    logger.warning("Timeout waiting for server ACK during teardown")
+    return False
+
+
+async def send_file_async(simulation_mode, error_rate, congestion_protocol=PROTOCOL_RENO, file_name="kitty.png",
+                          initial_timeout=None, initial_cwnd=None, packet_source=None,
+                          wire_version=DEFAULT_WIRE_VERSION, sack=True, max_window=MAX_WINDOW_SIZE,
+                          pacing_gain=None, server=(SERVER_ADDRESS, SERVER_PORT), rack=False, min_rto=MIN_RTO,
+                          max_rto=MAX_RTO, timestamps=True):
+    """
+    asyncio counterpart of v5_client.send_file, same arguments (asyncio transports cannot read
+    kernel timestamps, so there is no kernel_timestamps) and return value: (duration, retransmissions,
+    throughput, cwnd_history, rtt_history, rto_history, SenderStats, python_rtt_history).
+    """
+    owns_source = packet_source is None
+    if owns_source:
+        packet_source = PacketSource(file_name, PACKET_SIZE)
+
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(SenderProtocol, remote_addr=server)
+    try:
+        wire_version, options, handshake_rtt = await tcp_handshake(protocol, wire_version,
+                                                                   sack and wire_version != WIRE_V1,
+                                                                   timestamps and wire_version != WIRE_V1)
+        if wire_version is None:
+            return 0, 0, 0, [], [], [], None, []
+
+        core = SenderCore(packet_source, congestion_protocol, wire_version, bool(options & FLAG_SACK),
+                          simulation_mode, error_rate, initial_timeout, initial_cwnd, max_window, pacing_gain, rack,
+                          min_rto, max_rto, handshake_rtt, bool(options & FLAG_TIMESTAMP))
+        await protocol.attach(core)
+        await tcp_teardown(protocol, wire_version)
+    finally:
+        transport.close()
+        if owns_source:
+            packet_source.close()
+
+    duration = time.monotonic() - core.start_time
+    throughput = packet_source.file_size / duration
+    logger.info(f"Async transfer completed in {duration:.2f}s, {core.retransmissions} retransmissions")
+    return (duration, core.retransmissions, throughput, core.cwnd_history, core.rtt_history, core.rto_history,
+            core.stats(), core.python_rtt_history)
+
+
+class ServerProtocol(asyncio.DatagramProtocol):
+    """Server side datagram endpoint, every datagram goes through a ConnectionTable."""
+
+    def __init__(self, table):
+        self.table = table
+        self.transport = None
+        self.changed = asyncio.Event()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        finished = len(self.table.results)
+        self.table.dispatch(data, addr, time.time(), self.reply)
+        if len(self.table.results) != finished:
+            self.changed.set()
+
+    def error_received(self, exc):
+        logger.debug(f"Server socket error: {exc}")
+
+    def reply(self, message, addr):
+        self.transport.sendto(message, addr)
+
+
+async def run_server_async(simulation_mode, error_rate, max_transfers=None, idle_timeout=IDLE_TIMEOUT,
+                           on_ready=None, on_transfer=None):
+    """
+    asyncio counterpart of v5_server.run_multi_server: serve clients on SERVER_PORT
+    until max_transfers connections have ended (None serves until cancelled).
+    Returns the list of TransferStats.
+    """
+    loop = asyncio.get_running_loop()
+    table = ConnectionTable(simulation_mode, error_rate, on_transfer)
+    transport, protocol = await loop.create_datagram_endpoint(lambda: ServerProtocol(table),
+                                                              local_addr=("0.0.0.0", SERVER_PORT))
+    transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MULTI_RCVBUF)
+    if on_ready is not None:
+        on_ready()
+    logger.debug(f"Async server listening on port {SERVER_PORT}")
+    try:
+        while max_transfers is None or len(table.results) < max_transfers:
+            try:
+                await asyncio.wait_for(protocol.changed.wait(), IDLE_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            protocol.changed.clear()
+            table.sweep(time.time(), idle_timeout)
+    finally:
+        table.close_all()
+        transport.close()
+    return table.results
+
+
+async def run_transfers(clients, simulation_mode=1, error_rate=0.0, congestion_protocol=PROTOCOL_RENO,
+                        file_name="kitty.png"):
+    """
+    Serve and send clients concurrent transfers of file_name from one event loop.
+    Returns (server TransferStats list, client result tuples).
+    """
+    ready = asyncio.Event()
+    server = asyncio.ensure_future(run_server_async(simulation_mode, error_rate, max_transfers=clients,
+                                                    on_ready=ready.set))
+    await ready.wait()
+    with PacketSource(file_name, PACKET_SIZE) as packet_source:
+        results = await asyncio.gather(*(send_file_async(simulation_mode, error_rate, congestion_protocol,
+                                                         packet_source=packet_source)
+                                         for _ in range(clients)))
+    return await server, results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [ASYNC] %(message)s')
+    stats, results = asyncio.run(run_transfers(8))
+    completed = sum(s.completed for s in stats)
+    logger.info(f"{completed}/{len(stats)} transfers completed, "
+                f"{sum(r[1] for r in results)} retransmissions in total")
+
+
+if __name__ == "__main__":
+    main()
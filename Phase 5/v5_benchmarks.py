@@ -0,0 +1,610 @@
+"""
+Benjamin Dearden
+Michael Smith
+Peter Dingue
+Kathy Doan
+v5_benchmarks.py for Phase 5 EECE 4830 Project
+Micro benchmarks for the phase 5 hot paths. Each benchmark prints a small
+table to the console.
+
+Usage:
+    python v5_benchmarks.py            (run every benchmark)
+    python v5_benchmarks.py checksum   (run only the named benchmarks)
+
+"""
+import os
+import sys
+import time
+import socket
+import logging
+import tempfile
+import threading
+import tracemalloc
+import multiprocessing
+
+from v5_checksum import HAVE_NUMPY, checksum_loop, checksum_python, checksum_numpy, checksum_many
+from v5_wire import WIRE_V1, WIRE_V2, encode_data_header, parse_frame
+from v5_io import HAVE_MMSG, ReceiveRing, BatchSender, BatchReceiver, GROReceiver
+
+CHECKSUM_SIZES = [1024, 4096, 16384, 65536]  # 1 KB to 64 KB payloads
+BATCH_SEGMENTS = 1024  # payloads per checksum_many() call
+MIN_BENCH_TIME = 0.2  # seconds each measurement runs for
+RECV_PACKETS = 20000  # datagrams received per receive benchmark
+RECV_BURST = 128  # datagrams queued before draining, stays under the socket buffer
+MMSG_WINDOWS = [1, 8, 32, 128]  # window bursts for the batched I/O benchmark
+MMSG_MEGABYTES = 8  # data moved per window size
+OFFLOAD_WINDOW = 63  # segments per burst, the most 1 KB frames one GSO send can carry
+OFFLOAD_MEGABYTES = 32
+SCALING_CLIENTS = [1, 8, 32, 128, 256]  # simultaneous clients against one multi-client server
+SCALING_FILE_BYTES = 64 * 1024  # file each client sends
+SCALING_IDLE_TIMEOUT = 10.0  # evict clients that gave up so the round can end
+SHARD_CLIENTS = 128  # simultaneous clients for the sharded server benchmark
+SHARD_WORKERS = None  # worker counts to try, None means powers of two up to the core count
+ASYNC_FLOWS = [1, 32, 128, 256]  # simultaneous transfers for the threads against asyncio benchmark
+RTO_VALUES = [0.01, 0.02, 0.03]  # fixed RTOs for the timer precision benchmark, as swept by the harness
+RTO_RETRANSMITS = 50  # timeouts measured per RTO value
+WINDOW_SIZES = [64, 1024, 16384, 65536]  # max_window values for the sender window benchmark
+WINDOW_ACKS = 200000  # ACKs processed per window size
+TIMER_COUNT = 1000000  # timers armed and cancelled by the timer wheel benchmark
+
+
+def time_call(func, *args):
+    """Call func(*args) repeatedly for at least MIN_BENCH_TIME, return seconds per call."""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < MIN_BENCH_TIME:
+        func(*args)
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / calls
+
+
+def bench_checksum():
+    """Bytes/sec of each checksum implementation against the original loop."""
+    print("=== Checksum throughput (MB/s) ===")
+    engines = [("loop", checksum_loop), ("python", checksum_python)]
+    if HAVE_NUMPY:
+        engines.append(("numpy", checksum_numpy))
+    else:
+        print("NumPy not installed, skipping the numpy engine")
+
+    print(f"{'size':>8} " + " ".join(f"{name:>10}" for name, _ in engines) + f" {'speedup':>8}")
+    for size in CHECKSUM_SIZES:
+        data = os.urandom(size)
+        expected = checksum_loop(data)
+        rates = []
+        for name, func in engines:
+            assert func(data) == expected, f"{name} checksum disagrees with the loop"
+            rates.append(size / time_call(func, data))
+        print(f"{size:>8} " + " ".join(f"{rate / 1e6:>10.1f}" for rate in rates) + f" {max(rates) / rates[0]:>7.1f}x")
+
+    print(f"--- checksum_many() over {BATCH_SEGMENTS} x 1 KB payloads ---")
+    payloads = [os.urandom(1024) for _ in range(BATCH_SEGMENTS)]
+    assert checksum_many(payloads) == [checksum_loop(p) for p in payloads]
+    total_bytes = BATCH_SEGMENTS * 1024
+    loop_rate = total_bytes / time_call(lambda: [checksum_loop(p) for p in payloads])
+    batch_rate = total_bytes / time_call(checksum_many, payloads)
+    print(f"loop {loop_rate / 1e6:.1f} MB/s, batch {batch_rate / 1e6:.1f} MB/s ({batch_rate / loop_rate:.1f}x)")
+
+
+def bench_parse():
+    """Server side parse cost per 1 KB data packet for each wire version."""
+    print("=== Data packet parse cost (us/packet) ===")
+    payload = os.urandom(1024)
+    chksum = checksum_loop(payload)
+    for version in (WIRE_V1, WIRE_V2):
+        header = encode_data_header(version, 123456, chksum, len(payload))
+        packet = header + payload
+        assert bytes(parse_frame(packet, version)[3]) == payload
+        per_packet = time_call(parse_frame, packet, version)
+        print(f"wire v{version}: header {len(header):>2} bytes, {per_packet * 1e6:.2f} us/packet")
+
+
+def loopback_pair():
+    """Return (sender, receiver) UDP sockets on loopback, the sender connected to the receiver."""
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    receiver.bind(("127.0.0.1", 0))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.connect(receiver.getsockname())
+    return sender, receiver
+
+
+def bench_recv():
+    """Allocations and packets/sec of recvfrom() against the preallocated ReceiveRing."""
+    print("=== Server receive path: recv + parse of 1 KB data packets ===")
+    payload = os.urandom(1024)
+    packet = encode_data_header(WIRE_V2, 1, checksum_loop(payload), len(payload)) + payload
+    sender, receiver = loopback_pair()
+    ring = ReceiveRing(receiver)
+    methods = [
+        ("recvfrom", lambda: receiver.recvfrom(2048)),
+        ("ring", ring.recv),
+    ]
+
+    for name, receive in methods:
+        for tracing in (False, True):
+            if tracing:
+                tracemalloc.start()
+            elapsed = 0.0
+            allocated = 0
+            for _ in range(RECV_PACKETS // RECV_BURST):
+                for _ in range(RECV_BURST):
+                    sender.send(packet)
+                start = time.perf_counter()
+                for _ in range(RECV_BURST):
+                    if tracing:
+                        tracemalloc.reset_peak()
+                        before = tracemalloc.get_traced_memory()[0]
+                    data, _ = receive()
+                    parse_frame(data, WIRE_V2)
+                    if tracing:
+                        allocated += tracemalloc.get_traced_memory()[1] - before
+                elapsed += time.perf_counter() - start
+            if tracing:
+                tracemalloc.stop()
+                print(f"{name:>8}: {allocated / RECV_PACKETS:7.0f} bytes allocated/packet (tracemalloc peak)")
+            else:
+                print(f"{name:>8}: {RECV_PACKETS / elapsed:7.0f} packets/sec")
+    sender.close()
+    receiver.close()
+
+
+def bench_mmsg():
+    """Syscalls per MB and packets/sec for per-datagram calls against sendmmsg/recvmmsg."""
+    print("=== Batched datagram I/O (1 KB segments, one window burst at a time) ===")
+    if not HAVE_MMSG:
+        print("sendmmsg/recvmmsg not available here, only the per-call fallback is measured")
+    payload = memoryview(bytearray(os.urandom(1024)))
+    header = encode_data_header(WIRE_V2, 1, checksum_loop(payload), len(payload))
+    packets = MMSG_MEGABYTES * 1024
+
+    print(f"{'window':>7} {'mode':>8} {'syscalls/MB':>12} {'packets/sec':>12}")
+    for window in MMSG_WINDOWS:
+        for batched in (False, True):
+            sender_sock, receiver_sock = loopback_pair()
+            sender = BatchSender(sender_sock, enabled=batched)
+            receiver = BatchReceiver(receiver_sock, slots=window, enabled=batched, addresses=False)
+            burst = [(header, payload)] * window
+            received = 0
+            start = time.perf_counter()
+            for _ in range(packets // window):
+                sender.send_batch(burst)
+                pending = window
+                while pending:
+                    pending -= len(receiver.recv_batch())
+                received += window
+            elapsed = time.perf_counter() - start
+            syscalls = sender.syscalls + receiver.syscalls
+            print(f"{window:>7} {'mmsg' if batched else 'per-call':>8} {syscalls / MMSG_MEGABYTES:>12.0f} "
+                  f"{received / elapsed:>12.0f}")
+            sender_sock.close()
+            receiver_sock.close()
+
+
+def bench_offload():
+    """Loopback packets/sec with and without UDP GSO/GRO offload."""
+    print(f"=== UDP offload ({OFFLOAD_WINDOW}-segment bursts of 1 KB frames, loopback) ===")
+    payload = memoryview(bytearray(os.urandom(1024)))
+    header = encode_data_header(WIRE_V2, 1, checksum_loop(payload), len(payload))
+    burst = [(header, payload)] * OFFLOAD_WINDOW
+    bursts = OFFLOAD_MEGABYTES * 1024 // OFFLOAD_WINDOW
+
+    print(f"{'mode':>9} {'syscalls/MB':>12} {'packets/sec':>12}")
+    for mode in ("per-call", "mmsg", "gso+gro"):
+        sender_sock, receiver_sock = loopback_pair()
+        sender = BatchSender(sender_sock, enabled=mode != "per-call", gso=mode == "gso+gro")
+        if mode == "gso+gro":
+            receiver = GROReceiver(receiver_sock)
+            if not (sender.gso and receiver.enabled):
+                print(f"{mode:>9} not supported by this kernel")
+                continue
+        else:
+            receiver = BatchReceiver(receiver_sock, slots=OFFLOAD_WINDOW, enabled=mode == "mmsg", addresses=False)
+
+        start = time.perf_counter()
+        for _ in range(bursts):
+            sender.send_batch(burst)
+            pending = OFFLOAD_WINDOW
+            while pending:
+                for data, _ in receiver.recv_batch():
+                    parse_frame(data, WIRE_V2)
+                    pending -= 1
+        elapsed = time.perf_counter() - start
+        syscalls = sender.syscalls + receiver.syscalls
+        print(f"{mode:>9} {syscalls / OFFLOAD_MEGABYTES:>12.1f} {bursts * OFFLOAD_WINDOW / elapsed:>12.0f}")
+        sender_sock.close()
+        receiver_sock.close()
+
+
+def bench_scaling():
+    """
+    Aggregate goodput and per-connection completion time against run_multi_server.
+    The clients are threads in this process, so at high counts the times include
+    client side GIL contention as well as the server's own cost.
+    """
+    # Imported here so the other benchmarks do not pay for the client/server logging setup
+    from v5_helpers import PacketSource
+    from v5_client import PACKET_SIZE, PROTOCOL_RENO, send_file
+    from v5_server import run_multi_server
+
+    print(f"=== Multi-client server scaling ({SCALING_FILE_BYTES // 1024} KB per client, loopback) ===")
+    logging.disable(logging.WARNING)  # per-packet and per-transfer logs would dominate the measurement
+    with tempfile.TemporaryDirectory() as folder:
+        file_name = os.path.join(folder, "payload.bin")
+        with open(file_name, "wb") as f:
+            f.write(os.urandom(SCALING_FILE_BYTES))
+        source = PacketSource(file_name, PACKET_SIZE)
+
+        print(f"{'clients':>8} {'done':>5} {'goodput MB/s':>13} {'mean s':>8} {'p50 s':>8} {'p95 s':>8} {'max s':>8}")
+        for clients in SCALING_CLIENTS:
+            results = []
+            server = threading.Thread(target=lambda: results.extend(
+                run_multi_server(1, 0.0, max_transfers=clients, idle_timeout=SCALING_IDLE_TIMEOUT)), daemon=True)
+            server.start()
+            time.sleep(0.2)  # give the server a moment to bind()
+
+            durations = [0.0] * clients
+
+            def client(index):
+                try:
+                    durations[index] = send_file(1, 0.0, PROTOCOL_RENO, packet_source=source)[0]
+                except OSError:
+                    pass  # server gone (its round ended), counted as not done
+
+            threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            server.join(timeout=SCALING_IDLE_TIMEOUT + 5)
+
+            completed = [stats for stats in results if stats.completed and stats.bytes == SCALING_FILE_BYTES]
+            times = sorted(d for d in durations if d > 0) or [0.0]
+            print(f"{clients:>8} {len(completed):>5} {len(completed) * SCALING_FILE_BYTES / elapsed / 1e6:>13.2f} "
+                  f"{sum(times) / len(times):>8.3f} {times[len(times) // 2]:>8.3f} "
+                  f"{times[min(len(times) - 1, int(len(times) * 0.95))]:>8.3f} {times[-1]:>8.3f}")
+            for stats in results:
+                os.remove(stats.output_file)
+        source.close()
+    logging.disable(logging.NOTSET)
+
+
+def _client_batch(count, file_name, durations):
+    # Runs in a client process: count concurrent transfers, durations of the successful ones go to the queue
+    from v5_helpers import PacketSource
+    from v5_client import PACKET_SIZE, PROTOCOL_RENO, send_file
+    logging.disable(logging.WARNING)
+    source = PacketSource(file_name, PACKET_SIZE)
+    results = []
+
+    def client():
+        try:
+            results.append(send_file(1, 0.0, PROTOCOL_RENO, packet_source=source)[0])
+        except OSError:
+            pass
+
+    threads = [threading.Thread(target=client) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    source.close()
+    durations.put([d for d in results if d > 0])
+
+
+def bench_sharded():
+    """Aggregate goodput of the SO_REUSEPORT sharded server from 1 worker up to one per core."""
+    from v5_server import ShardedServer
+
+    cores = os.cpu_count() or 1
+    worker_counts = SHARD_WORKERS or sorted({1 << i for i in range(cores.bit_length()) if 1 << i <= cores} | {cores})
+    # The load generator needs cores too, so clients are spread over one process per core
+    client_processes = min(cores, SHARD_CLIENTS)
+    print(f"=== SO_REUSEPORT sharded server ({SHARD_CLIENTS} clients x {SCALING_FILE_BYTES // 1024} KB, "
+          f"{client_processes} client processes, {cores} cores) ===")
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as folder:
+        file_name = os.path.join(folder, "payload.bin")
+        with open(file_name, "wb") as f:
+            f.write(os.urandom(SCALING_FILE_BYTES))
+
+        print(f"{'workers':>8} {'done':>5} {'goodput MB/s':>13} {'mean s':>8} {'p95 s':>8} {'per worker':>12}")
+        for workers in worker_counts:
+            server = ShardedServer(1, 0.0, workers=workers, idle_timeout=SCALING_IDLE_TIMEOUT)
+            server.start()
+            durations = multiprocessing.Queue()
+            shares = [SHARD_CLIENTS // client_processes + (i < SHARD_CLIENTS % client_processes)
+                      for i in range(client_processes)]
+            processes = [multiprocessing.Process(target=_client_batch, args=(share, file_name, durations))
+                         for share in shares]
+            start = time.perf_counter()
+            for process in processes:
+                process.start()
+            times = []
+            for _ in processes:
+                times.extend(durations.get())
+            elapsed = time.perf_counter() - start
+            for process in processes:
+                process.join()
+            server.collect(SHARD_CLIENTS, timeout=SCALING_IDLE_TIMEOUT + 5)
+            results = server.stop()
+
+            completed = [stats for stats in results if stats.completed and stats.bytes == SCALING_FILE_BYTES]
+            per_worker = [sum(1 for stats in completed if stats.worker == i) for i in range(workers)]
+            times = sorted(times) or [0.0]
+            print(f"{workers:>8} {len(completed):>5} {len(completed) * SCALING_FILE_BYTES / elapsed / 1e6:>13.2f} "
+                  f"{sum(times) / len(times):>8.3f} {times[min(len(times) - 1, int(len(times) * 0.95))]:>8.3f} "
+                  f"{'/'.join(map(str, per_worker)):>12}")
+            for stats in results:
+                os.remove(stats.output_file)
+    logging.disable(logging.NOTSET)
+
+
+def _threaded_round(flows, source):
+    # One round of flows blocking send_file threads against run_multi_server, returns completed transfers
+    from v5_client import PROTOCOL_RENO, send_file
+    from v5_server import run_multi_server
+    results = []
+    server = threading.Thread(target=lambda: results.extend(
+        run_multi_server(1, 0.0, max_transfers=flows, idle_timeout=SCALING_IDLE_TIMEOUT)), daemon=True)
+    server.start()
+    time.sleep(0.2)  # give the server a moment to bind()
+
+    def client():
+        try:
+            send_file(1, 0.0, PROTOCOL_RENO, packet_source=source)
+        except OSError:
+            pass
+    threads = [threading.Thread(target=client) for _ in range(flows)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.join(timeout=SCALING_IDLE_TIMEOUT + 5)
+    return results
+
+
+async def _async_round(flows, source):
+    # The same round with send_file_async flows and run_server_async on one event loop
+    import asyncio
+    from v5_async import run_server_async, send_file_async
+    ready = asyncio.Event()
+    server = asyncio.ensure_future(run_server_async(1, 0.0, max_transfers=flows, idle_timeout=SCALING_IDLE_TIMEOUT,
+                                                    on_ready=ready.set))
+    await ready.wait()
+    await asyncio.gather(*(send_file_async(1, 0.0, packet_source=source) for _ in range(flows)),
+                         return_exceptions=True)
+    return await server
+
+
+def bench_async():
+    """
+    CPU time per transfer with a thread per blocking client against one asyncio loop.
+    Client and server share this process in both cases, so the CPU figure covers both
+    ends; the blocking client's 10 ms socket polling shows up as CPU spent idle.
+    """
+    import asyncio
+    from v5_helpers import PacketSource
+    from v5_client import PACKET_SIZE
+
+    print(f"=== Threads against asyncio ({SCALING_FILE_BYTES // 1024} KB per flow, loopback) ===")
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as folder:
+        file_name = os.path.join(folder, "payload.bin")
+        with open(file_name, "wb") as f:
+            f.write(os.urandom(SCALING_FILE_BYTES))
+        source = PacketSource(file_name, PACKET_SIZE)
+
+        print(f"{'flows':>6} {'transport':>10} {'done':>5} {'wall s':>8} {'cpu ms/transfer':>16}")
+        for flows in ASYNC_FLOWS:
+            for name, run in (("threads", lambda: _threaded_round(flows, source)),
+                              ("asyncio", lambda: asyncio.run(_async_round(flows, source)))):
+                start, cpu_start = time.perf_counter(), time.process_time()
+                results = run()
+                elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+                completed = [stats for stats in results if stats.completed and stats.bytes == SCALING_FILE_BYTES]
+                print(f"{flows:>6} {name:>10} {len(completed):>5} {elapsed:>8.2f} "
+                      f"{cpu * 1000 / max(1, len(completed)):>16.2f}")
+                for stats in results:
+                    os.remove(stats.output_file)
+        source.close()
+    logging.disable(logging.NOTSET)
+
+
+def _silent_server(sock, retransmits, arrivals):
+    # Completes the handshake, then drops segment 0 until it has arrived retransmits + 1 times
+    from v5_wire import FRAME_DATA, FRAME_SYN, FRAME_SYN_ACK, FRAME_FIN, FRAME_FIN_ACK
+    from v5_wire import encode_control, encode_ack, parse_handshake, parse_frame
+    version = None
+    while True:
+        data, addr = sock.recvfrom(2048)
+        now = time.monotonic()
+        handshake = parse_handshake(data)
+        if handshake is not None:
+            if handshake.frame_type == FRAME_SYN:
+                version = handshake.version
+                sock.sendto(encode_control(version, FRAME_SYN_ACK, 0, handshake.connection_id), addr)
+            continue
+        frame = parse_frame(data, version)
+        if frame is None:
+            continue
+        if frame[0] == FRAME_DATA and frame[1] == 0:
+            arrivals.append(now)
+            if len(arrivals) > retransmits:
+                sock.sendto(encode_ack(version, 0), addr)
+        elif frame[0] == FRAME_FIN:
+            sock.sendto(encode_control(version, FRAME_FIN_ACK), addr)
+            return
+
+
+def bench_rto():
+    """
+    How close to the RTO the client retransmits, and what it costs while it waits.
+    A one segment transfer to a server that drops it RTO_RETRANSMITS times, so every
+    gap between copies is one timeout.
+    """
+    from v5_client import SERVER_PORT, PROTOCOL_RENO, send_file
+
+    print(f"=== RTO precision ({RTO_RETRANSMITS} timeouts per value, loopback) ===")
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as folder:
+        file_name = os.path.join(folder, "segment.bin")
+        with open(file_name, "wb") as f:
+            f.write(os.urandom(512))
+
+        print(f"{'rto ms':>7} {'mean late ms':>13} {'p95 late ms':>12} {'max late ms':>12} {'client cpu %':>13}")
+        for rto in RTO_VALUES:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("", SERVER_PORT))
+            arrivals = []
+            server = threading.Thread(target=_silent_server, args=(sock, RTO_RETRANSMITS, arrivals), daemon=True)
+            server.start()
+
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            # max_rto=rto keeps every timeout at rto instead of backing off
+            send_file(1, 0.0, PROTOCOL_RENO, file_name=file_name, initial_timeout=rto, max_rto=rto)
+            elapsed, cpu = time.perf_counter() - start, time.thread_time() - cpu_start
+            server.join(timeout=5)
+            sock.close()
+
+            late = sorted((b - a - rto) * 1000 for a, b in zip(arrivals, arrivals[1:])) or [0.0]
+            print(f"{rto * 1000:>7.0f} {sum(late) / len(late):>13.3f} {late[int(len(late) * 0.95)]:>12.3f} "
+                  f"{late[-1]:>12.3f} {cpu * 100 / elapsed:>13.1f}")
+    logging.disable(logging.NOTSET)
+
+
+def bench_window():
+    """
+    Sender cost per ACK as the window grows. SenderCore is driven directly with
+    in-order cumulative ACKs, each one freeing a slot that the next poll refills,
+    so the window stays full at max_window segments the whole time.
+
+    The loss column repeats this with SACK on and the first segment of every
+    window lost: the rest of the window comes back as duplicate ACKs whose SACK
+    block grows by one segment each, then one cumulative ACK covers it all.
+    """
+    from v5_helpers import PacketSource
+    from v5_sender import SenderCore, PROTOCOL_RENO
+    from v5_wire import encode_ack
+
+    print(f"=== Sender window ({WINDOW_ACKS} ACKs per size) ===")
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as folder:
+        file_name = os.path.join(folder, "payload.bin")
+        segments = WINDOW_ACKS + 2 * max(WINDOW_SIZES)
+        with open(file_name, "wb") as f:
+            f.truncate(segments * 1024)
+        source = PacketSource(file_name, 1024)
+        acks = [encode_ack(WIRE_V2, seq) for seq in range(WINDOW_ACKS)]
+
+        print(f"{'max_window':>11} {'us/ACK':>8} {'ACKs/sec':>12} {'loss us/ACK':>12}")
+        for window in WINDOW_SIZES:
+            core = SenderCore(source, PROTOCOL_RENO, WIRE_V2, initial_cwnd=window, max_window=window)
+            core.poll_segments()
+            start = time.perf_counter()
+            for ack in acks:
+                core.on_ack_datagram(ack)
+                core.poll_segments()
+            elapsed = time.perf_counter() - start
+
+            # Segment 0 is ACKed first, since a duplicate of the ACK before it would be -1
+            loss_acks = [encode_ack(WIRE_V2, 0)]
+            base = 1
+            while len(loss_acks) < WINDOW_ACKS:
+                loss_acks += [encode_ack(WIRE_V2, base - 1, [(base + 1, base + 1 + sacked)])
+                              for sacked in range(1, window)]
+                loss_acks.append(encode_ack(WIRE_V2, base + window - 1))
+                base += window
+            core = SenderCore(source, PROTOCOL_RENO, WIRE_V2, sack_enabled=True, initial_cwnd=window,
+                              max_window=window)
+            core.poll_segments()
+            start = time.perf_counter()
+            for ack in loss_acks:
+                core.on_ack_datagram(ack)
+                core.poll_segments()
+            loss_elapsed = time.perf_counter() - start
+            print(f"{window:>11} {elapsed / WINDOW_ACKS * 1e6:>8.2f} {WINDOW_ACKS / elapsed:>12,.0f} "
+                  f"{loss_elapsed / len(loss_acks) * 1e6:>12.2f}")
+        source.close()
+    logging.disable(logging.NOTSET)
+
+
+def bench_timers():
+    """
+    Arm and cancel TIMER_COUNT retransmission timers with the timer wheel, against a
+    heapq with lazy cancellation (the usual alternative). Then arm them all again and
+    expire them in 1 ms batches, as a client loop would.
+    """
+    import heapq
+    import random
+    from v5_timer_wheel import TimerWheel
+
+    print(f"=== Timer wheel ({TIMER_COUNT:,} timers, deadlines up to 1 s out) ===")
+    deadlines = [random.random() for _ in range(TIMER_COUNT)]
+
+    wheel = TimerWheel(now=0.0)
+    start = time.perf_counter()
+    handles = [wheel.arm(deadline, seq) for seq, deadline in enumerate(deadlines)]
+    for handle in handles:
+        wheel.cancel(handle)
+    wheel_time = time.perf_counter() - start
+
+    heap = []
+    cancelled = set()
+    start = time.perf_counter()
+    for seq, deadline in enumerate(deadlines):
+        heapq.heappush(heap, (deadline, seq))
+    for seq in range(TIMER_COUNT):
+        cancelled.add(seq)
+    while heap:  # cancelled entries still have to be popped before the heap is empty
+        if heapq.heappop(heap)[1] in cancelled:
+            continue
+    heap_time = time.perf_counter() - start
+
+    print(f"{'arm + cancel':<16} {'ns/timer':>9} {'timers/sec':>13}")
+    for name, elapsed in (("timer wheel", wheel_time), ("heapq", heap_time)):
+        print(f"{name:<16} {elapsed / TIMER_COUNT * 1e9:>9.0f} {TIMER_COUNT / elapsed:>13,.0f}")
+
+    for seq, deadline in enumerate(deadlines):
+        wheel.arm(deadline, seq)
+    start = time.perf_counter()
+    fired = 0
+    now = 0.0
+    while len(wheel):
+        now += 0.001
+        fired += len(wheel.expire(now))
+    elapsed = time.perf_counter() - start
+    print(f"expire in batches: {fired:,} timers in {elapsed:.2f}s, {elapsed / fired * 1e9:.0f} ns/timer")
+
+
+BENCHMARKS = {
+    "checksum": bench_checksum,
+    "parse": bench_parse,
+    "recv": bench_recv,
+    "mmsg": bench_mmsg,
+    "offload": bench_offload,
+    "scaling": bench_scaling,
+    "sharded": bench_sharded,
+    "async": bench_async,
+    "rto": bench_rto,
+    "window": bench_window,
+    "timers": bench_timers,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}', choose from: {', '.join(BENCHMARKS)}")
+            continue
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main()
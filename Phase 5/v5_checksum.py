@@ -0,0 +1,100 @@
+"""
+Benjamin Dearden
+Michael Smith
+Peter Dingue
+Kathy Doan
+v5_checksum.py for Phase 5 EECE 4830 Project
+
+Internet checksum (16-bit ones' complement sum) used by the phase 5 client and
+server. The sum is taken over the payload viewed as big-endian 16-bit words,
+with an odd trailing byte padded with zero, and the complement is returned.
+
+NumPy is used when it is installed. Otherwise a pure-Python fallback built on
+array('H') gives the same results. checksum_many() checksums a list of
+payloads in one call, which is how PacketSource precomputes a whole file.
+
+"""
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, fall back to the array based sum
+    np = None
+
+HAVE_NUMPY = np is not None
+
+# Payloads below this size are faster through the fallback than through NumPy
+NUMPY_MIN_BYTES = 256
+
+
+def _fold(total):
+    # Fold the carries back into the low 16 bits until none are left
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return total
+
+
+def _pad(data):
+    if len(data) % 2 == 1:
+        return bytes(data) + b'\x00'
+    return data
+
+
+def checksum_loop(data):
+    """Reference word-at-a-time implementation (the original helper loop)."""
+    if len(data) % 2 == 1:
+        data = bytes(data) + b'\x00'
+    total = 0
+    for i in range(0, len(data), 2):
+        word = (data[i] << 8) + data[i + 1]
+        total += word
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def checksum_python(data):
+    """Pure-Python checksum that sums machine words through array('H')."""
+    words = array('H')
+    words.frombytes(_pad(data))
+    if sys.byteorder == 'little':
+        words.byteswap()
+    return ~_fold(sum(words)) & 0xFFFF
+
+
+def checksum_numpy(data):
+    """NumPy checksum over a big-endian uint16 view of the payload."""
+    words = np.frombuffer(_pad(data), dtype='>u2')
+    return ~_fold(int(words.sum(dtype=np.uint64))) & 0xFFFF
+
+
+def checksum(data):
+    """Drop-in replacement for the old helper checksum(data)."""
+    if HAVE_NUMPY and len(data) >= NUMPY_MIN_BYTES:
+        return checksum_numpy(data)
+    return checksum_python(data)
+
+
+def checksum_many(payloads):
+    """
+    Checksum a list of payloads in one call and return a list of ints.
+    With NumPy the payloads are joined into one word buffer and summed with
+    a single np.add.reduceat, otherwise each payload goes through the fallback.
+    """
+    payloads = list(payloads)
+    if not HAVE_NUMPY or not payloads:
+        return [checksum_python(p) for p in payloads]
+
+    padded = [_pad(p) for p in payloads]
+    words = np.frombuffer(b''.join(padded), dtype='>u2').astype(np.uint64)
+    lengths = np.fromiter((len(p) // 2 for p in padded), dtype=np.int64, count=len(padded))
+    starts = np.zeros(len(padded), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+
+    results = [0xFFFF] * len(padded)  # checksum of an empty payload
+    non_empty = np.nonzero(lengths)[0]
+    if len(non_empty):
+        sums = np.add.reduceat(words, starts[non_empty])
+        for index, total in zip(non_empty.tolist(), sums.tolist()):
+            results[index] = ~_fold(total) & 0xFFFF
+    return results
@@ -9,12 +9,22 @@ This client file simulates a simplified TCP sender. Simulated error is
 present in this file for use with the harness script to run simulation tests.
 
 """
+import os
 import socket
 import time
-import os
+import selectors
 import random
 import logging
-from v5_helpers import make_packet, checksum
+from itertools import repeat
+from v5_helpers import PacketSource
+from v5_io import send_segment, BatchSender, BatchReceiver, TimestampReceiver
+from v5_sender import SenderCore, MAX_WINDOW_SIZE, MIN_RTO, MAX_RTO
+# Protocol ids are re-exported for the harness and callers of send_file
+from v5_sender import (PROTOCOL_SLOW_START_ONLY, PROTOCOL_AIMD_ONLY, PROTOCOL_TAHOE,
+                       PROTOCOL_RENO, PROTOCOL_CUBIC, PROTOCOL_BBR, PROTOCOL_VEGAS,
+                       PROTOCOL_NEWRENO, PROTOCOL_NEWRENO_PRR)
+from v5_wire import (DEFAULT_WIRE_VERSION, WIRE_V1, FLAG_SACK, FLAG_TIMESTAMP, FRAME_SYN, FRAME_SYN_ACK, FRAME_ACK,
+                     FRAME_FIN, FRAME_FIN_ACK, FRAME_END, encode_control, parse_handshake, parse_frame)
 
 random.seed(123)
 
@@ -32,282 +42,127 @@ logger = logging.getLogger("Client")
 SERVER_ADDRESS = '127.0.0.1'
 SERVER_PORT = 12000
 PACKET_SIZE = 1024
-INIT_TIMEOUT = 0.5  # initial RTO in seconds
-INIT_CWND = 1
-SS_THRESH = 16
-MAX_WINDOW_SIZE = 50
-ALPHA = 0.125
-BETA = 0.25
-DUPLICATE_ACK_THRESHOLD = 3
-
-# TCP Control Flags
-SYN = "SYN"
-SYN_ACK = "SYN-ACK"
-ACK = "ACK"
-FIN = "FIN"
-
-# Congestion Control Protocol Types
-PROTOCOL_SLOW_START_ONLY = 1  # Only implements Slow Start
-PROTOCOL_AIMD_ONLY = 2  # Only implements AIMD
-PROTOCOL_TAHOE = 3  # TCP Tahoe
-PROTOCOL_RENO = 4  # TCP Reno
-
-
-def tcp_handshake(sock):
-    sock.settimeout(1)
-    logger.info("Starting 3-way handshake")
-    sock.sendto(SYN.encode(), (SERVER_ADDRESS, SERVER_PORT))
-    try:
-        data, _ = sock.recvfrom(1024)
-        if data.decode() == SYN_ACK:
-            sock.sendto(ACK.encode(), (SERVER_ADDRESS, SERVER_PORT))
-            logger.info("Handshake complete")
-            return True
-    except socket.timeout:
-        logger.warning("Handshake failed")
-    return False
+HANDSHAKE_ATTEMPTS = 3  # SYNs sent before giving up, a busy server may drop the first one
 
 
-def tcp_teardown(sock):
+def tcp_handshake(sock, wire_version=DEFAULT_WIRE_VERSION, sack=True, timestamps=True):
+    # Offers wire_version and the SACK and timestamp options in the SYN, along with a random connection id.
+    # Returns (version, flags) the server agreed to and the SYN's RTT, or (None, 0, None) on failure.
+    # The RTT is None when the SYN had to be resent, as that SYN-ACK could answer either copy.
+    sock.settimeout(1)
+    connection_id = int.from_bytes(os.urandom(4), "big")
+    options = (FLAG_SACK if sack else 0) | (FLAG_TIMESTAMP if timestamps else 0)
+    logger.info(f"Starting 3-way handshake (offering wire version {wire_version})")
+    for attempt in range(HANDSHAKE_ATTEMPTS):
+        sent = time.monotonic()
+        sock.send(encode_control(wire_version, FRAME_SYN, options, connection_id))
+        try:
+            data, _ = sock.recvfrom(1024)
+        except socket.timeout:
+            logger.warning("No SYN-ACK, resending SYN")
+            continue
+        reply = parse_handshake(data)
+        if reply is not None and reply.frame_type == FRAME_SYN_ACK:
+            sock.send(encode_control(reply.version, FRAME_ACK))
+            logger.info(f"Handshake complete, using wire version {reply.version}, options {reply.flags:#x}")
+            return reply.version, reply.flags, time.monotonic() - sent if attempt == 0 else None
+    logger.warning("Handshake failed")
+    return None, 0, None
+
+
+def tcp_teardown(sock, wire_version):
     logger.info("Starting connection teardown")
     sock.settimeout(1)
     try:
-        sock.sendto(FIN.encode(), (SERVER_ADDRESS, SERVER_PORT))
+        sock.send(encode_control(wire_version, FRAME_FIN))
         data, _ = sock.recvfrom(1024)
-        response = data.decode(errors='ignore').strip()
-        if response == ACK:
+        response = parse_frame(data, wire_version)
+        if response is not None and response[0] == FRAME_FIN_ACK:
             logger.info("Teardown acknowledged by server")
         else:
-            logger.warning(f"Unexpected response during teardown: '{response}'")
+            logger.warning(f"Unexpected response during teardown: {bytes(data[:32])!r}")
     except socket.timeout:
         logger.warning("Timeout waiting for server ACK during teardown")
 
 
 def send_file(simulation_mode, error_rate, congestion_protocol, file_name="cat.jpeg",
-              initial_timeout=None, initial_cwnd=None):
+              initial_timeout=None, initial_cwnd=None, packet_source=None, wire_version=DEFAULT_WIRE_VERSION,
+              batch_io=True, offload=False, sack=True, max_window=MAX_WINDOW_SIZE, pacing_gain=None,
+              server=(SERVER_ADDRESS, SERVER_PORT), rack=False, min_rto=MIN_RTO, max_rto=MAX_RTO,
+              timestamps=True, kernel_timestamps=False):
+    # A PacketSource can be shared across transfers of the same file, otherwise one is built here
+    owns_source = packet_source is None
+    if owns_source:
+        packet_source = PacketSource(file_name, PACKET_SIZE)
+
+    # Connected UDP socket, so neither the batched nor the plain calls pass the address
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    if not tcp_handshake(sock):
+    sock.connect(server)
+    wire_version, options, handshake_rtt = tcp_handshake(sock, wire_version, sack and wire_version != WIRE_V1,
+                                                         timestamps and wire_version != WIRE_V1)
+    if wire_version is None:
         sock.close()
-        return 0, 0, 0, [], [], []
-
-    base = 0
-    next_seq = 0
-    cwnd = initial_cwnd if initial_cwnd else INIT_CWND
-    ssthresh = SS_THRESH
-    timer = None
-    packets = {}
-    rto = initial_timeout if initial_timeout else INIT_TIMEOUT
-    estimated_rtt = None
-    dev_rtt = 0
-    retransmissions = 0
-
-    # History data for plotting
-    cwnd_history = []
-    rtt_history = []
-    rto_history = []
-
-    # For TCP Reno
-    duplicate_acks = {}
-    fast_recovery = False
-
-    start_time = time.time()
-    file_end = False
-
-    # Record initial values
-    cwnd_history.append((0, cwnd))
-    rto_history.append((0, rto))
-
-    logger.info(f"Using congestion protocol: {congestion_protocol}")
-
-    while not file_end or base != next_seq:
-        # Record cwnd at this point in time
-        cwnd_history.append((time.time() - start_time, cwnd))
-
-        while next_seq < base + cwnd and not file_end:
-            packet = make_packet(file_name, next_seq, PACKET_SIZE)
-            if packet is None:
-                file_end = True
-                break
-            sock.sendto(packet, (SERVER_ADDRESS, SERVER_PORT))
-            packets[next_seq] = (packet, time.time())
-            if base == next_seq:
-                timer = time.time()
-            logger.debug(f"Sent packet {next_seq}")
-            next_seq += 1
-
-        sock.settimeout(0.01)
-        try:
-            ack_data, _ = sock.recvfrom(2048)
-            ack_str = ack_data.decode(errors='ignore')
-
-            if simulation_mode == 2 and random.random() < error_rate:
-                logger.warning("Simulating ACK bit - error")
-                ack_str = str(random.randint(0, max(0, base - 1)))
-
-            if simulation_mode == 4 and random.random() < error_rate:
-                logger.warning("Simulating ACK loss error (skipping this ACK)")
-                continue
-
-            if ack_str.isdigit():
-                ack = int(ack_str)
-
-                # Check for duplicate ACKs (TCP Reno)
-                if ack < base:  # Any ACK that doesn't advance the window could be a duplicate
-                    # Track duplicate ACKs by sequence number
-                    duplicate_acks[ack] = duplicate_acks.get(ack, 0) + 1
-
-                    # Fast Retransmit and Fast Recovery (for RENO only)
-                    if congestion_protocol == PROTOCOL_RENO and duplicate_acks[ack] == DUPLICATE_ACK_THRESHOLD:
-                        logger.debug(f"Triple duplicate ACK for {ack}, triggering Fast Retransmit and Fast Recovery")
-
-                        # The most likely lost packet is the one right after the ACK
-                        lost_packet_seq = ack + 1
-
-                        if lost_packet_seq in packets:
-                            sock.sendto(packets[lost_packet_seq][0], (SERVER_ADDRESS, SERVER_PORT))
-                            retransmissions += 1
-
-                            # Enter Fast Recovery: Standard TCP Reno approach
-                            ssthresh = max(int(cwnd / 2), 2)  # Cut window in half
-                            cwnd = ssthresh + 3  # Initial inflation by 3 segments
-                            fast_recovery = True
-
-                            # Reset the timer after retransmission
-                            timer = time.time()
-
-                            logger.debug(f"Fast Recovery: cwnd={cwnd}, ssthresh={ssthresh}")
-
-                    elif congestion_protocol == PROTOCOL_RENO and duplicate_acks[
-                        ack] > DUPLICATE_ACK_THRESHOLD and fast_recovery:
-                        # For each additional duplicate ACK during Fast Recovery:
-                        # 1. Inflate window by one segment
-                        # 2. Send a new segment if possible
-                        cwnd += 1
-                        logger.debug(f"Fast Recovery inflation: cwnd={cwnd}")
-
-                        # Try to send a new packet if window allows
-                        if next_seq < base + cwnd and not file_end:
-                            packet = make_packet(file_name, next_seq, PACKET_SIZE)
-                            if packet is not None:
-                                sock.sendto(packet, (SERVER_ADDRESS, SERVER_PORT))
-                                packets[next_seq] = (packet, time.time())
-                                logger.debug(f"Fast Recovery: Sent new packet {next_seq}")
-                                next_seq += 1
-
-                    # For non-RENO protocols - just track duplicate ACKs but don't do fast recovery
-                    elif congestion_protocol in [PROTOCOL_TAHOE] and duplicate_acks[ack] == DUPLICATE_ACK_THRESHOLD:
-                        logger.debug(
-                            f"Triple duplicate ACK for {ack}, triggering Fast Retransmit (without Fast Recovery)")
-
-                        # Retransmit the suspected lost packet
-                        lost_packet_seq = ack + 1
-                        if lost_packet_seq in packets:
-                            sock.sendto(packets[lost_packet_seq][0], (SERVER_ADDRESS, SERVER_PORT))
-                            retransmissions += 1
-
-                            # Cut window in half (like Tahoe but without going all the way to 1)
-                            ssthresh = max(int(cwnd / 2), 2)
-                            cwnd = 1  # Tahoe goes back to slow start
-
-                            # Reset the timer after retransmission
-                            timer = time.time()
-
-                            logger.debug(f"Fast Retransmit: cwnd={cwnd}, ssthresh={ssthresh}")
-
-                elif ack >= base:  # New ACK that advances the window
-                    # Calculate how many new segments were acknowledged
-                    newly_acked = ack - base + 1
-
-                    # Reset duplicate ACK counter and exit Fast Recovery if active
-                    duplicate_acks.clear()
-
-                    if congestion_protocol == PROTOCOL_RENO and fast_recovery:
-                        # Exit Fast Recovery properly for RENO:
-                        # 1. Set cwnd to ssthresh (deflate the window)
-                        cwnd = ssthresh
-                        fast_recovery = False
-                        logger.debug(f"Exiting Fast Recovery: cwnd={cwnd}")
-                    else:
-                        # Normal cwnd update (not in Fast Recovery)
-                        if congestion_protocol in [PROTOCOL_SLOW_START_ONLY, PROTOCOL_TAHOE,
-                                                   PROTOCOL_RENO] and cwnd < ssthresh:
-                            # Slow Start: Increase exponentially
-                            cwnd += newly_acked  # Increase by number of newly acked segments
-                            logger.debug(f"Slow Start: cwnd={cwnd}")
-                        elif congestion_protocol in [PROTOCOL_AIMD_ONLY, PROTOCOL_TAHOE, PROTOCOL_RENO]:
-                            # Congestion Avoidance: Increase linearly
-                            cwnd += newly_acked / cwnd  # Add fractional increase
-                            logger.debug(f"Congestion Avoidance: cwnd={cwnd}")
-
-                    # Calculate RTT and update RTO
-                    if ack in packets:
-                        sample_rtt = time.time() - packets[ack][1]
-                        rtt_history.append((time.time() - start_time, sample_rtt))
-
-                        if estimated_rtt is None:
-                            estimated_rtt = sample_rtt
-                        else:
-                            # Standard RTT estimation (RFC 6298)
-                            estimated_rtt = (1 - ALPHA) * estimated_rtt + ALPHA * sample_rtt
-                            dev_rtt = (1 - BETA) * dev_rtt + BETA * abs(sample_rtt - estimated_rtt)
-
-                        # Update RTO with 4*DevRTT variance
-                        rto = estimated_rtt + 4 * dev_rtt
-                        # Ensure RTO is not too small
-                        rto = max(rto, 0.05)  # Minimum RTO of 50ms
-                        rto_history.append((time.time() - start_time, rto))
-
-                        logger.debug(f"ACK {ack} received. RTT={sample_rtt:.4f}s, RTO={rto:.4f}s")
-
-                    # Update base and manage the send window
-                    base = ack + 1
-                    # Reset timer if there are unacknowledged packets
-                    timer = time.time() if base != next_seq else None
-
-                    # Clean up acknowledged packets
-                    for seq in list(packets):
-                        if seq <= ack:
-                            del packets[seq]
-        except socket.timeout:
-            pass
-
-        if timer and time.time() - timer > rto:
-            logger.warning(f"Timeout: retransmitting from {base}")
-
-            # Different timeout behaviors based on protocol
-            if congestion_protocol in [PROTOCOL_TAHOE, PROTOCOL_RENO]:
-                # Tahoe and Reno both reduce ssthresh to half of cwnd
-                ssthresh = max(int(cwnd / 2), 1)
-                cwnd = 1  # TCP Tahoe and Reno reset to 1 on timeout
-                logger.debug(f"Timeout: cwnd={cwnd}, ssthresh={ssthresh}")
-            elif congestion_protocol == PROTOCOL_AIMD_ONLY:
-                # For AIMD only, we'll reduce the window but not go back to slow start
-                ssthresh = max(int(cwnd / 2), 1)
-                cwnd = ssthresh  # Set cwnd to the new threshold
-                logger.debug(f"Timeout: cwnd={cwnd}, ssthresh={ssthresh}")
-            # For SLOW_START_ONLY, we keep growing the window and don't reduce
-
-            # Record the window change due to timeout
-            cwnd_history.append((time.time() - start_time, cwnd))
-
-            # Retransmit all unacknowledged packets
-            for seq in range(base, next_seq):
-                if seq in packets:
-                    sock.sendto(packets[seq][0], (SERVER_ADDRESS, SERVER_PORT))
-                    packets[seq] = (packets[seq][0], time.time())
-                    retransmissions += 1
-            timer = time.time()
-
-    sock.sendto("END".encode(), (SERVER_ADDRESS, SERVER_PORT))
-    tcp_teardown(sock)
+        if owns_source:
+            packet_source.close()
+        return 0, 0, 0, [], [], [], None, []
+
+    # Congestion control, RTO and SACK recovery live in the sans-IO core, this loop only moves datagrams
+    core = SenderCore(packet_source, congestion_protocol, wire_version, bool(options & FLAG_SACK),
+                      simulation_mode, error_rate, initial_timeout, initial_cwnd, max_window, pacing_gain, rack,
+                      min_rto, max_rto, handshake_rtt, bool(options & FLAG_TIMESTAMP))
+
+    # Window bursts go out in one sendmmsg and queued ACKs are drained with one recvmmsg (Linux).
+    # With offload, contiguous runs of full segments go out as single UDP GSO sends instead.
+    # With kernel_timestamps, ACKs are read one recvmsg at a time so each brings the kernel's receive time.
+    sender = BatchSender(sock, enabled=batch_io, gso=offload)
+    receiver = TimestampReceiver(sock) if kernel_timestamps else None
+    kernel_arrivals = receiver is not None and receiver.enabled
+    if not kernel_arrivals:
+        receiver = BatchReceiver(sock, enabled=batch_io, addresses=False)
+
+    # The loop sleeps in the selector until an ACK arrives or the RTO (or pacing) deadline passes,
+    # whichever is first, so timeouts fire on time and an idle sender does not wake up. select() takes
+    # microsecond timeouts where epoll rounds up to the next millisecond, and with one socket
+    # it costs the same. The socket itself stays blocking so sends wait for buffer space.
+    sock.settimeout(None)
+    selector = selectors.SelectSelector()
+    selector.register(sock, selectors.EVENT_READ)
+
+    logger.info(f"Using congestion protocol: {core.controller.name}")
+
+    while True:
+        now = time.monotonic()
+        sender.send_batch(core.poll_segments(now))
+        if core.done:
+            break  # the last poll may be the one that finds the end of the file
+
+        deadlines = [d for d in (core.timer_deadline, core.pacing_deadline) if d is not None]
+        if selector.select(max(0.0, min(deadlines) - now) if deadlines else None):
+            now = time.monotonic()
+            batch = receiver.recv_batch(nowait=True)
+            arrivals = receiver.arrivals if kernel_arrivals else repeat(None)
+            for (ack_data, _), arrival in zip(batch, arrivals):
+                for segment in core.on_ack_datagram(ack_data, now, arrival):
+                    send_segment(sock, *segment)
+
+        sender.send_batch(core.check_timeout(time.monotonic()))
+    selector.close()
+
+    sock.send(encode_control(wire_version, FRAME_END))
+    tcp_teardown(sock, wire_version)
     sock.close()
 
-    duration = time.time() - start_time
-    throughput = os.path.getsize(file_name) / duration
+    duration = time.monotonic() - core.start_time
+    throughput = packet_source.file_size / duration
+    if owns_source:
+        packet_source.close()
 
-    logger.info(f"Transfer completed in {duration:.2f}s, {retransmissions} retransmissions, {throughput:.2f} bytes/s")
+    logger.info(f"Transfer completed in {duration:.2f}s, {core.retransmissions} retransmissions, "
+                f"{core.timeouts} timeouts ({core.spurious_timeouts} spurious), "
+                f"{core.spurious_retransmissions} spurious retransmissions, {throughput:.2f} bytes/s")
 
-    return duration, retransmissions, throughput, cwnd_history, rtt_history, rto_history
+    return (duration, core.retransmissions, throughput, core.cwnd_history, core.rtt_history, core.rto_history,
+            core.stats(), core.python_rtt_history)
 
 
 def main():
@@ -316,7 +171,7 @@ def main():
     congestion_protocol = PROTOCOL_RENO  # Default to Reno
 
     # Run a single file transfer with data collection
-    duration, retransmissions, throughput, cwnd_history, rtt_history, rto_history = send_file(
+    duration, retransmissions, throughput, cwnd_history, rtt_history, rto_history, _, _ = send_file(
         simulation_mode, error_rate, congestion_protocol
     )
 
@@ -0,0 +1,753 @@
+"""
+Benjamin Dearden
+Michael Smith
+Peter Dingue
+Kathy Doan
+v5_congestion.py for Phase 5 EECE 4830 Project
+
+Congestion controllers for SenderCore. Loss detection, retransmission and RTT
+estimation stay in the core; a controller only decides what cwnd and ssthresh
+do. The core calls four hooks on it:
+
+    on_send(seq, now, retransmit)      every segment that goes out
+    on_ack(ack, acked, rtt, now)       an ACK advanced base by acked segments,
+                                       rtt is its sample or None; return True
+                                       to retransmit the new base right away
+    on_dupack(dupacks, now)            another duplicate ACK, return True to
+                                       fast retransmit the segment after it
+    on_timeout(now)                    the RTO fired, everything gets resent
+
+A controller that models the path can also return a pacing_rate() in
+segments per second, which the core then paces new data at.
+
+A controller is registered under its PROTOCOL_* number with @register, and
+PROTOCOL_NAMES lists every registered one in order, which is what the harness
+sweeps over. Adding an algorithm is a new class here, nothing in the send
+loop changes.
+
+"""
+import random
+import logging
+from array import array
+from collections import deque
+
+logger = logging.getLogger("Congestion")
+
+DUPLICATE_ACK_THRESHOLD = 3
+
+# Congestion Control Protocol Types
+PROTOCOL_SLOW_START_ONLY = 1  # Only implements Slow Start
+PROTOCOL_AIMD_ONLY = 2  # Only implements AIMD
+PROTOCOL_TAHOE = 3  # TCP Tahoe
+PROTOCOL_RENO = 4  # TCP Reno
+PROTOCOL_CUBIC = 5  # TCP CUBIC (RFC 9438) with HyStart
+PROTOCOL_BBR = 6  # BBR, model based (bottleneck bandwidth and min RTT)
+PROTOCOL_VEGAS = 7  # TCP Vegas, delay based
+PROTOCOL_NEWRENO = 8  # TCP NewReno (RFC 6582), stays in Fast Recovery across partial ACKs
+PROTOCOL_NEWRENO_PRR = 9  # NewReno with Proportional Rate Reduction (RFC 6937)
+
+# CUBIC parameters (RFC 9438)
+CUBIC_C = 0.4  # scales the cubic growth function, segments per second cubed
+CUBIC_BETA = 0.7  # multiplicative decrease factor
+# HyStart++ delay increase parameters (RFC 9406)
+HYSTART_LOW_WINDOW = 16  # no slow start exit below this cwnd
+HYSTART_MIN_SAMPLES = 8  # RTT samples per round before comparing against the last round
+HYSTART_MIN_ETA = 0.004  # seconds
+HYSTART_MAX_ETA = 0.016  # seconds
+HYSTART_ACK_DELTA = 0.002  # ACKs closer together than this count as one train
+
+# BBR parameters (draft-cardwell-iccrg-bbr-congestion-control, version 1)
+BBR_HIGH_GAIN = 2.885  # 2 / ln 2, doubles the sending rate every round in STARTUP
+BBR_DRAIN_GAIN = 1 / BBR_HIGH_GAIN
+BBR_CWND_GAIN = 2.0
+BBR_PROBE_GAINS = [1.25, 0.75, 1, 1, 1, 1, 1, 1]  # PROBE_BW pacing gain cycle, one phase per min RTT
+BBR_BW_WINDOW = 10  # rounds the max bandwidth filter covers
+BBR_MIN_RTT_WINDOW = 10.0  # seconds a min RTT sample stays valid before PROBE_RTT
+BBR_PROBE_RTT_TIME = 0.2  # seconds spent at BBR_MIN_CWND in PROBE_RTT
+BBR_MIN_CWND = 4
+BBR_FULL_BW_GROWTH = 1.25  # STARTUP ends once a round grows the bandwidth by less than this...
+BBR_FULL_BW_ROUNDS = 3  # ...this many rounds in a row
+
+# Vegas thresholds, in segments queued at the bottleneck
+VEGAS_ALPHA = 2  # grow cwnd below this
+VEGAS_BETA = 4  # shrink cwnd above this
+VEGAS_GAMMA = 1  # leave slow start above this
+VEGAS_MIN_SAMPLES = 3  # RTT samples a round needs before Vegas trusts it, otherwise grow like Reno
+
+# Registered controller classes and their display names, by protocol number
+CONTROLLERS = {}
+PROTOCOL_NAMES = {}
+
+
+def register(protocol, name):
+    """Class decorator that makes a controller selectable as congestion_protocol=protocol."""
+    def decorator(cls):
+        cls.protocol = protocol
+        cls.name = name
+        CONTROLLERS[protocol] = cls
+        PROTOCOL_NAMES[protocol] = name
+        return cls
+    return decorator
+
+
+def create_controller(protocol, core):
+    """New controller instance for one SenderCore."""
+    try:
+        return CONTROLLERS[protocol](core)
+    except KeyError:
+        raise ValueError(f"Unknown congestion protocol {protocol}") from None
+
+
+class CongestionController:
+    """
+    Base controller, every hook is a no-op so cwnd never changes.
+    Subclasses read and write core.cwnd and core.ssthresh; the core caps what it
+    sends at max_window whatever cwnd is.
+    """
+    protocol = None
+    name = None
+
+    def __init__(self, core):
+        self.core = core
+
+    def on_send(self, seq, now, retransmit):
+        pass
+
+    def on_ack(self, ack, acked, rtt, now):
+        pass
+
+    def on_dupack(self, dupacks, now):
+        return False
+
+    def on_timeout(self, now):
+        pass
+
+    def pacing_rate(self):
+        """Segments per second to pace at, None leaves pacing to the core's pacing_gain."""
+        return None
+
+    def slow_start(self, acked):
+        # Increase exponentially, by the number of newly acked segments
+        core = self.core
+        core.cwnd = min(core.cwnd + acked, core.max_window)
+        logger.debug(f"Slow Start: cwnd={core.cwnd}")
+
+    def congestion_avoidance(self, acked):
+        # Increase linearly, by a fraction of a segment per ACK
+        core = self.core
+        core.cwnd = min(core.cwnd + acked / core.cwnd, core.max_window)
+        logger.debug(f"Congestion Avoidance: cwnd={core.cwnd}")
+
+
+@register(PROTOCOL_SLOW_START_ONLY, "Slow Start Only")
+class SlowStartOnly(CongestionController):
+    """Grows exponentially up to ssthresh and then holds, never backs off."""
+
+    def on_ack(self, ack, acked, rtt, now):
+        if self.core.cwnd < self.core.ssthresh:
+            self.slow_start(acked)
+
+
+@register(PROTOCOL_AIMD_ONLY, "AIMD Only")
+class AimdOnly(CongestionController):
+    """Additive increase from the start, halves the window on a timeout."""
+
+    def on_ack(self, ack, acked, rtt, now):
+        self.congestion_avoidance(acked)
+
+    def on_timeout(self, now):
+        # Reduce the window but don't go back to slow start
+        core = self.core
+        core.ssthresh = max(int(core.cwnd / 2), 1)
+        core.cwnd = core.ssthresh
+        logger.debug(f"Timeout: cwnd={core.cwnd}, ssthresh={core.ssthresh}")
+
+
+@register(PROTOCOL_TAHOE, "TCP Tahoe")
+class Tahoe(CongestionController):
+    """Slow start and congestion avoidance, back to cwnd 1 on any loss."""
+
+    def on_ack(self, ack, acked, rtt, now):
+        if self.core.cwnd < self.core.ssthresh:
+            self.slow_start(acked)
+        else:
+            self.congestion_avoidance(acked)
+
+    def on_dupack(self, dupacks, now):
+        if dupacks != DUPLICATE_ACK_THRESHOLD:
+            return False
+        # Fast Retransmit without Fast Recovery: halve ssthresh and go back to slow start
+        core = self.core
+        core.ssthresh = max(int(core.cwnd / 2), 2)
+        core.cwnd = 1
+        logger.debug(f"Fast Retransmit: cwnd={core.cwnd}, ssthresh={core.ssthresh}")
+        return True
+
+    def on_timeout(self, now):
+        core = self.core
+        core.ssthresh = max(int(core.cwnd / 2), 1)
+        core.cwnd = 1
+        logger.debug(f"Timeout: cwnd={core.cwnd}, ssthresh={core.ssthresh}")
+
+
+@register(PROTOCOL_RENO, "TCP Reno")
+class Reno(Tahoe):
+    """Tahoe plus Fast Recovery: halve the window on a triple duplicate ACK instead of restarting."""
+
+    def __init__(self, core):
+        super().__init__(core)
+        self.fast_recovery = False
+
+    def on_ack(self, ack, acked, rtt, now):
+        if self.fast_recovery:
+            # Exit Fast Recovery: deflate the window to ssthresh
+            self.core.cwnd = self.core.ssthresh
+            self.fast_recovery = False
+            logger.debug(f"Exiting Fast Recovery: cwnd={self.core.cwnd}")
+        else:
+            super().on_ack(ack, acked, rtt, now)
+
+    def on_dupack(self, dupacks, now):
+        core = self.core
+        if dupacks == DUPLICATE_ACK_THRESHOLD:
+            # Enter Fast Recovery: cut the window in half and inflate it by the 3 segments that left
+            core.ssthresh = max(int(core.cwnd / 2), 2)
+            core.cwnd = core.ssthresh + 3
+            self.fast_recovery = True
+            logger.debug(f"Fast Recovery: cwnd={core.cwnd}, ssthresh={core.ssthresh}")
+            return True
+        if self.fast_recovery:
+            # Each further duplicate ACK means another segment left the network, inflate by one
+            core.cwnd += 1
+            logger.debug(f"Fast Recovery inflation: cwnd={core.cwnd}")
+        return False
+
+    def on_timeout(self, now):
+        self.fast_recovery = False
+        super().on_timeout(now)
+
+
+@register(PROTOCOL_CUBIC, "TCP CUBIC")
+class Cubic(CongestionController):
+    """
+    CUBIC window growth (RFC 9438). After a loss the window follows
+    W(t) = C * (t - K)^3 + W_max, which climbs quickly back towards the size it
+    had at the loss, flattens out around it and then probes beyond it, so the
+    growth depends on time since the loss rather than on the RTT. It never grows
+    slower than Reno would (the Reno-friendly estimate). Slow start starts with
+    no ssthresh and is ended by HyStart once the pipe looks full, before the
+    bottleneck queue overflows.
+    """
+
+    def __init__(self, core):
+        super().__init__(core)
+        core.ssthresh = float("inf")  # HyStart or the first loss sets it
+        self.w_max = 0.0  # window at the last congestion event
+        self.epoch_start = None  # time the current growth curve started
+        self.k = 0.0  # seconds from epoch_start until the curve reaches w_max again
+        self.origin = 0.0
+        self.w_est = 0.0  # what Reno would have grown to in the same time
+        self.min_rtt = None
+
+        # HyStart round tracking: a round ends once the segment sent at its start is ACKed
+        self.round_end = 0
+        self.last_round_min_rtt = float("inf")
+        self.round_min_rtt = float("inf")
+        self.round_samples = 0
+        self.round_start = 0.0
+        self.last_ack_time = 0.0
+
+    def on_ack(self, ack, acked, rtt, now):
+        core = self.core
+        if rtt is not None:
+            self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        if core.cwnd < core.ssthresh:
+            self.slow_start(acked)
+            self.hystart(ack, rtt, now)
+            return
+
+        if self.epoch_start is None:
+            # First ACK after a congestion event starts a new curve from the current window
+            self.epoch_start = now
+            if core.cwnd < self.w_max:
+                self.k = ((self.w_max - core.cwnd) / CUBIC_C) ** (1 / 3)
+                self.origin = self.w_max
+            else:
+                self.k = 0.0
+                self.origin = core.cwnd
+            self.w_est = core.cwnd
+
+        # Aim for where the curve will be one RTT from now
+        t = now - self.epoch_start + (self.min_rtt or 0.0)
+        target = self.origin + CUBIC_C * (t - self.k) ** 3
+        target = min(max(target, core.cwnd), 1.5 * core.cwnd)
+        if target > core.cwnd:
+            core.cwnd += (target - core.cwnd) / core.cwnd * acked
+        else:
+            core.cwnd += 0.01 * acked / core.cwnd  # plateau around w_max, creep up slowly
+
+        # Reno-friendly region: never fall behind standard AIMD with the same beta
+        self.w_est += 3 * (1 - CUBIC_BETA) / (1 + CUBIC_BETA) * acked / core.cwnd
+        core.cwnd = min(max(core.cwnd, self.w_est), core.max_window)
+        logger.debug(f"CUBIC: cwnd={core.cwnd:.2f}, target={target:.2f}, K={self.k:.3f}")
+
+    def hystart(self, ack, rtt, now):
+        # Two exits from the original HyStart, checked on every ACK of a round once cwnd is big enough:
+        # the ACK train, when closely spaced ACKs have kept coming for half the min RTT (the pipe is
+        # full), and delay increase, when the round's min RTT rose over the last round's (RFC 9406)
+        core = self.core
+        if ack >= self.round_end:
+            self.last_round_min_rtt = self.round_min_rtt
+            self.round_min_rtt = float("inf")
+            self.round_samples = 0
+            self.round_end = core.next_seq
+            self.round_start = self.last_ack_time = now
+        if core.cwnd < HYSTART_LOW_WINDOW:
+            return
+
+        if now - self.last_ack_time <= HYSTART_ACK_DELTA:
+            self.last_ack_time = now
+            if self.min_rtt is not None and now - self.round_start >= self.min_rtt / 2:
+                self.exit_slow_start(f"ACK train of {now - self.round_start:.4f}s")
+                return
+
+        if rtt is None:
+            return
+        self.round_samples += 1
+        self.round_min_rtt = min(self.round_min_rtt, rtt)
+        if self.round_samples >= HYSTART_MIN_SAMPLES and self.last_round_min_rtt != float("inf"):
+            eta = min(max(self.last_round_min_rtt / 8, HYSTART_MIN_ETA), HYSTART_MAX_ETA)
+            if self.round_min_rtt >= self.last_round_min_rtt + eta:
+                self.exit_slow_start(f"RTT rose to {self.round_min_rtt:.4f}s")
+
+    def exit_slow_start(self, reason):
+        self.core.ssthresh = self.core.cwnd
+        logger.debug(f"HyStart: {reason}, leaving slow start at cwnd={self.core.cwnd}")
+
+    def reduce(self):
+        # Remember where the loss happened; with fast convergence a flow whose window keeps
+        # shrinking releases bandwidth by aiming below its last w_max
+        core = self.core
+        if core.cwnd < self.w_max:
+            self.w_max = core.cwnd * (1 + CUBIC_BETA) / 2
+        else:
+            self.w_max = core.cwnd
+        core.ssthresh = max(core.cwnd * CUBIC_BETA, 2)
+        self.epoch_start = None
+
+    def on_dupack(self, dupacks, now):
+        if dupacks != DUPLICATE_ACK_THRESHOLD:
+            return False
+        self.reduce()
+        self.core.cwnd = self.core.ssthresh
+        logger.debug(f"CUBIC fast retransmit: cwnd={self.core.cwnd:.2f}, w_max={self.w_max:.2f}")
+        return True
+
+    def on_timeout(self, now):
+        self.reduce()
+        self.core.cwnd = 1
+        logger.debug(f"Timeout: cwnd={self.core.cwnd}, ssthresh={self.core.ssthresh:.2f}")
+
+
+@register(PROTOCOL_BBR, "BBR")
+class Bbr(CongestionController):
+    """
+    BBR (version 1). Rather than reacting to loss it keeps a model of the path:
+    the bottleneck bandwidth, the max delivery rate seen over the last
+    BBR_BW_WINDOW rounds, and the min RTT over BBR_MIN_RTT_WINDOW seconds. It
+    paces at gain * bandwidth and caps cwnd at BBR_CWND_GAIN times their
+    product (the BDP). The gain moves through four states:
+
+        STARTUP    high gain until the bandwidth stops growing
+        DRAIN      below 1 until the queue STARTUP built is gone
+        PROBE_BW   cycles BBR_PROBE_GAINS, probing for more bandwidth and
+                   draining again, one min RTT per phase
+        PROBE_RTT  cwnd at BBR_MIN_CWND for a moment to re-measure the min RTT
+
+    Loss is not a signal: random loss (modes 3 and 5) only lowers the delivery
+    rate by the share that went missing, so cwnd does not collapse the way it
+    does for the loss based controllers. Lost segments are still retransmitted
+    by the core, and never count as delivered, so drops at a full bottleneck
+    queue cannot inflate the bandwidth estimate.
+    """
+
+    STARTUP, DRAIN, PROBE_BW, PROBE_RTT = "STARTUP", "DRAIN", "PROBE_BW", "PROBE_RTT"
+
+    def __init__(self, core):
+        super().__init__(core)
+        core.ssthresh = float("inf")  # unused, cwnd follows the model
+        self.state = self.STARTUP
+        self.pacing_gain = BBR_HIGH_GAIN
+        self.cwnd_gain = BBR_HIGH_GAIN
+
+        # Delivery rate sampling: what had been delivered when each in-flight segment was sent
+        capacity = core.ring_mask + 1
+        self.delivered = 0
+        self.delivered_time = 0.0
+        self.first_sent_time = 0.0
+        self.sent_delivered = array("q", [0]) * capacity
+        self.sent_delivered_time = array("d", [0.0]) * capacity
+        self.sent_first_time = array("d", [0.0]) * capacity
+        self.sent_time = array("d", [0.0]) * capacity
+
+        # Model: windowed max of delivery rate samples (segments per second), as (round, rate)
+        # with falling rates so the front is the max, and the min RTT with the time it was seen
+        self.bw_samples = deque()
+        self.btl_bw = 0.0
+        self.min_rtt = None
+        self.min_rtt_stamp = 0.0
+
+        # Rounds: one round ends once a segment sent after the previous round ended is ACKed
+        self.round_count = 0
+        self.next_round_delivered = 0
+        self.round_start = False
+        self.full_bw = 0.0
+        self.full_bw_count = 0
+        self.filled_pipe = False
+
+        self.cycle_index = 0
+        self.cycle_stamp = 0.0
+        self.probe_rtt_done = None
+        self.probe_rtt_cwnd = 0
+        self.prior_cwnd = 0
+
+    def bdp(self, gain):
+        # Segments the path holds at the estimated rate, scaled by gain
+        if self.min_rtt is None or self.btl_bw == 0:
+            return None
+        return gain * self.btl_bw * self.min_rtt
+
+    def pacing_rate(self):
+        if self.btl_bw == 0:
+            return None  # nothing measured yet, the first window goes out unpaced
+        return self.pacing_gain * self.btl_bw
+
+    def on_send(self, seq, now, retransmit):
+        core = self.core
+        if core.base == core.next_seq and not retransmit:
+            # Nothing in flight, so no ACK clock: start sampling from here
+            self.first_sent_time = self.delivered_time = now
+        index = seq & core.ring_mask
+        self.sent_delivered[index] = self.delivered
+        self.sent_delivered_time[index] = self.delivered_time
+        self.sent_first_time[index] = self.first_sent_time
+        self.sent_time[index] = now
+        self.first_sent_time = now
+
+    def on_ack(self, ack, acked, rtt, now):
+        core = self.core
+        self.count_delivered(ack + 1, now)
+
+        # Delivery rate over the flight that ended with segment ack: data delivered since it was
+        # sent, over the longer of its send and ACK intervals so neither burst inflates the rate.
+        index = ack & core.ring_mask
+        self.round_start = self.sent_delivered[index] >= self.next_round_delivered
+        if self.round_start:
+            self.next_round_delivered = self.delivered
+            self.round_count += 1
+        interval = max(self.sent_time[index] - self.sent_first_time[index], now - self.sent_delivered_time[index])
+        if interval > 0:
+            self.update_bw((self.delivered - self.sent_delivered[index]) / interval)
+
+        if rtt is not None and (self.min_rtt is None or rtt <= self.min_rtt):
+            self.min_rtt = rtt
+            self.min_rtt_stamp = now
+
+        if self.prior_cwnd:
+            # First ACK after a timeout, go back to the window the model had
+            core.cwnd = max(core.cwnd, self.prior_cwnd)
+            self.prior_cwnd = 0
+        self.update_state(ack, now)
+        self.update_cwnd(acked)
+
+    def count_delivered(self, cumulative, now):
+        # Segments the receiver holds: everything below the cumulative ACK plus what it SACKed
+        # above it. SACKed data counts as delivered straight away, so a loss does not stall the samples.
+        delivered = cumulative + self.core.scoreboard.sacked_count()
+        if delivered > self.delivered:
+            self.delivered = delivered
+            self.delivered_time = now
+
+    def update_bw(self, rate):
+        samples = self.bw_samples
+        while samples and samples[-1][1] <= rate:
+            samples.pop()
+        samples.append((self.round_count, rate))
+        while samples[0][0] <= self.round_count - BBR_BW_WINDOW:
+            samples.popleft()
+        self.btl_bw = samples[0][1]
+
+    def update_state(self, ack, now):
+        core = self.core
+        in_flight = core.next_seq - ack - 1
+
+        if self.round_start and not self.filled_pipe:
+            # The pipe is full once the bandwidth stops growing for BBR_FULL_BW_ROUNDS rounds
+            if self.btl_bw >= self.full_bw * BBR_FULL_BW_GROWTH:
+                self.full_bw = self.btl_bw
+                self.full_bw_count = 0
+            else:
+                self.full_bw_count += 1
+                self.filled_pipe = self.full_bw_count >= BBR_FULL_BW_ROUNDS
+
+        bdp = self.bdp(1.0)
+        if bdp is None:
+            return  # no model yet, stay in STARTUP
+        if self.state == self.STARTUP and self.filled_pipe:
+            self.enter(self.DRAIN, BBR_DRAIN_GAIN, BBR_HIGH_GAIN)
+        if self.state == self.DRAIN and in_flight <= bdp:
+            self.enter_probe_bw(now)
+        elif self.state == self.PROBE_BW:
+            # Move to the next phase after a min RTT, or early once the 0.75 phase has drained
+            # the queue the 1.25 phase built
+            gain = BBR_PROBE_GAINS[self.cycle_index]
+            if now - self.cycle_stamp > self.min_rtt or (gain < 1 and in_flight <= bdp):
+                self.cycle_index = (self.cycle_index + 1) % len(BBR_PROBE_GAINS)
+                self.cycle_stamp = now
+                self.pacing_gain = BBR_PROBE_GAINS[self.cycle_index]
+
+        if self.state != self.PROBE_RTT and now - self.min_rtt_stamp > BBR_MIN_RTT_WINDOW:
+            # The min RTT is stale, drain the queue for a moment so it can be measured again
+            self.probe_rtt_cwnd = core.cwnd
+            self.probe_rtt_done = now + BBR_PROBE_RTT_TIME
+            self.enter(self.PROBE_RTT, 1.0, 1.0)
+        elif self.state == self.PROBE_RTT and now >= self.probe_rtt_done:
+            self.min_rtt_stamp = now
+            core.cwnd = max(core.cwnd, self.probe_rtt_cwnd)
+            if self.filled_pipe:
+                self.enter_probe_bw(now)
+            else:
+                self.enter(self.STARTUP, BBR_HIGH_GAIN, BBR_HIGH_GAIN)
+
+    def enter(self, state, pacing_gain, cwnd_gain):
+        self.state = state
+        self.pacing_gain = pacing_gain
+        self.cwnd_gain = cwnd_gain
+        logger.debug(f"BBR: {state}, bw={self.btl_bw:.1f} segments/s, min_rtt={self.min_rtt}")
+
+    def enter_probe_bw(self, now):
+        self.enter(self.PROBE_BW, 1.0, BBR_CWND_GAIN)
+        # Start anywhere in the cycle except the 0.75 phase, so flows do not probe in lockstep
+        self.cycle_index = random.choice([i for i in range(len(BBR_PROBE_GAINS)) if i != 1])
+        self.cycle_stamp = now
+        self.pacing_gain = BBR_PROBE_GAINS[self.cycle_index]
+
+    def update_cwnd(self, acked):
+        core = self.core
+        target = self.bdp(self.cwnd_gain)
+        if target is None:
+            core.cwnd += acked
+        else:
+            target += 3  # room for delayed and batched ACKs
+            if self.filled_pipe:
+                core.cwnd = min(core.cwnd + acked, target)
+            elif core.cwnd < target:
+                core.cwnd += acked
+        if self.state == self.PROBE_RTT:
+            core.cwnd = min(core.cwnd, BBR_MIN_CWND)
+        else:
+            core.cwnd = max(core.cwnd, BBR_MIN_CWND)
+        core.cwnd = min(core.cwnd, core.max_window)
+
+    def on_dupack(self, dupacks, now):
+        # Loss is not a congestion signal here, just resend the segment
+        self.count_delivered(self.core.base, now)
+        return dupacks == DUPLICATE_ACK_THRESHOLD
+
+    def on_timeout(self, now):
+        # Everything outstanding gets resent, so restart the ACK clock from one segment and
+        # return to the model's window on the next ACK instead of slow starting
+        self.prior_cwnd = max(self.prior_cwnd, self.core.cwnd)
+        self.core.cwnd = 1
+        logger.debug(f"Timeout: cwnd={self.core.cwnd}, restoring {self.prior_cwnd} on the next ACK")
+
+
+@register(PROTOCOL_VEGAS, "TCP Vegas")
+class Vegas(Reno):
+    """
+    TCP Vegas. Once per round it compares the throughput cwnd would get with an
+    empty queue, cwnd / BaseRTT, with what it got, cwnd / RTT, where BaseRTT is
+    the smallest RTT seen and RTT the smallest of the round. The difference
+    times BaseRTT is roughly how many of its segments sit in the bottleneck
+    queue, and cwnd moves by one segment a round to keep that between
+    VEGAS_ALPHA and VEGAS_BETA, before the queue overflows. Loss is still
+    handled like Reno.
+
+    Only unambiguous samples count: an ACK whose segment, or any segment
+    before it in the same ACK, was retransmitted could be for either copy, or
+    was held back waiting for the hole to fill, and would drag BaseRTT down or
+    the round's RTT up.
+    """
+
+    def __init__(self, core):
+        super().__init__(core)
+        self.base_rtt = None
+        self.round_min_rtt = None
+        self.round_samples = 0
+        self.round_end = 0
+
+    def on_ack(self, ack, acked, rtt, now):
+        core = self.core
+        if rtt is not None and not any(core.retransmitted[seq & core.ring_mask] for seq in range(core.base, ack + 1)):
+            self.base_rtt = rtt if self.base_rtt is None else min(self.base_rtt, rtt)
+            self.round_min_rtt = rtt if self.round_min_rtt is None else min(self.round_min_rtt, rtt)
+            self.round_samples += 1
+
+        if not self.fast_recovery:
+            if ack >= self.round_end:
+                enough = self.round_samples >= VEGAS_MIN_SAMPLES
+                if enough:
+                    self.adjust(acked)
+                self.end_round()
+                if enough:
+                    return
+            elif self.base_rtt is not None and core.cwnd >= core.ssthresh:
+                return  # in congestion avoidance cwnd only moves once per round
+        # Slow start on every ACK, deflating after Fast Recovery, or Reno growth for a round
+        # with too few samples to go on
+        super().on_ack(ack, acked, rtt, now)
+
+    def adjust(self, acked):
+        # Segments queued = (expected - actual) * BaseRTT
+        core = self.core
+        diff = core.cwnd * (self.round_min_rtt - self.base_rtt) / self.round_min_rtt
+        if core.cwnd < core.ssthresh:
+            if diff > VEGAS_GAMMA:
+                # Queue is building, leave slow start at the window the path holds
+                core.cwnd = min(core.cwnd, core.cwnd * self.base_rtt / self.round_min_rtt + 1)
+                core.ssthresh = max(min(core.ssthresh, core.cwnd - 1), 2)
+                logger.debug(f"Vegas: leaving slow start, diff={diff:.2f}, cwnd={core.cwnd:.2f}")
+            else:
+                self.slow_start(acked)
+        elif diff > VEGAS_BETA:
+            core.cwnd = max(core.cwnd - 1, 2)
+            core.ssthresh = max(min(core.ssthresh, core.cwnd - 1), 2)
+        elif diff < VEGAS_ALPHA:
+            core.cwnd = min(core.cwnd + 1, core.max_window)
+        logger.debug(f"Vegas: BaseRTT={self.base_rtt:.4f}s, RTT={self.round_min_rtt:.4f}s, diff={diff:.2f}, "
+                     f"cwnd={core.cwnd:.2f}")
+
+    def end_round(self):
+        self.round_end = self.core.next_seq
+        self.round_min_rtt = None
+        self.round_samples = 0
+
+
+@register(PROTOCOL_NEWRENO, "TCP NewReno")
+class NewReno(Reno):
+    """
+    NewReno (RFC 6582). Reno leaves Fast Recovery on the first ACK that moves
+    base, so when one window lost several segments every loss after the first
+    waits out an RTO. NewReno remembers the highest segment sent when recovery
+    started and stays in recovery until that is ACKed: an ACK below it (a
+    partial ACK) means the segment right after it was lost too, and it is
+    retransmitted straight away.
+
+    With prr set, the window during recovery follows Proportional Rate
+    Reduction (RFC 6937) instead of being inflated by one segment per duplicate
+    ACK: segments go out in proportion to what the receiver reports delivered,
+    so the window comes down to ssthresh smoothly by the end of recovery
+    rather than stalling for half a window and then bursting.
+    """
+    prr = False
+
+    def __init__(self, core):
+        super().__init__(core)
+        self.recover = -1  # highest segment sent when the current recovery started
+        # PRR state
+        self.recover_fs = 0  # flight size when recovery started
+        self.prr_delivered = 0
+        self.prr_out = 0
+        self.delivered_mark = 0
+
+    def flight(self, base):
+        # Segments in flight that the receiver has not SACKed
+        return self.core.next_seq - base - self.core.scoreboard.sacked_count()
+
+    def on_send(self, seq, now, retransmit):
+        if self.fast_recovery:
+            self.prr_out += 1
+
+    def on_dupack(self, dupacks, now):
+        core = self.core
+        if self.fast_recovery:
+            if self.prr:
+                self.proportional_reduction(self.delivered_since_last(core.base), core.base, False)
+            else:
+                core.cwnd += 1  # Each further duplicate ACK means another segment left the network
+            return False
+        # Duplicates for data sent before the last recovery or timeout do not start a new one
+        if dupacks != DUPLICATE_ACK_THRESHOLD or core.base - 1 < self.recover:
+            return False
+
+        flight = self.flight(core.base)
+        core.ssthresh = max(int(core.cwnd / 2), 2)
+        self.fast_recovery = True
+        self.recover = core.next_seq - 1
+        if self.prr:
+            self.recover_fs = max(flight, 1)
+            self.prr_delivered = 0
+            self.prr_out = 0
+            self.delivered_mark = core.base + core.scoreboard.sacked_count()
+            self.proportional_reduction(DUPLICATE_ACK_THRESHOLD, core.base, True)
+        else:
+            core.cwnd = core.ssthresh + 3
+        logger.debug(f"Fast Recovery until {self.recover}: cwnd={core.cwnd}, ssthresh={core.ssthresh}")
+        return True
+
+    def on_ack(self, ack, acked, rtt, now):
+        if not self.fast_recovery:
+            super().on_ack(ack, acked, rtt, now)
+            return False
+        core = self.core
+        if ack >= self.recover:
+            # Full ACK, everything outstanding at the start of recovery is in
+            core.cwnd = core.ssthresh
+            self.fast_recovery = False
+            logger.debug(f"Exiting Fast Recovery: cwnd={core.cwnd}")
+            return False
+
+        # Partial ACK: the segment after it was lost as well, resend it and stay in recovery
+        logger.debug(f"Partial ACK {ack} in Fast Recovery, retransmitting {ack + 1}")
+        if self.prr:
+            self.proportional_reduction(self.delivered_since_last(ack + 1), ack + 1, True)
+        else:
+            # Deflate by what was ACKed, add back one for the retransmission
+            core.cwnd = max(core.cwnd - acked + 1, 1)
+        return True
+
+    def on_timeout(self, now):
+        self.recover = self.core.next_seq - 1
+        super().on_timeout(now)
+
+    def delivered_since_last(self, base):
+        # Segments the receiver reported since the last ACK, every duplicate stands for at least one
+        mark = base + self.core.scoreboard.sacked_count()
+        delivered = max(mark - self.delivered_mark, 1)
+        self.delivered_mark = mark
+        return delivered
+
+    def proportional_reduction(self, delivered, base, retransmitting):
+        # RFC 6937: send in proportion to what was delivered while the pipe is above ssthresh,
+        # then slow start back up to it (the PRR-SSRB bound)
+        core = self.core
+        self.prr_delivered += delivered
+        # Still in the network: what was at the start of recovery, plus what went out since, less what
+        # arrived since. Without SACK this is the only way duplicate ACKs bring the estimate down.
+        pipe = max(self.recover_fs + self.prr_out - self.prr_delivered, 0)
+        if pipe > core.ssthresh:
+            sndcnt = -(-self.prr_delivered * core.ssthresh // self.recover_fs) - self.prr_out
+        else:
+            sndcnt = min(core.ssthresh - pipe, max(self.prr_delivered - self.prr_out, delivered) + 1)
+        sndcnt = max(sndcnt, 0)
+        if retransmitting:
+            sndcnt = max(sndcnt - 1, 0)  # the retransmission about to go out takes one of them
+        # The core counts SACKed segments as in flight, so the window is everything outstanding plus sndcnt
+        core.cwnd = max(core.next_seq - base + sndcnt, 1)
+        logger.debug(f"PRR: delivered={self.prr_delivered}, out={self.prr_out}, pipe={pipe}, sndcnt={sndcnt}")
+
+
+@register(PROTOCOL_NEWRENO_PRR, "NewReno + PRR")
+class NewRenoPrr(NewReno):
+    """NewReno with Proportional Rate Reduction during Fast Recovery."""
+    prr = True
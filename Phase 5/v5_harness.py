@@ -16,13 +16,18 @@ import time
 import logging
 import os
 import gc
+import tempfile
 import matplotlib
 
 matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
 import numpy as np
 from v5_server import run_server
-from v5_client import send_file, PROTOCOL_SLOW_START_ONLY, PROTOCOL_AIMD_ONLY, PROTOCOL_TAHOE, PROTOCOL_RENO
+from v5_client import (send_file, PACKET_SIZE, SERVER_ADDRESS, SERVER_PORT, MAX_WINDOW_SIZE, PROTOCOL_RENO,
+                       PROTOCOL_CUBIC, PROTOCOL_NEWRENO, PROTOCOL_NEWRENO_PRR)
+from v5_congestion import PROTOCOL_NAMES
+from v5_helpers import PacketSource
+from v5_link import EmulatedLink
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -44,33 +49,57 @@ SIMULATION_MODE_NAMES = {
     5: "Packet Loss"
 }
 
-# Protocol names for better readability
-PROTOCOL_NAMES = {
-    PROTOCOL_SLOW_START_ONLY: "Slow Start Only",
-    PROTOCOL_AIMD_ONLY: "AIMD Only",
-    PROTOCOL_TAHOE: "TCP Tahoe",
-    PROTOCOL_RENO: "TCP Reno"
-}
-
 # Define the simulation modes and protocols to test
 SIMULATION_MODES = [1, 2, 3, 4, 5]  # Keep all simulation modes
-CONGESTION_PROTOCOLS = [PROTOCOL_SLOW_START_ONLY, PROTOCOL_AIMD_ONLY, PROTOCOL_TAHOE, PROTOCOL_RENO]
+CONGESTION_PROTOCOLS = list(PROTOCOL_NAMES)  # every controller registered in v5_congestion
 ERROR_RATES = [i / 100.0 for i in range(0, 65, 5)]  # 0% to 60% in 5% steps
 TIMEOUT_VALUES = [i / 1000.0 for i in range(10, 110, 10)]  # 10ms to 100ms in 10ms steps
 WINDOW_SIZES = [1, 2, 5, 10, 20, 30, 40, 50]  # Window sizes from 1 to 50
 TRIALS = 3  # Number of trials
 FILENAME = "kitty.png"  # Make sure this file exists in directory
 TEST_ERROR_RATE = 0.2  # Fixed error rate for timeout and window tests
+SACK_MODES = [3, 5]  # Modes where data segments go missing, so selective ACKs can matter
+PACING_GAINS = [None, 1.0, 1.25]  # None sends each window as one burst
+PACING_LINK = {"rate_bps": 8000000, "queue_packets": 8, "delay": 0.01}  # bottleneck for the pacing test
+BDP_LINK = {"rate_bps": 20000000, "queue_packets": 64, "delay": 0.025}  # 50 ms RTT, about 120 segments in flight
+BDP_MAX_WINDOW = 256  # room for the window to grow past the link's BDP
+BDP_PROTOCOLS = [PROTOCOL_RENO, PROTOCOL_CUBIC]
+QUEUE_LINK = {"rate_bps": 2000000, "queue_packets": 64, "delay": 0.01}  # deep queue for the RTT inflation test
+QUEUE_MAX_WINDOW = 128  # enough to fill the queue, the link's BDP is about 5 segments
+RECOVERY_MODE = 5  # packet loss, where several segments of one window go missing
+RECOVERY_PROTOCOLS = [PROTOCOL_RENO, PROTOCOL_NEWRENO, PROTOCOL_NEWRENO_PRR]
+TAIL_FILE_SIZES = [8 * 1024, None]  # bytes of FILENAME sent in the tail latency test, None sends all of it
+TAIL_MODES = [4, 5]  # ACK loss and packet loss
+TAIL_ERROR_RATES = [0.05, 0.1, 0.2]
+TAIL_TRIALS = 10  # enough transfers per point for a 95th percentile
+TAIL_PERCENTILE = 95
+TIMESTAMP_MODES = [3, 5]  # Modes where segments are resent, whose ACKs only the timestamp option can time
+KERNEL_TIMESTAMP_MODES = [1, 5]  # no errors, and packet loss at TEST_ERROR_RATE
 PLOTS_DIR = "plots"
 # ----------------------
 
 # Create plots directory if it doesn't exist
 os.makedirs(PLOTS_DIR, exist_ok=True)
 
+# Packet table for FILENAME, built once and shared by every transfer
+packet_source = None
+
+
+def get_packet_source():
+    global packet_source
+    if packet_source is None:
+        packet_source = PacketSource(FILENAME, PACKET_SIZE)
+    return packet_source
 
-def run_single_transfer(mode, error_rate, congestion_protocol, initial_timeout=None, initial_cwnd=None):
+
+def run_single_transfer(mode, error_rate, congestion_protocol, initial_timeout=None, initial_cwnd=None, sack=True,
+                        pacing_gain=None, link=None, max_window=MAX_WINDOW_SIZE, rack=False, source=None,
+                        timestamps=True, kernel_timestamps=False, details=None):
     """
     Run a single file transfer simulation with server and client threads.
+    With a started EmulatedLink as link, the client sends through it.
+    source is the PacketSource to send, FILENAME's by default.
+    A details dict is filled with the client's python_rtt_history and the server's one_way_delays.
     Returns data necessary for plotting.
     """
     server_time = None
@@ -80,17 +109,22 @@ def run_single_transfer(mode, error_rate, congestion_protocol, initial_timeout=N
     cwnd_history = None
     rtt_history = None
     rto_history = None
+    sender_stats = None
+
+    def on_transfer(stats):
+        if details is not None:
+            details["one_way_delays"] = stats.one_way_delays
 
     def server_thr():
         nonlocal server_time
         try:
-            server_time = run_server(mode, error_rate)
+            server_time = run_server(mode, error_rate, kernel_timestamps=kernel_timestamps, on_transfer=on_transfer)
         except Exception as e:
             logger.error(f"Server thread error: {e}")
             server_time = 0
 
     def client_thr():
-        nonlocal client_time, retrans, throughput, cwnd_history, rtt_history, rto_history
+        nonlocal client_time, retrans, throughput, cwnd_history, rtt_history, rto_history, sender_stats
         try:
             results = send_file(
                 mode,
@@ -98,7 +132,15 @@ def run_single_transfer(mode, error_rate, congestion_protocol, initial_timeout=N
                 congestion_protocol,
                 file_name=FILENAME,
                 initial_timeout=initial_timeout,
-                initial_cwnd=initial_cwnd
+                initial_cwnd=initial_cwnd,
+                packet_source=source if source is not None else get_packet_source(),
+                sack=sack,
+                pacing_gain=pacing_gain,
+                max_window=max_window,
+                rack=rack,
+                timestamps=timestamps,
+                kernel_timestamps=kernel_timestamps,
+                server=link.address if link is not None else (SERVER_ADDRESS, SERVER_PORT)
             )
 
             client_time = results[0]
@@ -121,6 +163,12 @@ def run_single_transfer(mode, error_rate, congestion_protocol, initial_timeout=N
             else:
                 rto_history = []
 
+            if len(results) > 6:
+                sender_stats = results[6]
+
+            if len(results) > 7 and details is not None:
+                details["python_rtt_history"] = results[7]
+
         except Exception as e:
             logger.error(f"Client thread error: {e}")
             client_time = 0
@@ -147,7 +195,7 @@ def run_single_transfer(mode, error_rate, congestion_protocol, initial_timeout=N
         if t_c.is_alive():
             logger.warning(
                 f"Client thread timeout for mode {SIMULATION_MODE_NAMES[mode]}, protocol {PROTOCOL_NAMES[congestion_protocol]}, error {error_rate}")
-            return 0, 0, 0, [], [], []
+            return 0, 0, 0, 0, [], [], [], None
 
         t_s.join(timeout=5)  # Short timeout for server
     except Exception as e:
@@ -159,7 +207,7 @@ def run_single_transfer(mode, error_rate, congestion_protocol, initial_timeout=N
     # Add small delay to ensure sockets are closed
     time.sleep(1)
 
-    return server_time, client_time, retrans, throughput, cwnd_history, rtt_history, rto_history
+    return server_time, client_time, retrans, throughput, cwnd_history, rtt_history, rto_history, sender_stats
 
 
 def plot_dynamics_vs_time(cwnd_history, rtt_history, rto_history, scenario_name="default"):
@@ -230,8 +278,8 @@ def run_error_simulation_mode_test():
                     f"Protocol {PROTOCOL_NAMES[protocol]} - Mode {SIMULATION_MODE_NAMES[mode]} - Trial {trial + 1}")
 
                 try:
-                    _, client_time, retrans, throughput, cwnd_h, rtt_h, rto_h = run_single_transfer(mode, error_rate,
-                                                                                                    protocol)
+                    _, client_time, retrans, throughput, cwnd_h, rtt_h, rto_h, _ = run_single_transfer(
+                        mode, error_rate, protocol)
 
                     # Only count successful transfers
                     if client_time > 0:
@@ -268,7 +316,7 @@ def run_error_simulation_mode_test():
         plt.figure(figsize=(14, 8))
 
         # Set width of bars
-        barWidth = 0.2
+        barWidth = 0.8 / len(CONGESTION_PROTOCOLS)
 
         # Set positions for bars
         r = np.arange(len(SIMULATION_MODES))
@@ -288,7 +336,7 @@ def run_error_simulation_mode_test():
         plt.title(f'Protocol Performance Across Error Simulation Modes (Error Rate: {TEST_ERROR_RATE * 100}%)')
 
         # Add x-axis ticks
-        plt.xticks([r + barWidth * 1.5 for r in range(len(SIMULATION_MODES))],
+        plt.xticks([r + barWidth * (len(CONGESTION_PROTOCOLS) - 1) / 2 for r in range(len(SIMULATION_MODES))],
                    [SIMULATION_MODE_NAMES[mode] for mode in SIMULATION_MODES])
 
         # Add legend
@@ -313,7 +361,7 @@ def run_error_simulation_mode_test():
         plt.xlabel('Error Simulation Mode')
         plt.ylabel('Number of Retransmissions')
         plt.title(f'Protocol Retransmissions Across Error Simulation Modes (Error Rate: {TEST_ERROR_RATE * 100}%)')
-        plt.xticks([r + barWidth * 1.5 for r in range(len(SIMULATION_MODES))],
+        plt.xticks([r + barWidth * (len(CONGESTION_PROTOCOLS) - 1) / 2 for r in range(len(SIMULATION_MODES))],
                    [SIMULATION_MODE_NAMES[mode] for mode in SIMULATION_MODES])
         plt.legend()
         plt.grid(True, axis='y')
@@ -334,7 +382,7 @@ def run_error_simulation_mode_test():
         plt.xlabel('Error Simulation Mode')
         plt.ylabel('Throughput (bytes/second)')
         plt.title(f'Protocol Throughput Across Error Simulation Modes (Error Rate: {TEST_ERROR_RATE * 100}%)')
-        plt.xticks([r + barWidth * 1.5 for r in range(len(SIMULATION_MODES))],
+        plt.xticks([r + barWidth * (len(CONGESTION_PROTOCOLS) - 1) / 2 for r in range(len(SIMULATION_MODES))],
                    [SIMULATION_MODE_NAMES[mode] for mode in SIMULATION_MODES])
         plt.legend()
         plt.grid(True, axis='y')
@@ -358,10 +406,12 @@ def run_error_rate_test():
 
         # Structure to hold results for each protocol
         completion_times = {protocol: [] for protocol in CONGESTION_PROTOCOLS}
+        spurious_retransmissions = {protocol: [] for protocol in CONGESTION_PROTOCOLS}
 
         for protocol in CONGESTION_PROTOCOLS:
             for error_rate in ERROR_RATES:
                 cumulative_time = 0
+                cumulative_spurious = 0
                 successful_trials = 0
 
                 for trial in range(TRIALS):
@@ -369,7 +419,8 @@ def run_error_rate_test():
                         f"Mode {SIMULATION_MODE_NAMES[mode]} - Protocol {PROTOCOL_NAMES[protocol]} - Error Rate {error_rate * 100}% - Trial {trial + 1}")
 
                     try:
-                        _, client_time, _, _, cwnd_h, rtt_h, rto_h = run_single_transfer(mode, error_rate, protocol)
+                        _, client_time, _, _, cwnd_h, rtt_h, rto_h, stats = run_single_transfer(mode, error_rate,
+                                                                                                 protocol)
 
                         # Only count successful transfers
                         if client_time > 0:
@@ -379,6 +430,8 @@ def run_error_rate_test():
                                                       f"mode{mode}_protocol{protocol}_error{int(error_rate * 100)}")
 
                             cumulative_time += client_time
+                            if stats is not None:
+                                cumulative_spurious += stats.spurious_retransmissions
                             successful_trials += 1
                     except Exception as e:
                         logger.error(f"Error in trial: {e}")
@@ -391,7 +444,9 @@ def run_error_rate_test():
                 # Calculate average time from successful trials
                 avg_time = cumulative_time / max(successful_trials, 1)  # Avoid division by zero
                 completion_times[protocol].append(avg_time)
-                logger.info(f"Average completion time: {avg_time:.3f}s")
+                spurious_retransmissions[protocol].append(cumulative_spurious / max(successful_trials, 1))
+                logger.info(f"Average completion time: {avg_time:.3f}s, "
+                            f"{spurious_retransmissions[protocol][-1]:.1f} spurious retransmissions")
 
         # Generate the comparison plot for this simulation mode
         try:
@@ -415,9 +470,633 @@ def run_error_rate_test():
         except Exception as e:
             logger.error(f"Error creating error rate plot: {e}")
 
+        # Retransmissions the server reported as duplicates with D-SACK, i.e. segments resent needlessly
+        try:
+            plt.figure(figsize=(12, 8))
+            for protocol in CONGESTION_PROTOCOLS:
+                plt.plot(
+                    [er * 100 for er in ERROR_RATES],
+                    spurious_retransmissions[protocol],
+                    marker='o',
+                    label=f"{PROTOCOL_NAMES[protocol]}"
+                )
+
+            plt.title(f'Spurious Retransmissions vs Loss/Error Rate ({SIMULATION_MODE_NAMES[mode]})')
+            plt.xlabel('Loss/Error Rate (%)')
+            plt.ylabel('Spurious Retransmissions')
+            plt.grid(True)
+            plt.legend()
+            plt.savefig(
+                f'{PLOTS_DIR}/spurious_vs_errorrate_{SIMULATION_MODE_NAMES[mode].replace(" ", "_").lower()}.png')
+            plt.close()
+        except Exception as e:
+            logger.error(f"Error creating spurious retransmission plot: {e}")
+
     logger.info("Error rate tests completed.")
 
 
+def run_sack_comparison_test():
+    """Retransmissions and completion time with and without SACK for the data loss modes"""
+
+    logger.info("=== Running SACK Comparison Test ===")
+
+    for mode in SACK_MODES:
+        logger.info(f"Testing simulation mode: {SIMULATION_MODE_NAMES[mode]}")
+
+        # results[sack][protocol] -> list of (avg_time, avg_retransmissions) per error rate
+        results = {sack: {protocol: [] for protocol in CONGESTION_PROTOCOLS} for sack in (False, True)}
+
+        for protocol in CONGESTION_PROTOCOLS:
+            for sack in (False, True):
+                for error_rate in ERROR_RATES:
+                    cumulative_time = 0
+                    cumulative_retrans = 0
+                    successful_trials = 0
+
+                    for trial in range(TRIALS):
+                        logger.info(
+                            f"Mode {SIMULATION_MODE_NAMES[mode]} - Protocol {PROTOCOL_NAMES[protocol]} - "
+                            f"SACK {'on' if sack else 'off'} - Error Rate {error_rate * 100}% - Trial {trial + 1}")
+
+                        try:
+                            _, client_time, retrans, _, _, _, _, _ = run_single_transfer(mode, error_rate, protocol,
+                                                                                         sack=sack)
+                            if client_time > 0:
+                                cumulative_time += client_time
+                                cumulative_retrans += retrans
+                                successful_trials += 1
+                        except Exception as e:
+                            logger.error(f"Error in trial: {e}")
+
+                        gc.collect()
+                        time.sleep(1)  # Pause between trials
+
+                    trials = max(successful_trials, 1)  # Avoid division by zero
+                    results[sack][protocol].append((cumulative_time / trials, cumulative_retrans / trials))
+
+            # Summarise how much SACK saved for this protocol over the whole sweep
+            retrans_off = sum(r for _, r in results[False][protocol])
+            retrans_on = sum(r for _, r in results[True][protocol])
+            time_off = sum(t for t, _ in results[False][protocol])
+            time_on = sum(t for t, _ in results[True][protocol])
+            logger.info(f"{PROTOCOL_NAMES[protocol]}: SACK cut retransmissions by "
+                        f"{100 * (1 - retrans_on / max(retrans_off, 1)):.1f}% and completion time by "
+                        f"{100 * (1 - time_on / max(time_off, 1e-9)):.1f}%")
+
+        # One figure per metric, SACK runs dashed next to the plain runs
+        mode_name = SIMULATION_MODE_NAMES[mode].replace(" ", "_").lower()
+        for index, (metric, ylabel) in enumerate([("completion_time", "Completion Time (seconds)"),
+                                                  ("retransmissions", "Retransmissions")]):
+            try:
+                plt.figure(figsize=(12, 8))
+                for protocol in CONGESTION_PROTOCOLS:
+                    for sack in (False, True):
+                        plt.plot(
+                            [er * 100 for er in ERROR_RATES],
+                            [values[index] for values in results[sack][protocol]],
+                            linestyle='--' if sack else '-',
+                            marker='o',
+                            label=f"{PROTOCOL_NAMES[protocol]}{' + SACK' if sack else ''}"
+                        )
+
+                plt.title(f'{ylabel} vs Loss/Error Rate with and without SACK ({SIMULATION_MODE_NAMES[mode]})')
+                plt.xlabel('Loss/Error Rate (%)')
+                plt.ylabel(ylabel)
+                plt.grid(True)
+                plt.legend()
+                plt.savefig(f'{PLOTS_DIR}/sack_{metric}_vs_errorrate_{mode_name}.png')
+                plt.close()
+            except Exception as e:
+                logger.error(f"Error creating SACK comparison plot: {e}")
+
+    logger.info("SACK comparison tests completed.")
+
+
+def run_recovery_test():
+    """Timeouts and completion time of Reno against NewReno and PRR fast recovery under packet loss"""
+
+    logger.info("=== Running Fast Recovery Test ===")
+
+    # results[sack][protocol] -> list of (avg_time, avg_timeouts) per error rate
+    results = {sack: {protocol: [] for protocol in RECOVERY_PROTOCOLS} for sack in (False, True)}
+
+    for protocol in RECOVERY_PROTOCOLS:
+        for sack in (False, True):
+            for error_rate in ERROR_RATES:
+                cumulative_time = 0
+                cumulative_timeouts = 0
+                successful_trials = 0
+
+                for trial in range(TRIALS):
+                    logger.info(f"Protocol {PROTOCOL_NAMES[protocol]} - SACK {'on' if sack else 'off'} - "
+                                f"Error Rate {error_rate * 100}% - Trial {trial + 1}")
+                    try:
+                        _, client_time, _, _, _, _, _, stats = run_single_transfer(RECOVERY_MODE, error_rate,
+                                                                                   protocol, sack=sack)
+                        if client_time > 0 and stats is not None:
+                            cumulative_time += client_time
+                            cumulative_timeouts += stats.timeouts
+                            successful_trials += 1
+                    except Exception as e:
+                        logger.error(f"Error in trial: {e}")
+
+                    gc.collect()
+                    time.sleep(1)  # Pause between trials
+
+                trials = max(successful_trials, 1)  # Avoid division by zero
+                results[sack][protocol].append((cumulative_time / trials, cumulative_timeouts / trials))
+
+            logger.info(f"{PROTOCOL_NAMES[protocol]} (SACK {'on' if sack else 'off'}): "
+                        f"{sum(t for _, t in results[sack][protocol]):.1f} timeouts over the sweep, "
+                        f"{sum(t for t, _ in results[sack][protocol]):.2f}s in total")
+
+    for index, (metric, ylabel) in enumerate([("completion_time", "Completion Time (seconds)"),
+                                              ("timeouts", "Retransmission Timeouts")]):
+        try:
+            plt.figure(figsize=(12, 8))
+            for protocol in RECOVERY_PROTOCOLS:
+                for sack in (False, True):
+                    plt.plot(
+                        [er * 100 for er in ERROR_RATES],
+                        [values[index] for values in results[sack][protocol]],
+                        linestyle='--' if sack else '-',
+                        marker='o',
+                        label=f"{PROTOCOL_NAMES[protocol]}{' + SACK' if sack else ''}"
+                    )
+
+            plt.title(f'{ylabel} vs Loss Rate by Fast Recovery Algorithm ({SIMULATION_MODE_NAMES[RECOVERY_MODE]})')
+            plt.xlabel('Loss Rate (%)')
+            plt.ylabel(ylabel)
+            plt.grid(True)
+            plt.legend()
+            plt.savefig(f'{PLOTS_DIR}/recovery_{metric}_vs_errorrate.png')
+            plt.close()
+        except Exception as e:
+            logger.error(f"Error creating fast recovery plot: {e}")
+
+    logger.info("Fast recovery tests completed.")
+
+
+def run_tail_latency_test():
+    """Median and tail completion time of small and medium transfers with and without RACK-TLP loss detection"""
+
+    logger.info("=== Running Tail Latency Test ===")
+
+    # The small file is the start of FILENAME, written out once for the whole test
+    sources = []
+    small_files = []
+    for size in TAIL_FILE_SIZES:
+        if size is None:
+            sources.append(get_packet_source())
+            continue
+        with open(FILENAME, "rb") as f:
+            data = f.read(size)
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(FILENAME)[1])
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        small_files.append(path)
+        sources.append(PacketSource(path, PACKET_SIZE))
+    labels = [f"{source.file_size // 1024} KB" for source in sources]
+
+    try:
+        for mode in TAIL_MODES:
+            logger.info(f"Testing simulation mode: {SIMULATION_MODE_NAMES[mode]}")
+
+            # results[rack][label] -> list of (median, tail percentile) completion times per error rate
+            results = {rack: {label: [] for label in labels} for rack in (False, True)}
+
+            for source, label in zip(sources, labels):
+                for rack in (False, True):
+                    for error_rate in TAIL_ERROR_RATES:
+                        times = []
+                        timeouts = 0
+
+                        for trial in range(TAIL_TRIALS):
+                            logger.info(f"Mode {SIMULATION_MODE_NAMES[mode]} - {label} - "
+                                        f"RACK {'on' if rack else 'off'} - Error Rate {error_rate * 100}% - "
+                                        f"Trial {trial + 1}")
+                            try:
+                                _, client_time, _, _, _, _, _, stats = run_single_transfer(
+                                    mode, error_rate, PROTOCOL_RENO, rack=rack, source=source)
+                                if client_time > 0 and stats is not None:
+                                    times.append(client_time)
+                                    timeouts += stats.timeouts
+                            except Exception as e:
+                                logger.error(f"Error in trial: {e}")
+
+                            gc.collect()
+                            time.sleep(1)  # Pause between trials
+
+                        if not times:
+                            times = [0]
+                        results[rack][label].append((np.median(times), np.percentile(times, TAIL_PERCENTILE)))
+                        logger.info(f"{label}, RACK {'on' if rack else 'off'}, {error_rate * 100}%: median "
+                                    f"{np.median(times):.3f}s, p{TAIL_PERCENTILE} "
+                                    f"{np.percentile(times, TAIL_PERCENTILE):.3f}s, "
+                                    f"{timeouts / len(times):.1f} timeouts per transfer")
+
+            mode_name = SIMULATION_MODE_NAMES[mode].replace(" ", "_").lower()
+            for index, (metric, ylabel) in enumerate([("median", "Median Completion Time (seconds)"),
+                                                      (f"p{TAIL_PERCENTILE}",
+                                                       f"{TAIL_PERCENTILE}th Percentile Completion Time (seconds)")]):
+                try:
+                    plt.figure(figsize=(12, 8))
+                    for label in labels:
+                        for rack in (False, True):
+                            plt.plot(
+                                [er * 100 for er in TAIL_ERROR_RATES],
+                                [values[index] for values in results[rack][label]],
+                                linestyle='--' if rack else '-',
+                                marker='o',
+                                label=f"{label}{' + RACK-TLP' if rack else ''}"
+                            )
+
+                    plt.title(f'{ylabel} vs Loss/Error Rate with and without RACK-TLP '
+                              f'({SIMULATION_MODE_NAMES[mode]})')
+                    plt.xlabel('Loss/Error Rate (%)')
+                    plt.ylabel(ylabel)
+                    plt.grid(True)
+                    plt.legend()
+                    plt.savefig(f'{PLOTS_DIR}/tail_{metric}_vs_errorrate_{mode_name}.png')
+                    plt.close()
+                except Exception as e:
+                    logger.error(f"Error creating tail latency plot: {e}")
+    finally:
+        for source, size in zip(sources, TAIL_FILE_SIZES):
+            if size is not None:
+                source.close()
+        for path in small_files:
+            os.remove(path)
+
+    logger.info("Tail latency tests completed.")
+
+
+def run_timestamp_test():
+    """RTT samples and completion time with and without the timestamp option while segments are being lost"""
+
+    logger.info("=== Running Timestamp Option Test ===")
+
+    for mode in TIMESTAMP_MODES:
+        logger.info(f"Testing simulation mode: {SIMULATION_MODE_NAMES[mode]}")
+
+        # results[timestamps] -> list of (avg_samples, avg_time) per error rate
+        results = {timestamps: [] for timestamps in (False, True)}
+        # rtt_history of the first trial at TEST_ERROR_RATE, for the scatter plot
+        examples = {timestamps: [] for timestamps in (False, True)}
+
+        for timestamps in (False, True):
+            for error_rate in ERROR_RATES:
+                cumulative_samples = 0
+                cumulative_time = 0
+                successful_trials = 0
+
+                for trial in range(TRIALS):
+                    logger.info(f"Mode {SIMULATION_MODE_NAMES[mode]} - Timestamps {'on' if timestamps else 'off'} - "
+                                f"Error Rate {error_rate * 100}% - Trial {trial + 1}")
+                    try:
+                        _, client_time, _, _, _, rtt_h, _, _ = run_single_transfer(mode, error_rate, PROTOCOL_RENO,
+                                                                                   timestamps=timestamps)
+                        if client_time > 0:
+                            if abs(error_rate - TEST_ERROR_RATE) < 0.01 and not examples[timestamps]:
+                                examples[timestamps] = rtt_h
+                            cumulative_samples += len(rtt_h)
+                            cumulative_time += client_time
+                            successful_trials += 1
+                    except Exception as e:
+                        logger.error(f"Error in trial: {e}")
+
+                    gc.collect()
+                    time.sleep(1)  # Pause between trials
+
+                trials = max(successful_trials, 1)  # Avoid division by zero
+                results[timestamps].append((cumulative_samples / trials, cumulative_time / trials))
+                logger.info(f"Timestamps {'on' if timestamps else 'off'}, {error_rate * 100}%: "
+                            f"{results[timestamps][-1][0]:.1f} RTT samples, {results[timestamps][-1][1]:.3f}s")
+
+        mode_name = SIMULATION_MODE_NAMES[mode].replace(" ", "_").lower()
+        for index, (metric, ylabel) in enumerate([("rtt_samples", "RTT Samples per Transfer"),
+                                                  ("completion_time", "Completion Time (seconds)")]):
+            try:
+                plt.figure(figsize=(12, 8))
+                for timestamps in (False, True):
+                    plt.plot(
+                        [er * 100 for er in ERROR_RATES],
+                        [values[index] for values in results[timestamps]],
+                        linestyle='--' if timestamps else '-',
+                        marker='o',
+                        label=f"Reno{' + Timestamps' if timestamps else ''}"
+                    )
+
+                plt.title(f'{ylabel} vs Loss/Error Rate with and without Timestamps ({SIMULATION_MODE_NAMES[mode]})')
+                plt.xlabel('Loss/Error Rate (%)')
+                plt.ylabel(ylabel)
+                plt.grid(True)
+                plt.legend()
+                plt.savefig(f'{PLOTS_DIR}/timestamps_{metric}_vs_errorrate_{mode_name}.png')
+                plt.close()
+            except Exception as e:
+                logger.error(f"Error creating timestamp plot: {e}")
+
+        # Where in the transfer the samples come from: without timestamps, loss episodes leave gaps
+        try:
+            plt.figure(figsize=(12, 8))
+            for timestamps in (False, True):
+                if examples[timestamps]:
+                    times, rtts = zip(*examples[timestamps])
+                    plt.scatter(times, [rtt * 1000 for rtt in rtts], s=12, marker='x' if timestamps else 'o',
+                                label=f"Reno{' + Timestamps' if timestamps else ''}")
+
+            plt.title(f'RTT Samples at {TEST_ERROR_RATE * 100:.0f}% Loss/Error Rate ({SIMULATION_MODE_NAMES[mode]})')
+            plt.xlabel('Time (seconds)')
+            plt.ylabel('RTT (ms)')
+            plt.grid(True)
+            plt.legend()
+            plt.savefig(f'{PLOTS_DIR}/timestamps_rtt_vs_time_{mode_name}.png')
+            plt.close()
+        except Exception as e:
+            logger.error(f"Error creating RTT sample plot: {e}")
+
+    logger.info("Timestamp option tests completed.")
+
+
+def run_kernel_timestamp_test():
+    """RTT as Python measures it against RTT from kernel receive timestamps, and the one-way delay"""
+
+    logger.info("=== Running Kernel Timestamp Test ===")
+
+    for mode in KERNEL_TIMESTAMP_MODES:
+        error_rate = TEST_ERROR_RATE if mode != 1 else 0.0
+        logger.info(f"Testing simulation mode: {SIMULATION_MODE_NAMES[mode]}")
+
+        errors = []  # Python RTT minus kernel RTT, for every sample of every trial
+        example = None  # (rtt_history, python_rtt_history, one_way_delays) of the first trial
+
+        for trial in range(TRIALS):
+            logger.info(f"Mode {SIMULATION_MODE_NAMES[mode]} - Kernel Timestamps - "
+                        f"Error Rate {error_rate * 100}% - Trial {trial + 1}")
+            details = {}
+            try:
+                _, client_time, _, _, _, rtt_h, _, _ = run_single_transfer(mode, error_rate, PROTOCOL_RENO,
+                                                                           kernel_timestamps=True, details=details)
+                python_rtt_h = details.get("python_rtt_history", [])
+                if client_time > 0 and python_rtt_h:
+                    # Both histories hold the same samples in the same order
+                    errors += [python - kernel for (_, python), (_, kernel) in zip(python_rtt_h, rtt_h)]
+                    if example is None:
+                        example = (rtt_h, python_rtt_h, details.get("one_way_delays", ()))
+            except Exception as e:
+                logger.error(f"Error in trial: {e}")
+
+            gc.collect()
+            time.sleep(1)  # Pause between trials
+
+        if example is None:
+            logger.warning("No kernel timestamps (Linux only), skipping the plots")
+            continue
+        errors_us = np.array(errors) * 1e6
+        logger.info(f"Python RTT exceeds kernel RTT by {np.median(errors_us):.1f}us median, "
+                    f"{np.percentile(errors_us, 95):.1f}us p95 over {len(errors)} samples")
+
+        mode_name = SIMULATION_MODE_NAMES[mode].replace(" ", "_").lower()
+        try:
+            rtt_h, python_rtt_h, one_way_delays = example
+            plt.figure(figsize=(12, 8))
+            for history, label, marker in [(python_rtt_h, "RTT (Python)", 'o'), (rtt_h, "RTT (kernel)", 'x'),
+                                           (one_way_delays, "One-way delay (kernel)", '.')]:
+                if history:
+                    times, values = zip(*history)
+                    plt.scatter(times, [value * 1e6 for value in values], s=12, marker=marker, label=label)
+
+            plt.title(f'Python and Kernel Measured Delay ({SIMULATION_MODE_NAMES[mode]})')
+            plt.xlabel('Time (seconds)')
+            plt.ylabel('Delay (us)')
+            plt.grid(True)
+            plt.legend()
+            plt.savefig(f'{PLOTS_DIR}/kernel_rtt_vs_time_{mode_name}.png')
+            plt.close()
+
+            plt.figure(figsize=(12, 8))
+            plt.plot(np.sort(errors_us), np.arange(1, len(errors_us) + 1) / len(errors_us))
+            plt.title(f'Python RTT Measurement Error ({SIMULATION_MODE_NAMES[mode]})')
+            plt.xlabel('Python RTT - Kernel RTT (us)')
+            plt.ylabel('Fraction of Samples')
+            plt.grid(True)
+            plt.savefig(f'{PLOTS_DIR}/kernel_rtt_error_cdf_{mode_name}.png')
+            plt.close()
+        except Exception as e:
+            logger.error(f"Error creating kernel timestamp plot: {e}")
+
+    logger.info("Kernel timestamp tests completed.")
+
+
+def run_pacing_test():
+    """Retransmissions and bottleneck drops with and without pacing through an emulated link"""
+
+    logger.info("=== Running Pacing Test ===")
+
+    # results[gain][protocol] -> (avg_time, avg_retransmissions, avg_link_drops)
+    results = {gain: {} for gain in PACING_GAINS}
+
+    for protocol in CONGESTION_PROTOCOLS:
+        for gain in PACING_GAINS:
+            cumulative_time = 0
+            cumulative_retrans = 0
+            cumulative_drops = 0
+            successful_trials = 0
+
+            for trial in range(TRIALS):
+                logger.info(f"Protocol {PROTOCOL_NAMES[protocol]} - Pacing {gain or 'off'} - Trial {trial + 1}")
+                link = EmulatedLink(**PACING_LINK).start()
+                try:
+                    _, client_time, retrans, _, _, _, _, _ = run_single_transfer(1, 0.0, protocol, pacing_gain=gain,
+                                                                                 link=link)
+                    stats = link.stop()
+                    if client_time > 0:
+                        cumulative_time += client_time
+                        cumulative_retrans += retrans
+                        cumulative_drops += stats.dropped
+                        successful_trials += 1
+                except Exception as e:
+                    link.stop()
+                    logger.error(f"Error in trial: {e}")
+
+                gc.collect()
+                time.sleep(1)  # Pause between trials
+
+            trials = max(successful_trials, 1)  # Avoid division by zero
+            results[gain][protocol] = (cumulative_time / trials, cumulative_retrans / trials,
+                                       cumulative_drops / trials)
+
+        unpaced = results[None][protocol]
+        for gain in PACING_GAINS[1:]:
+            paced = results[gain][protocol]
+            logger.info(f"{PROTOCOL_NAMES[protocol]}: pacing at gain {gain} cut retransmissions by "
+                        f"{100 * (1 - paced[1] / max(unpaced[1], 1)):.1f}% and link drops by "
+                        f"{100 * (1 - paced[2] / max(unpaced[2], 1)):.1f}%")
+
+    # Grouped bars: one group per protocol, one bar per pacing setting
+    for index, (metric, ylabel) in enumerate([("completion_time", "Completion Time (seconds)"),
+                                              ("retransmissions", "Retransmissions"),
+                                              ("link_drops", "Bottleneck Drops")]):
+        try:
+            plt.figure(figsize=(12, 8))
+            positions = np.arange(len(CONGESTION_PROTOCOLS))
+            width = 0.8 / len(PACING_GAINS)
+            for offset, gain in enumerate(PACING_GAINS):
+                plt.bar(positions + offset * width,
+                        [results[gain][protocol][index] for protocol in CONGESTION_PROTOCOLS],
+                        width, label=f"pacing gain {gain}" if gain else "no pacing")
+            plt.xticks(positions + width * (len(PACING_GAINS) - 1) / 2,
+                       [PROTOCOL_NAMES[protocol] for protocol in CONGESTION_PROTOCOLS])
+            plt.title(f'{ylabel} through a {PACING_LINK["rate_bps"] / 1e6:.0f} Mbit/s, '
+                      f'{PACING_LINK["queue_packets"]} packet bottleneck')
+            plt.ylabel(ylabel)
+            plt.grid(True, axis='y')
+            plt.legend()
+            plt.savefig(f'{PLOTS_DIR}/pacing_{metric}.png')
+            plt.close()
+        except Exception as e:
+            logger.error(f"Error creating pacing plot: {e}")
+
+    logger.info("Pacing tests completed.")
+
+
+def run_bdp_test():
+    """Reno against CUBIC through a long, fast emulated link where the window has to grow well past SS_THRESH"""
+
+    logger.info("=== Running High-BDP Link Test ===")
+
+    # results[protocol] -> (avg_time, avg_retransmissions, avg_link_drops), plus one cwnd trace each
+    results = {}
+    cwnd_traces = {}
+
+    for protocol in BDP_PROTOCOLS:
+        cumulative_time = 0
+        cumulative_retrans = 0
+        cumulative_drops = 0
+        successful_trials = 0
+
+        for trial in range(TRIALS):
+            logger.info(f"Protocol {PROTOCOL_NAMES[protocol]} - High-BDP link - Trial {trial + 1}")
+            link = EmulatedLink(**BDP_LINK).start()
+            try:
+                _, client_time, retrans, _, cwnd_history, _, _, _ = run_single_transfer(
+                    1, 0.0, protocol, link=link, max_window=BDP_MAX_WINDOW)
+                stats = link.stop()
+                if client_time > 0:
+                    cumulative_time += client_time
+                    cumulative_retrans += retrans
+                    cumulative_drops += stats.dropped
+                    successful_trials += 1
+                    cwnd_traces.setdefault(protocol, cwnd_history)
+            except Exception as e:
+                link.stop()
+                logger.error(f"Error in trial: {e}")
+
+            gc.collect()
+            time.sleep(1)  # Pause between trials
+
+        trials = max(successful_trials, 1)  # Avoid division by zero
+        results[protocol] = (cumulative_time / trials, cumulative_retrans / trials, cumulative_drops / trials)
+        logger.info(f"{PROTOCOL_NAMES[protocol]}: {results[protocol][0]:.2f}s, "
+                    f"{results[protocol][1]:.1f} retransmissions, {results[protocol][2]:.1f} link drops")
+
+    link_name = (f'{BDP_LINK["rate_bps"] / 1e6:.0f} Mbit/s, {BDP_LINK["delay"] * 2000:.0f} ms RTT, '
+                 f'{BDP_LINK["queue_packets"]} packet queue')
+    for index, (metric, ylabel) in enumerate([("completion_time", "Completion Time (seconds)"),
+                                              ("retransmissions", "Retransmissions"),
+                                              ("link_drops", "Bottleneck Drops")]):
+        try:
+            plt.figure(figsize=(10, 6))
+            plt.bar([PROTOCOL_NAMES[protocol] for protocol in BDP_PROTOCOLS],
+                    [results[protocol][index] for protocol in BDP_PROTOCOLS])
+            plt.title(f'{ylabel} over a {link_name} link')
+            plt.ylabel(ylabel)
+            plt.grid(True, axis='y')
+            plt.savefig(f'{PLOTS_DIR}/bdp_{metric}.png')
+            plt.close()
+        except Exception as e:
+            logger.error(f"Error creating high-BDP plot: {e}")
+
+    # The window over time shows the sawtooth against the cubic curve
+    try:
+        plt.figure(figsize=(12, 6))
+        for protocol, cwnd_history in cwnd_traces.items():
+            if cwnd_history:
+                times, cwnd = zip(*cwnd_history)
+                plt.plot(times, cwnd, label=PROTOCOL_NAMES[protocol])
+        plt.title(f'Congestion Window vs Time over a {link_name} link')
+        plt.xlabel('Time (seconds)')
+        plt.ylabel('cwnd (segments)')
+        plt.grid(True)
+        plt.legend()
+        plt.savefig(f'{PLOTS_DIR}/bdp_cwnd_vs_time.png')
+        plt.close()
+    except Exception as e:
+        logger.error(f"Error creating high-BDP cwnd plot: {e}")
+
+    logger.info("High-BDP link tests completed.")
+
+
+def run_rtt_inflation_test():
+    """How far each protocol pushes the RTT above the path's minimum by queuing at a bottleneck"""
+
+    logger.info("=== Running RTT Inflation Test ===")
+
+    # results[protocol] -> (avg_time, avg mean RTT / min RTT, avg 90th percentile RTT in ms)
+    results = {}
+
+    for protocol in CONGESTION_PROTOCOLS:
+        cumulative_time = 0
+        cumulative_inflation = 0
+        cumulative_p90 = 0
+        successful_trials = 0
+
+        for trial in range(TRIALS):
+            logger.info(f"Protocol {PROTOCOL_NAMES[protocol]} - Queuing bottleneck - Trial {trial + 1}")
+            link = EmulatedLink(**QUEUE_LINK).start()
+            try:
+                _, client_time, _, _, _, rtt_history, _, _ = run_single_transfer(
+                    1, 0.0, protocol, link=link, max_window=QUEUE_MAX_WINDOW)
+                link.stop()
+                if client_time > 0 and rtt_history:
+                    samples = sorted(rtt for _, rtt in rtt_history)
+                    cumulative_time += client_time
+                    cumulative_inflation += np.mean(samples) / samples[0]
+                    cumulative_p90 += samples[int(len(samples) * 0.9)] * 1000
+                    successful_trials += 1
+            except Exception as e:
+                link.stop()
+                logger.error(f"Error in trial: {e}")
+
+            gc.collect()
+            time.sleep(1)  # Pause between trials
+
+        trials = max(successful_trials, 1)  # Avoid division by zero
+        results[protocol] = (cumulative_time / trials, cumulative_inflation / trials, cumulative_p90 / trials)
+        logger.info(f"{PROTOCOL_NAMES[protocol]}: {results[protocol][0]:.2f}s, mean RTT "
+                    f"{results[protocol][1]:.2f}x the minimum, 90th percentile {results[protocol][2]:.1f}ms")
+
+    link_name = (f'{QUEUE_LINK["rate_bps"] / 1e6:.0f} Mbit/s, {QUEUE_LINK["delay"] * 2000:.0f} ms RTT, '
+                 f'{QUEUE_LINK["queue_packets"]} packet queue')
+    for index, (metric, ylabel) in enumerate([("completion_time", "Completion Time (seconds)"),
+                                              ("inflation", "Mean RTT / Min RTT"),
+                                              ("p90", "90th Percentile RTT (ms)")]):
+        try:
+            plt.figure(figsize=(12, 6))
+            plt.bar([PROTOCOL_NAMES[protocol] for protocol in CONGESTION_PROTOCOLS],
+                    [results[protocol][index] for protocol in CONGESTION_PROTOCOLS])
+            plt.title(f'{ylabel} over a {link_name} link')
+            plt.ylabel(ylabel)
+            plt.grid(True, axis='y')
+            plt.savefig(f'{PLOTS_DIR}/rtt_inflation_{metric}.png')
+            plt.close()
+        except Exception as e:
+            logger.error(f"Error creating RTT inflation plot: {e}")
+
+    logger.info("RTT inflation tests completed.")
+
+
 def run_timeout_value_test():
     """Test impact of different timeout values across protocols for each simulation mode"""
     logger.info("=== Running Timeout Value Impact Test ===")
@@ -439,7 +1118,7 @@ def run_timeout_value_test():
                         f"Mode {SIMULATION_MODE_NAMES[mode]} - Protocol {PROTOCOL_NAMES[protocol]} - Timeout {timeout * 1000}ms - Trial {trial + 1}")
 
                     try:
-                        _, client_time, _, _, cwnd_h, rtt_h, rto_h = run_single_transfer(
+                        _, client_time, _, _, cwnd_h, rtt_h, rto_h, _ = run_single_transfer(
                             mode,
                             TEST_ERROR_RATE,  # Fixed error rate
                             protocol,
@@ -516,7 +1195,7 @@ def run_window_size_test():
                         f"Mode {SIMULATION_MODE_NAMES[mode]} - Protocol {PROTOCOL_NAMES[protocol]} - Window Size {window} - Trial {trial + 1}")
 
                     try:
-                        _, client_time, _, _, cwnd_h, rtt_h, rto_h = run_single_transfer(
+                        _, client_time, _, _, cwnd_h, rtt_h, rto_h, _ = run_single_transfer(
                             mode,
                             TEST_ERROR_RATE,  # Fixed error rate
                             protocol,
@@ -605,7 +1284,7 @@ def compare_protocols_all_modes():
                     f"Comprehensive comparison - Protocol: {PROTOCOL_NAMES[protocol]}, Mode: {SIMULATION_MODE_NAMES[mode]}, Trial {trial + 1}")
 
                 try:
-                    _, client_time, retrans, throughput, cwnd_h, rtt_h, rto_h = run_single_transfer(
+                    _, client_time, retrans, throughput, cwnd_h, rtt_h, rto_h, _ = run_single_transfer(
                         mode,
                         error_rate,
                         protocol,
@@ -722,6 +1401,54 @@ def main():
         except Exception as e:
             logger.error(f"Comprehensive comparison failed: {e}")
 
+        # Test 6: Retransmissions and completion time with and without SACK
+        try:
+            run_sack_comparison_test()
+        except Exception as e:
+            logger.error(f"SACK comparison test failed: {e}")
+
+        # Test 7: Pacing against a bandwidth-limited bottleneck
+        try:
+            run_pacing_test()
+        except Exception as e:
+            logger.error(f"Pacing test failed: {e}")
+
+        # Test 8: Reno against CUBIC on a high bandwidth-delay product link
+        try:
+            run_bdp_test()
+        except Exception as e:
+            logger.error(f"High-BDP link test failed: {e}")
+
+        # Test 9: RTT inflation from queuing at a bottleneck, where delay based control should win
+        try:
+            run_rtt_inflation_test()
+        except Exception as e:
+            logger.error(f"RTT inflation test failed: {e}")
+
+        # Test 10: Reno against NewReno and PRR when one window loses several segments
+        try:
+            run_recovery_test()
+        except Exception as e:
+            logger.error(f"Fast recovery test failed: {e}")
+
+        # Test 11: tail latency of small and medium files with RACK-TLP loss detection
+        try:
+            run_tail_latency_test()
+        except Exception as e:
+            logger.error(f"Tail latency test failed: {e}")
+
+        # Test 12: RTT samples with and without the timestamp option
+        try:
+            run_timestamp_test()
+        except Exception as e:
+            logger.error(f"Timestamp option test failed: {e}")
+
+        # Test 13: Python measured RTT against kernel receive timestamps
+        try:
+            run_kernel_timestamp_test()
+        except Exception as e:
+            logger.error(f"Kernel timestamp test failed: {e}")
+
     except Exception as e:
         logger.error(f"Critical error in main: {e}")
     finally:
@@ -9,8 +9,14 @@ v5_helpers.py for Phase 5 EECE 4830 Project
 This helper function file contains functions used in phase 5 .py files
 
 """
+import os
+import mmap
+import queue
 import random
 import logging
+import threading
+from v5_checksum import checksum, checksum_many  # re-exported for the client and server
+from v5_wire import DEFAULT_WIRE_VERSION, encode_data_header
 
 ENABLE_CONSOLE_LOG = True
 log_handlers = [logging.FileHandler("tcp_simulation.log", mode="a")]
@@ -26,22 +32,14 @@ logger = logging.getLogger("Helpers")
 
 random.seed(123)
 
+WRITE_QUEUE_SEGMENTS = 256  # segments waiting for the write-behind thread before write() blocks
+PREALLOCATE_BYTES = 8 * 1024 * 1024  # output file is grown ahead of the writes in steps of this size
+
 
 def debug_print(msg):
     logger.debug(msg)
 
 
-def checksum(data):
-    if len(data) % 2 == 1:
-        data += b'\x00'
-    total = 0
-    for i in range(0, len(data), 2):
-        word = (data[i] << 8) + data[i + 1]
-        total += word
-        total = (total & 0xFFFF) + (total >> 16)
-    return ~total & 0xFFFF
-
-
 def flip_bit(data):
     if not data:
         return data
@@ -69,3 +67,150 @@ def make_packet(file_name, sequence_number, packet_size=1024):
     chksum = checksum(data)
     header = f"{sequence_number}|{chksum}|".encode()
     return header + data
+
+
+class PacketSource:
+    """
+    Precomputed packet table for one file. The file is memory-mapped once and
+    the per-segment offsets, payload views, checksums and encoded headers are
+    built up front, so looking up a segment is an O(1) list index instead of an
+    open/seek/read/checksum per packet like make_packet(). Headers are encoded
+    once per wire version and flags, the first time they are asked for.
+    """
+
+    def __init__(self, file_name, packet_size=1024):
+        self.file_name = file_name
+        self.packet_size = packet_size
+        self.file_size = os.path.getsize(file_name)
+
+        if self.file_size:
+            with open(file_name, "rb") as f:
+                # Copy-on-write mapping: pages are only read, but the views are writable
+                # buffers, which lets ctypes take their address for sendmmsg
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        else:
+            self._mmap = b""  # mmap refuses to map an empty file
+        self._view = memoryview(self._mmap)
+
+        self.offsets = list(range(0, self.file_size, packet_size))
+        self.payloads = [self._view[offset:offset + packet_size] for offset in self.offsets]
+        self.checksums = checksum_many(self.payloads)
+        self._headers = {}  # (wire version, flags) -> list of encoded headers
+        debug_print(f"PacketSource built for {file_name}: {len(self.offsets)} segments")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def header_table(self, version=DEFAULT_WIRE_VERSION, flags=0):
+        headers = self._headers.get((version, flags))
+        if headers is None:
+            headers = [encode_data_header(version, seq, chksum, len(payload), flags)
+                       for seq, (chksum, payload) in enumerate(zip(self.checksums, self.payloads))]
+            self._headers[(version, flags)] = headers
+        return headers
+
+    def segment(self, sequence_number, version=DEFAULT_WIRE_VERSION, flags=0):
+        """Return (header, payload memoryview) for a segment, or None past the end of the file."""
+        if sequence_number >= len(self.offsets):
+            return None
+        return self.header_table(version, flags)[sequence_number], self.payloads[sequence_number]
+
+    def packet(self, sequence_number, version=DEFAULT_WIRE_VERSION):
+        """Joined header + payload. With version=WIRE_V1 this matches make_packet()."""
+        if sequence_number >= len(self.offsets):
+            return None
+        return self.header_table(version)[sequence_number] + self.payloads[sequence_number]
+
+    def close(self):
+        # The payload views must be released before the mapping can be closed
+        for payload in self.payloads:
+            payload.release()
+        self._view.release()
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+
+
+class SegmentSink:
+    """
+    Streaming output file for a receiver. Each accepted segment is written at
+    seq * packet_size as soon as it arrives, in or out of order, so the receiver
+    never holds the whole file in memory. The writes happen on a write-behind
+    thread fed by a bounded queue, which keeps disk I/O out of the recv/ACK loop
+    and caps the memory in flight at WRITE_QUEUE_SEGMENTS segments.
+
+    The file is preallocated in PREALLOCATE_BYTES steps where posix_fallocate
+    exists and truncated to the real length on close(). os.pwrite is used where
+    available, otherwise the writer thread seeks and writes (it owns the file).
+    """
+
+    def __init__(self, file_name, packet_size=1024, queue_segments=WRITE_QUEUE_SEGMENTS):
+        self.file_name = file_name
+        self.packet_size = packet_size
+        self.length = 0  # highest byte written so far
+        self._allocated = 0
+        self._error = None
+        self._fd = os.open(file_name, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+        self._queue = queue.Queue(maxsize=queue_segments)
+        self._thread = threading.Thread(target=self._write_behind, name="SegmentSink", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, sequence_number, payload):
+        """Queue a segment for writing. The payload is copied, so ring buffer views are safe to pass."""
+        if self._error is not None:
+            raise self._error
+        self._queue.put((sequence_number * self.packet_size, bytes(payload)))
+
+    def _preallocate(self, end):
+        if end <= self._allocated or not hasattr(os, "posix_fallocate"):
+            return
+        self._allocated = max(end, self._allocated + PREALLOCATE_BYTES)
+        try:
+            os.posix_fallocate(self._fd, 0, self._allocated)
+        except OSError:
+            pass  # some filesystems refuse fallocate, the writes still extend the file
+
+    def _write_behind(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            offset, data = item
+            if self._error is not None:
+                continue  # keep draining so write() never blocks on a dead writer
+            try:
+                self._preallocate(offset + len(data))
+                if hasattr(os, "pwrite"):
+                    os.pwrite(self._fd, data, offset)
+                else:
+                    os.lseek(self._fd, offset, os.SEEK_SET)
+                    os.write(self._fd, data)
+                self.length = max(self.length, offset + len(data))
+            except OSError as e:
+                self._error = e
+
+    def close(self):
+        """Flush the queue, trim the preallocated tail and close the file."""
+        if self._fd is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            os.ftruncate(self._fd, self.length)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+        if self._error is not None:
+            raise self._error
+        debug_print(f"SegmentSink closed {self.file_name}: {self.length} bytes")
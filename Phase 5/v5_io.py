@@ -0,0 +1,455 @@
+"""
+Benjamin Dearden
+Michael Smith
+Peter Dingue
+Kathy Doan
+v5_io.py for Phase 5 EECE 4830 Project
+
+Socket I/O helpers for the phase 5 client and server.
+
+send_segment() sends a header and a payload as one datagram with scatter/gather
+sendmsg, so the payload (a memoryview into the PacketSource mmap) is never
+copied into a joined bytes object. Platforms without sendmsg (Windows) fall
+back to sendto(header + payload).
+
+ReceiveRing is the receive side counterpart: a preallocated ring of
+bytearrays filled with recvfrom_into, so receiving a datagram does not
+allocate a new bytes object and headers are parsed straight from a
+memoryview of the ring slot.
+
+BatchSender and BatchReceiver are the optional batched layer for Linux. A
+whole window burst goes out in one sendmmsg call, and the receive queue is
+drained with one recvmmsg call. Both are called through ctypes and expect a
+connected socket. Where the calls are unavailable they fall back to one
+send/recv per datagram with the same interface.
+
+The opt-in offload mode uses UDP GSO and GRO (Linux 4.18+/5.0+).
+BatchSender(gso=True) sends each contiguous run of equal-sized datagrams as
+one super-buffer, and the kernel cuts it into datagrams (UDP_SEGMENT).
+GROReceiver enables UDP_GRO and splits coalesced reads back into the
+original datagrams. Support is probed at runtime, and offload is switched
+off cleanly when the kernel rejects the socket option.
+
+TimestampReceiver enables SO_TIMESTAMPNS (Linux) and reads each datagram
+with recvmsg, so the time the kernel received it comes along as ancillary
+data. That time is not delayed by select wakeups, the GIL or logging, which
+on loopback make up most of an RTT measured in Python.
+
+"""
+import os
+import sys
+import errno
+import struct
+import ctypes
+import time
+import select
+import socket
+import logging
+
+logger = logging.getLogger("IO")
+
+HAVE_SENDMSG = hasattr(socket.socket, "sendmsg")
+
+RING_SLOTS = 64
+RING_SLOT_SIZE = 2048  # same as the server BUFFER_SIZE
+MAX_BATCH = 64  # datagrams per sendmmsg call
+
+# recvmmsg/sendmmsg flags from <sys/socket.h>
+MSG_DONTWAIT = 0x40
+MSG_WAITFORONE = 0x10000
+SOCKADDR_SIZE = 128  # sizeof(struct sockaddr_storage)
+
+# UDP offload socket options from <linux/udp.h>
+SOL_UDP = getattr(socket, "SOL_UDP", 17)
+UDP_SEGMENT = getattr(socket, "UDP_SEGMENT", 103)
+UDP_GRO = getattr(socket, "UDP_GRO", 104)
+GSO_MAX_SEGMENTS = 64  # kernel limit on segments per GSO send
+GSO_MAX_BYTES = 65507  # largest UDP payload
+GRO_SLOTS = 8
+GRO_SLOT_SIZE = 65536
+
+# Kernel receive timestamps from <asm-generic/socket.h>, the control message has the option's number
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+SCM_TIMESTAMPNS = SO_TIMESTAMPNS
+TIMESPEC = struct.Struct("@ll")  # struct timespec: tv_sec, tv_nsec
+
+
+class IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p),
+                ("iov_len", ctypes.c_size_t)]
+
+
+class MsgHdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p),
+                ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(IOVec)),
+                ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p),
+                ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+
+class MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", MsgHdr),
+                ("msg_len", ctypes.c_uint)]
+
+
+def _load_libc():
+    # sendmmsg/recvmmsg only exist on Linux
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int]
+        libc.sendmmsg.restype = ctypes.c_int
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int,
+                                  ctypes.c_void_p]
+        libc.recvmmsg.restype = ctypes.c_int
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+libc = _load_libc()
+HAVE_MMSG = libc is not None
+
+
+def send_segment(sock, header, payload, address=None):
+    """Send header + payload as a single datagram. address=None sends on a connected socket."""
+    if HAVE_SENDMSG:
+        if address is None:
+            return sock.sendmsg([header, payload])
+        return sock.sendmsg([header, payload], [], 0, address)
+    if address is None:
+        return sock.send(header + payload)
+    return sock.sendto(header + payload, address)
+
+
+class ReceiveRing:
+    """
+    Ring of preallocated receive buffers. recv() fills the next slot with
+    recvfrom_into and returns a memoryview of the datagram, which stays valid
+    until the ring wraps around. Anything kept longer must be copied out.
+    """
+
+    def __init__(self, sock, slots=RING_SLOTS, slot_size=RING_SLOT_SIZE):
+        self.sock = sock
+        self.buffers = [bytearray(slot_size) for _ in range(slots)]
+        self.views = [memoryview(buffer) for buffer in self.buffers]
+        self.index = 0
+
+    def recv(self, flags=0):
+        """Receive one datagram, returns (memoryview, address) like recvfrom."""
+        view = self.views[self.index]
+        self.index = (self.index + 1) % len(self.views)
+        nbytes, address = self.sock.recvfrom_into(view, 0, flags)
+        return view[:nbytes], address
+
+    def recv_batch(self, nowait=False):
+        """
+        Receive every queued datagram (here just one) as a list of (memoryview, address).
+        nowait=True never blocks and returns [] if nothing is queued, for callers that
+        already waited in select/epoll.
+        """
+        if nowait:
+            try:
+                # Windows has no MSG_DONTWAIT, there a readable socket is only read once anyway
+                return [self.recv(getattr(socket, "MSG_DONTWAIT", 0))]
+            except BlockingIOError:
+                return []
+        return [self.recv()]
+
+
+def gso_supported(sock):
+    """Probe UDP_SEGMENT on the socket, leaving it switched off again."""
+    if not sys.platform.startswith("linux") or not HAVE_SENDMSG:
+        return False
+    try:
+        sock.setsockopt(SOL_UDP, UDP_SEGMENT, 1024)
+        sock.setsockopt(SOL_UDP, UDP_SEGMENT, 0)
+    except OSError as e:
+        logger.info(f"UDP GSO not supported here ({e})")
+        return False
+    return True
+
+
+def gso_runs(datagrams, max_segments=GSO_MAX_SEGMENTS, max_bytes=GSO_MAX_BYTES):
+    """
+    Split datagrams into runs that can each be one GSO send: every datagram in a
+    run has the size of the first one, except the last which may be shorter.
+    """
+    runs = []
+    run = []
+    run_size = run_bytes = 0
+    for buffers in datagrams:
+        size = sum(len(buffer) for buffer in buffers)
+        # run_bytes stops being a multiple of run_size once a shorter datagram has closed the run
+        if run and (size > run_size or run_bytes % run_size or len(run) == max_segments
+                    or run_bytes + size > max_bytes):
+            runs.append(run)
+            run = []
+        if not run:
+            run_size = size
+            run_bytes = 0
+        run.append(buffers)
+        run_bytes += size
+    if run:
+        runs.append(run)
+    return runs
+
+
+def buffer_address(buffer):
+    """
+    Return (address, keepalive) for a bytes object or a writable buffer. The
+    keepalive object must stay referenced until the syscall using the address
+    has returned.
+    """
+    if isinstance(buffer, bytes):
+        pointer = ctypes.c_char_p(buffer)
+        return ctypes.cast(pointer, ctypes.c_void_p).value, pointer
+    if not len(buffer):
+        return None, None
+    pinned = ctypes.c_char.from_buffer(buffer)
+    return ctypes.addressof(pinned), pinned
+
+
+def parse_sockaddr(raw):
+    """Convert a struct sockaddr filled in by the kernel into a Python address tuple."""
+    family = int.from_bytes(raw[0:2], sys.byteorder)
+    port = int.from_bytes(raw[2:4], "big")
+    if family == socket.AF_INET:
+        return socket.inet_ntoa(bytes(raw[4:8])), port
+    if family == socket.AF_INET6:
+        return (socket.inet_ntop(socket.AF_INET6, bytes(raw[8:24])), port,
+                int.from_bytes(raw[4:8], "big"), int.from_bytes(raw[24:28], sys.byteorder))
+    return None
+
+
+class BatchSender:
+    """
+    Sends lists of datagrams on a connected socket. Each datagram is a tuple of
+    one or two buffers (header, payload) that are gathered by the kernel.
+    With gso=True, runs of equal-sized datagrams go out as single GSO sends.
+    syscalls counts the send calls made, for the benchmarks.
+    """
+
+    def __init__(self, sock, max_batch=MAX_BATCH, enabled=True, gso=False):
+        self.sock = sock
+        self.max_batch = max_batch
+        self.enabled = enabled and HAVE_MMSG
+        self.gso = gso and gso_supported(sock)
+        self.syscalls = 0
+        if self.enabled:
+            self.iovecs = (IOVec * (2 * max_batch))()
+            self.msgs = (MMsgHdr * max_batch)()
+            for i in range(max_batch):
+                self.msgs[i].msg_hdr.msg_iov = ctypes.pointer(self.iovecs[2 * i])
+
+    def send_batch(self, datagrams):
+        if not self.gso:
+            self.send_each(datagrams)
+            return
+        for run in gso_runs(datagrams):
+            if len(run) == 1 or not self.gso:
+                self.send_each(run)
+                continue
+            segment_size = sum(len(buffer) for buffer in run[0])
+            try:
+                self.sock.sendmsg([buffer for buffers in run for buffer in buffers],
+                                  [(SOL_UDP, UDP_SEGMENT, struct.pack("=H", segment_size))])
+                self.syscalls += 1
+            except OSError as e:
+                logger.warning(f"GSO send rejected ({e}), disabling offload")
+                self.gso = False
+                self.send_each(run)
+
+    def send_each(self, datagrams):
+        """Send every datagram on its own, through sendmmsg when it is available."""
+        if not self.enabled:
+            for buffers in datagrams:
+                if len(buffers) == 1:
+                    self.sock.send(buffers[0])
+                else:
+                    send_segment(self.sock, *buffers)
+            self.syscalls += len(datagrams)
+            return
+
+        start = 0
+        while start < len(datagrams):
+            chunk = datagrams[start:start + self.max_batch]
+            keepalive = []
+            for i, buffers in enumerate(chunk):
+                for j, buffer in enumerate(buffers):
+                    address, pinned = buffer_address(buffer)
+                    keepalive.append(pinned)
+                    self.iovecs[2 * i + j].iov_base = address
+                    self.iovecs[2 * i + j].iov_len = len(buffer)
+                self.msgs[i].msg_hdr.msg_iovlen = len(buffers)
+
+            sent = libc.sendmmsg(self.sock.fileno(), self.msgs, len(chunk), 0)
+            self.syscalls += 1
+            if sent < 0:
+                err = ctypes.get_errno()
+                if err not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise OSError(err, os.strerror(err))
+                # Sockets with a timeout are non-blocking underneath, wait for buffer space
+                select.select([], [self.sock], [])
+                continue
+            start += sent
+
+
+class BatchReceiver(ReceiveRing):
+    """
+    ReceiveRing that drains up to one ring's worth of queued datagrams per
+    recvmmsg call. recv_batch() returns a list of (memoryview, address); the
+    views stay valid until the next recv_batch() call. The socket timeout is
+    honoured and raises socket.timeout like recvfrom, unless nowait=True. On a connected socket
+    addresses=False skips decoding the sender address and returns None.
+    """
+
+    def __init__(self, sock, slots=RING_SLOTS, slot_size=RING_SLOT_SIZE, enabled=True, addresses=True):
+        super().__init__(sock, slots, slot_size)
+        self.enabled = enabled and HAVE_MMSG
+        self.addresses = addresses
+        self.syscalls = 0
+        if self.enabled:
+            self.names = bytearray(SOCKADDR_SIZE * slots)
+            self.iovecs = (IOVec * slots)()
+            self.msgs = (MMsgHdr * slots)()
+            # The bytearrays are pinned for the life of the ring, so the addresses never change
+            self.pinned = [ctypes.c_char.from_buffer(buffer) for buffer in self.buffers]
+            self.pinned_names = ctypes.c_char.from_buffer(self.names)
+            names_address = ctypes.addressof(self.pinned_names)
+            for i in range(slots):
+                self.iovecs[i].iov_base = ctypes.addressof(self.pinned[i])
+                self.iovecs[i].iov_len = slot_size
+                header = self.msgs[i].msg_hdr
+                header.msg_name = names_address + i * SOCKADDR_SIZE
+                header.msg_iov = ctypes.pointer(self.iovecs[i])
+                header.msg_iovlen = 1
+
+    def recv_batch(self, nowait=False):
+        if not self.enabled:
+            self.syscalls += 1
+            return super().recv_batch(nowait)
+
+        timeout = self.sock.gettimeout()
+        if nowait:
+            flags = MSG_DONTWAIT
+        elif timeout is None:
+            flags = MSG_WAITFORONE
+        else:
+            # A socket with a timeout is non-blocking underneath, so wait for data first
+            if not select.select([self.sock], [], [], timeout)[0]:
+                raise socket.timeout("timed out")
+            flags = MSG_DONTWAIT
+
+        for i in range(len(self.msgs)):
+            self.msgs[i].msg_hdr.msg_namelen = SOCKADDR_SIZE
+        count = libc.recvmmsg(self.sock.fileno(), self.msgs, len(self.msgs), flags, None)
+        self.syscalls += 1
+        if count < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return []
+            raise OSError(err, os.strerror(err))
+
+        if not self.addresses:
+            return [(self.views[i][:self.msgs[i].msg_len], None) for i in range(count)]
+        return [(self.views[i][:self.msgs[i].msg_len],
+                 parse_sockaddr(self.names[i * SOCKADDR_SIZE:(i + 1) * SOCKADDR_SIZE]))
+                for i in range(count)]
+
+
+class GROReceiver(ReceiveRing):
+    """
+    ReceiveRing with UDP_GRO enabled. The kernel may hand over several
+    datagrams from the same flow in one read, with their size in a UDP_GRO
+    control message. recv_batch() splits them back into one
+    (memoryview, address) per original datagram. If the socket option is
+    rejected, enabled is False and recv_batch() reads one datagram at a time.
+    """
+
+    def __init__(self, sock, slots=GRO_SLOTS, slot_size=GRO_SLOT_SIZE):
+        super().__init__(sock, slots, slot_size)
+        self.syscalls = 0
+        self.enabled = sys.platform.startswith("linux") and hasattr(sock, "recvmsg_into")
+        if self.enabled:
+            try:
+                sock.setsockopt(SOL_UDP, UDP_GRO, 1)
+            except OSError as e:
+                logger.info(f"UDP GRO not supported here ({e})")
+                self.enabled = False
+        self.ancillary_size = socket.CMSG_SPACE(struct.calcsize("i")) if self.enabled else 0
+
+    def recv_batch(self):
+        self.syscalls += 1
+        if not self.enabled:
+            return [self.recv()]
+        view = self.views[self.index]
+        self.index = (self.index + 1) % len(self.views)
+        nbytes, ancillary, _, address = self.sock.recvmsg_into([view], self.ancillary_size)
+
+        segment_size = nbytes
+        for level, kind, data in ancillary:
+            if level == SOL_UDP and kind == UDP_GRO:
+                segment_size = struct.unpack("=i", data[:struct.calcsize("i")])[0]
+        return [(view[offset:min(offset + segment_size, nbytes)], address)
+                for offset in range(0, nbytes, segment_size)] if nbytes else [(view[:0], address)]
+
+
+class TimestampReceiver(ReceiveRing):
+    """
+    ReceiveRing with SO_TIMESTAMPNS enabled. recv_batch() returns a list of
+    (memoryview, address) like the other receivers and sets arrivals to the
+    kernel receive time of each of those datagrams, converted to the
+    time.monotonic() clock (None where the kernel attached none). If the socket
+    option is rejected, enabled is False and every arrival is None.
+    """
+
+    def __init__(self, sock, slots=RING_SLOTS, slot_size=RING_SLOT_SIZE):
+        super().__init__(sock, slots, slot_size)
+        self.syscalls = 0
+        self.arrivals = []
+        self.enabled = sys.platform.startswith("linux") and hasattr(sock, "recvmsg_into")
+        if self.enabled:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+            except OSError as e:
+                logger.info(f"SO_TIMESTAMPNS not supported here ({e})")
+                self.enabled = False
+        self.ancillary_size = socket.CMSG_SPACE(TIMESPEC.size) if self.enabled else 0
+
+    def recv(self, flags=0):
+        if not self.enabled:
+            self.arrivals.append(None)
+            return super().recv(flags)
+        view = self.views[self.index]
+        self.index = (self.index + 1) % len(self.views)
+        nbytes, ancillary, _, address = self.sock.recvmsg_into([view], self.ancillary_size, flags)
+        arrival = None
+        for level, kind, data in ancillary:
+            if level == socket.SOL_SOCKET and kind == SCM_TIMESTAMPNS:
+                seconds, nanoseconds = TIMESPEC.unpack_from(data)
+                # The kernel stamps with the wall clock, the sender keeps monotonic times
+                arrival = seconds + nanoseconds * 1e-9 - (time.time() - time.monotonic())
+        self.arrivals.append(arrival)
+        return view[:nbytes], address
+
+    def recv_batch(self, nowait=False):
+        """
+        Every queued datagram, up to one ring's worth, with one recvmsg each.
+        nowait=True returns [] instead of blocking when nothing is queued.
+        """
+        self.arrivals = []
+        dontwait = getattr(socket, "MSG_DONTWAIT", 0)
+        batch = []
+        try:
+            batch.append(self.recv(dontwait if nowait else 0))
+            self.syscalls += 1
+            while len(batch) < len(self.views) and dontwait:
+                batch.append(self.recv(dontwait))
+                self.syscalls += 1
+        except BlockingIOError:
+            self.syscalls += 1
+        return batch
@@ -0,0 +1,134 @@
+"""
+Benjamin Dearden
+Michael Smith
+Peter Dingue
+Kathy Doan
+v5_link.py for Phase 5 EECE 4830 Project
+
+Emulated bottleneck link for loopback tests. The client sends to the link's
+port instead of the server's, and the link relays datagrams both ways:
+
+    client  <-->  EmulatedLink (LINK_PORT)  <-->  server (SERVER_PORT)
+
+Client to server traffic goes through a FIFO of queue_packets datagrams that
+drains at rate_bps, so a burst larger than the queue is tail-dropped like at
+a real bottleneck router. Each direction also adds delay seconds of
+propagation delay. ACKs coming back are only delayed, never queued.
+
+"""
+import time
+import socket
+import select
+import logging
+import threading
+from collections import deque, namedtuple
+
+logger = logging.getLogger("Link")
+
+LINK_PORT = 12001
+SERVER_ADDRESS = '127.0.0.1'
+SERVER_PORT = 12000
+LINK_RATE_BPS = 8000000  # 8 Mbit/s, about 1000 full segments per second
+LINK_QUEUE_PACKETS = 20
+LINK_DELAY = 0.01  # one-way propagation delay in seconds
+BUFFER_SIZE = 2048
+
+# Counters for one link run
+LinkStats = namedtuple("LinkStats", ["forwarded", "dropped", "max_queue"])
+
+
+class EmulatedLink:
+    """
+    Rate-limited, tail-drop relay between one client and the server. start() binds
+    LINK_PORT and relays on a background thread until stop(), which returns the
+    LinkStats. The link follows whichever client address sent to it last.
+    """
+
+    def __init__(self, rate_bps=LINK_RATE_BPS, queue_packets=LINK_QUEUE_PACKETS, delay=LINK_DELAY,
+                 port=LINK_PORT, server=(SERVER_ADDRESS, SERVER_PORT)):
+        self.rate_bps = rate_bps
+        self.queue_packets = queue_packets
+        self.delay = delay
+        self.port = port
+        self.server = server
+        self.forwarded = 0
+        self.dropped = 0
+        self.max_queue = 0
+        self.running = False
+        self.thread = None
+
+    @property
+    def address(self):
+        """Address a client should send to instead of the server's."""
+        return SERVER_ADDRESS, self.port
+
+    def start(self):
+        self.client_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.client_sock.bind(("", self.port))
+        self.server_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server_sock.connect(self.server)
+        self.running = True
+        self.thread = threading.Thread(target=self._relay, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.client_sock.close()
+        self.server_sock.close()
+        return LinkStats(self.forwarded, self.dropped, self.max_queue)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _relay(self):
+        client = None
+        # Datagrams waiting for the bottleneck, and ones that have left it, as (deliver_at, data)
+        bottleneck = deque()
+        upstream = deque()
+        downstream = deque()
+        link_free_at = 0.0  # when the bottleneck finishes serialising the datagram in front of it
+        while self.running:
+            now = time.monotonic()
+
+            # Move datagrams through the bottleneck and hand over everything that is due
+            while bottleneck and link_free_at <= now:
+                data = bottleneck.popleft()
+                link_free_at = max(link_free_at, now) + len(data) * 8 / self.rate_bps
+                upstream.append((link_free_at + self.delay, data))
+            while upstream and upstream[0][0] <= now:
+                try:
+                    self.server_sock.send(upstream.popleft()[1])
+                    self.forwarded += 1
+                except OSError:
+                    self.dropped += 1  # server not listening (yet or any more)
+            while downstream and downstream[0][0] <= now and client is not None:
+                self.client_sock.sendto(downstream.popleft()[1], client)
+
+            wake = [0.05]  # re-check running now and then
+            if bottleneck:
+                wake.append(link_free_at - now)
+            if upstream:
+                wake.append(upstream[0][0] - now)
+            if downstream:
+                wake.append(downstream[0][0] - now)
+            ready, _, _ = select.select([self.client_sock, self.server_sock], [], [], max(0.0, min(wake)))
+
+            now = time.monotonic()
+            if self.client_sock in ready:
+                data, client = self.client_sock.recvfrom(BUFFER_SIZE)
+                if len(bottleneck) >= self.queue_packets:
+                    self.dropped += 1
+                else:
+                    bottleneck.append(data)
+                    self.max_queue = max(self.max_queue, len(bottleneck))
+            if self.server_sock in ready:
+                try:
+                    downstream.append((now + self.delay, self.server_sock.recv(BUFFER_SIZE)))
+                except OSError:
+                    pass  # ICMP error from an earlier send
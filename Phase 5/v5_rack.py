@@ -0,0 +1,140 @@
+"""
+Benjamin Dearden
+Michael Smith
+Peter Dingue
+Kathy Doan
+v5_rack.py for Phase 5 EECE 4830 Project
+
+RACK-TLP loss detection (RFC 8985) for SenderCore, turned on with rack=True
+for any congestion protocol.
+
+Duplicate ACK counting needs three more segments to arrive after a loss, so a
+loss among the last few segments of a file, or any loss while ACKs are being
+dropped, waits out a full RTO. RACK goes by time instead: once a segment sent
+after S has been delivered, S is lost if it is still missing a reorder window
+after its own ACK should have come back (its send time + the latest RTT +
+reo_wnd). A Tail Loss Probe covers the case where nothing after the loss gets
+through at all: after about 2 SRTT without an ACK the sender sends one probe,
+new data if it has any or the last segment again, and the ACK the probe
+brings back lets RACK find the hole.
+
+Without SACK only base can be judged. A duplicate ACK is taken to deliver the
+next segment above base, the way Linux emulates SACK for Reno receivers.
+
+"""
+from collections import OrderedDict
+
+REO_WND_FRACTION = 0.25  # reorder window as a fraction of the min RTT (RFC 8985 RACK.reo_wnd)
+PTO_SRTT_MULTIPLIER = 2  # probe timeout in SRTTs
+PTO_MIN = 0.01  # seconds, keeps interpreter jitter from firing probes on loopback
+
+
+class RackTlp:
+    """
+    RACK and TLP state for one transfer. The core reports every segment it
+    sends with on_send() and every delivered one with delivered(), asks
+    detect_loss() which segments are lost after each ACK, and sends a probe
+    once probe_deadline() passes.
+    """
+
+    def __init__(self):
+        # Segments not yet delivered, with their send times, in the order they were last sent: a
+        # retransmission moves to the tail (RFC 8985 section 6.2), so loss detection can stop at the
+        # first one sent too late to judge
+        self.unacked = OrderedDict()
+
+        # The most recently sent segment known to be delivered: RACK.xmit_ts, RACK.end_seq and RACK.rtt
+        self.xmit_time = None
+        self.end_seq = -1
+        self.rtt = None
+        self.min_rtt = None
+        self.reorder_deadline = None  # when segments still inside the reorder window have to be checked again
+
+        self.probe_start = None  # last new data sent or ACK that advanced base, the PTO counts from here
+        self.probe_seq = None  # highest segment sent when the outstanding probe went out
+        self.probe_retransmit = False  # the outstanding probe resent data rather than sending new data
+
+    def on_send(self, seq, now):
+        unacked = self.unacked
+        unacked.pop(seq, None)
+        # The ACKs of one batch share a timestamp, and RACK orders by (send time, seq), so a segment
+        # sent at the same moment as higher ones goes in ahead of them
+        later = []
+        for tail in reversed(unacked):
+            if tail < seq or unacked[tail] != now:
+                break
+            later.append(tail)
+        unacked[seq] = now
+        for tail in reversed(later):
+            unacked.move_to_end(tail)
+
+    def delivered(self, seq, send_time, retransmitted, now):
+        """Record that seq, last sent at send_time, has reached the receiver."""
+        self.unacked.pop(seq, None)
+        rtt = now - send_time
+        if retransmitted and self.min_rtt is not None and rtt < self.min_rtt:
+            return  # too quick for the retransmission, the original was delivered
+        if self.min_rtt is None or rtt < self.min_rtt:
+            self.min_rtt = rtt
+        if self.xmit_time is None or (send_time, seq) > (self.xmit_time, self.end_seq):
+            self.xmit_time = send_time
+            self.end_seq = seq
+            self.rtt = rtt
+
+    def reorder_window(self, srtt):
+        window = self.min_rtt * REO_WND_FRACTION
+        return min(window, srtt) if srtt is not None else window
+
+    def detect_loss(self, core, now):
+        """
+        Segments in flight that were sent before the latest delivered one and are
+        now overdue. Segments still inside the reorder window set reorder_deadline.
+        """
+        self.reorder_deadline = None
+        if self.xmit_time is None:
+            return []
+        if core.sack_enabled and not core.scoreboard.sacked:
+            return []  # nothing above base has arrived, so nothing in flight was sent before it
+
+        overdue = self.rtt + self.reorder_window(core.estimated_rtt)
+        sacked = core.scoreboard.sacked
+        if core.sack_enabled:
+            candidates = self.unacked.items()
+        elif core.base < core.next_seq:
+            candidates = [(core.base, core.send_times[core.base & core.ring_mask])]
+        else:
+            candidates = []
+        lost = []
+        stale = []
+        wait = 0.0
+        for seq, send_time in candidates:
+            if seq < core.base or seq in sacked:
+                stale.append(seq)  # a probe resent a segment the receiver already had
+                continue
+            if (send_time, seq) >= (self.xmit_time, self.end_seq):
+                break  # this and everything after it was sent after the delivered segment
+            if core.resend_next <= seq < core.resend_end:
+                continue  # still waiting to be resent after an RTO
+            remaining = send_time + overdue - now
+            if remaining <= 0:
+                lost.append(seq)
+            else:
+                wait = max(wait, remaining)
+        for seq in stale:
+            del self.unacked[seq]
+        if wait:
+            self.reorder_deadline = now + wait
+        return lost
+
+    def probe_deadline(self, core):
+        """Time the next Tail Loss Probe is due, None if no probe is armed or the RTO would come first."""
+        if self.probe_start is None or self.probe_seq is not None or core.estimated_rtt is None or core.timer is None:
+            return None
+        deadline = self.probe_start + max(PTO_SRTT_MULTIPLIER * core.estimated_rtt, PTO_MIN)
+        return deadline if deadline < core.timer + core.rto else None
+
+    def on_timeout(self):
+        # Everything outstanding gets resent after an RTO, so any probe and reorder timer are moot
+        self.reorder_deadline = None
+        self.probe_seq = None
+        self.probe_retransmit = False
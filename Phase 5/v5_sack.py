@@ -0,0 +1,156 @@
+"""
+Benjamin Dearden
+Michael Smith
+Peter Dingue
+Kathy Doan
+v5_sack.py for Phase 5 EECE 4830 Project
+
+Selective acknowledgment support for the phase 5 client and server.
+
+The server keeps out-of-order segments and reports them with sack_blocks().
+The client records them in a SackScoreboard and follows the RFC 6675 rules
+loosely. A hole counts as lost once DUP_THRESH segments above it have been
+SACKed. Lost holes are retransmitted once each and before any new data.
+After a timeout only the holes are resent, never segments the server
+already holds.
+
+A segment that reaches the server twice is reported back in a D-SACK block
+(RFC 2883), which tells the client that resending it was unnecessary.
+
+"""
+from bisect import bisect_left, insort
+
+from v5_wire import MAX_SACK_BLOCKS
+
+DUP_THRESH = 3  # SACKed segments above a hole before it is considered lost (RFC 6675 DupThresh)
+
+
+def sack_blocks(received, latest, limit=MAX_SACK_BLOCKS):
+    """
+    Turn the out-of-order sequence numbers a receiver holds into half-open
+    (start, end) ranges. As in RFC 2018 the block holding the most recently
+    received segment goes first, followed by the lowest ones.
+    """
+    blocks = []
+    for seq in sorted(received):
+        if blocks and blocks[-1][1] == seq:
+            blocks[-1][1] = seq + 1
+        else:
+            blocks.append([seq, seq + 1])
+
+    ordered = []
+    for start, end in blocks:
+        if start <= latest < end:
+            ordered.insert(0, (start, end))
+        else:
+            ordered.append((start, end))
+    return ordered[:limit]
+
+
+def dsack_block(ack, blocks):
+    """
+    The D-SACK block leading an ACK's SACK blocks, or None. It is the first block
+    when that lies at or below the cumulative ack or inside the second block.
+    """
+    if not blocks:
+        return None
+    start, end = blocks[0]
+    if end <= ack + 1 or (len(blocks) > 1 and blocks[1][0] <= start and end <= blocks[1][1]):
+        return blocks[0]
+    return None
+
+
+class SackScoreboard:
+    """Sender side record of which in-flight segments the receiver has SACKed."""
+
+    def __init__(self):
+        self.sacked = set()
+        self.ranges = []  # the same segments as sorted, disjoint [start, end) runs
+        self.retransmitted = set()  # holes already resent in this recovery
+        # The DUP_THRESH highest SACKed segments in order, so the lowest of them bounds the lost
+        # holes, and a cursor below which lost_holes() has already looked at every hole
+        self.highest = []
+        self.next_hole = 0
+
+    def update(self, blocks, base, next_seq):
+        """
+        Add SACK blocks from an ACK, only segments inside [base, next_seq) are kept.
+        Returns the segments this ACK SACKed for the first time.
+        A receiver repeats its blocks in every ACK, so each block is merged with the
+        runs it overlaps and only the gaps between them are walked.
+        """
+        newly_sacked = []
+        ranges = self.ranges
+        for start, end in blocks:
+            start, end = max(start, base), min(end, next_seq)
+            if start >= end:
+                continue
+            first = bisect_left(ranges, [start])
+            if first and ranges[first - 1][1] >= start:
+                first -= 1  # the run before overlaps or touches the block
+            last = first
+            seq = merged_start = start
+            merged_end = end
+            while last < len(ranges) and ranges[last][0] <= end:
+                run_start, run_end = ranges[last]
+                newly_sacked += range(seq, run_start)
+                seq = max(seq, run_end)
+                merged_start = min(merged_start, run_start)
+                merged_end = max(merged_end, run_end)
+                last += 1
+            newly_sacked += range(seq, end)
+            ranges[first:last] = [[merged_start, merged_end]]
+
+        for seq in newly_sacked:
+            self.sacked.add(seq)
+            if len(self.highest) < DUP_THRESH or seq > self.highest[0]:
+                insort(self.highest, seq)
+                del self.highest[:-DUP_THRESH]
+        return newly_sacked
+
+    def advance(self, old_base, new_base):
+        """Forget everything below the new cumulative ACK point."""
+        for seq in range(old_base, new_base):
+            self.sacked.discard(seq)
+            self.retransmitted.discard(seq)
+        ranges = self.ranges
+        covered = 0
+        while covered < len(ranges) and ranges[covered][1] <= new_base:
+            covered += 1
+        del ranges[:covered]
+        if ranges and ranges[0][0] < new_base:
+            ranges[0][0] = new_base
+        # Whatever is still SACKed lies above the segments dropped here, so it is all in highest
+        if self.highest and self.highest[0] < new_base:
+            self.highest = [seq for seq in self.highest if seq >= new_base]
+
+    def is_sacked(self, seq):
+        return seq in self.sacked
+
+    def sacked_count(self):
+        """SACKed segments above the cumulative ACK point, advance() has already dropped the rest."""
+        return len(self.sacked)
+
+    def lost_holes(self, base, limit):
+        """
+        Unretransmitted holes in [base, limit) with at least DUP_THRESH SACKed
+        segments above them. They are marked as retransmitted as they are returned.
+        Those are the holes below the DUP_THRESH-th highest SACKed segment, and a
+        hole stays lost until it is ACKed or the timer fires, so each poll only
+        looks at segments no earlier poll reached.
+        """
+        if len(self.highest) < DUP_THRESH:
+            return []
+        lost = []
+        end = min(limit, self.highest[0])
+        for seq in range(max(base, self.next_hole), end):
+            if seq not in self.sacked and seq not in self.retransmitted:
+                self.retransmitted.add(seq)
+                lost.append(seq)
+        self.next_hole = max(self.next_hole, end)
+        return lost
+
+    def on_timeout(self):
+        # Every hole is fair game again once the retransmit timer has fired
+        self.retransmitted.clear()
+        self.next_hole = 0
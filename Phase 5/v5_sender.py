@@ -0,0 +1,553 @@
+"""
+Benjamin Dearden
+Michael Smith
+Peter Dingue
+Kathy Doan
+v5_sender.py for Phase 5 EECE 4830 Project
+
+Sender state machine shared by the blocking client (v5_client.send_file) and
+the asyncio client (v5_async). SenderCore does no I/O of its own: the caller
+hands it ACK datagrams and timer expiries and sends the (header, payload)
+segments it returns. Every time it keeps is a time.monotonic() reading; each
+entry point takes the caller's "now" so one clock read covers a whole event.
+The window, loss detection, RTT/RTO estimation and SACK recovery all live
+here, so both transports behave the same. The RTO follows RFC 6298: Karn's
+rule, exponential backoff up to max_rto and a min_rto floor. After a timeout
+only base is resent at once, the rest as the window opens again, and F-RTO
+(RFC 5682) or the server's D-SACK reports undo a timeout that was spurious.
+With timestamps=True every segment carries a TSval that the server echoes, so
+every ACK gives an RTT sample (RFC 7323), duplicates and ACKs for resent
+segments included, and Eifel detection (RFC 3522) undoes a timeout whose first
+ACK echoes the original transmission. A driver that reads kernel receive
+timestamps passes each ACK's arrival time, and RTT samples are then taken
+against it rather than against the time Python got round to the ACK. How
+cwnd reacts is up to the v5_congestion controller picked by
+congestion_protocol. With rack=True, RACK-TLP (v5_rack) finds losses by time
+on top of duplicate ACKs, and probes the tail.
+
+"""
+import time
+import random
+import logging
+from array import array
+from collections import namedtuple
+from v5_sack import SackScoreboard, dsack_block
+from v5_wire import FLAG_TIMESTAMP, TIMESTAMP, parse_ack, timestamp_value, timestamp_age, timestamp_before
+from v5_rack import RackTlp
+from v5_congestion import create_controller, DUPLICATE_ACK_THRESHOLD
+# Re-exported so the clients can keep importing the protocol numbers from here
+from v5_congestion import (PROTOCOL_SLOW_START_ONLY, PROTOCOL_AIMD_ONLY, PROTOCOL_TAHOE,
+                           PROTOCOL_RENO, PROTOCOL_CUBIC, PROTOCOL_BBR, PROTOCOL_VEGAS,
+                           PROTOCOL_NEWRENO, PROTOCOL_NEWRENO_PRR, PROTOCOL_NAMES)
+
+logger = logging.getLogger("Client")
+
+INIT_TIMEOUT = 0.5  # initial RTO in seconds
+MIN_RTO = 0.05  # RTO floor in seconds, loopback RTTs are around a millisecond
+MAX_RTO = 2.0  # cap on the backed off RTO, RFC 6298 allows 60 s but the harness sweeps up to 60% loss
+INIT_CWND = 1
+SS_THRESH = 16
+MAX_WINDOW_SIZE = 50  # default cap on segments in flight, cwnd never grows past it
+ALPHA = 0.125  # SRTT gain (RFC 6298)
+BETA = 0.25  # RTTVAR gain
+PACING_GAIN = 1.25  # paced senders send at this multiple of cwnd / SRTT
+PACING_BURST = 2  # segments a paced sender may send back to back after falling behind
+
+# Loss recovery counters for one transfer, returned by the clients next to the histories
+SenderStats = namedtuple("SenderStats", ["timeouts", "probes", "spurious_retransmissions", "spurious_timeouts"])
+
+
+class SenderCore:
+    """
+    One transfer's sender state. The driver loop is:
+
+        segments = core.poll_segments()          # window fill, send them
+        for each ACK datagram:
+            segments = core.on_ack_datagram(data)  # fast retransmit etc., send them
+        segments = core.check_timeout()          # RTO expiry, send them
+        ... until core.done
+
+    timer_deadline tells an event driven driver when check_timeout() is next due (the RTO,
+    or with RACK a reorder or probe timer), and
+    pacing_deadline when poll_segments() can release the next paced segment.
+    Every method takes an optional now (time.monotonic()), read once per event by the driver.
+    Simulated ACK errors (modes 2 and 4) are applied in on_ack_datagram().
+    """
+
+    def __init__(self, packet_source, congestion_protocol, wire_version, sack_enabled=False, simulation_mode=1,
+                 error_rate=0.0, initial_timeout=None, initial_cwnd=None, max_window=MAX_WINDOW_SIZE,
+                 pacing_gain=None, rack=False, min_rto=MIN_RTO, max_rto=MAX_RTO, handshake_rtt=None,
+                 timestamps=False):
+        self.packet_source = packet_source
+        self.congestion_protocol = congestion_protocol
+        self.wire_version = wire_version
+        self.sack_enabled = sack_enabled
+        self.timestamps = timestamps
+        self.data_flags = FLAG_TIMESTAMP if timestamps else 0
+        self.simulation_mode = simulation_mode
+        self.error_rate = error_rate
+
+        self.base = 0
+        self.next_seq = 0
+        self.max_window = max_window
+        self.cwnd = min(initial_cwnd if initial_cwnd else INIT_CWND, max_window)
+        self.ssthresh = SS_THRESH
+        self.timer = None
+
+        # Send times of the segments in flight, [base, next_seq), in a ring indexed by seq % capacity.
+        # At most max_window segments are in flight, so with capacity >= max_window no two of them
+        # share a slot and an ACK only has to move base. Payloads stay in packet_source.
+        capacity = 1
+        while capacity < max_window:
+            capacity *= 2
+        self.ring_mask = capacity - 1
+        self.send_times = array("d", [0.0]) * capacity
+        # Karn's rule: without timestamps an ACK for a segment sent more than once gives no RTT sample
+        self.retransmitted = array("b", [0]) * capacity
+
+        # Pacing spreads each window over one SRTT instead of sending it back to back.
+        # None sends bursts, as before. Until the first RTT sample there is nothing to pace by.
+        self.pacing_gain = pacing_gain
+        self.next_send_time = 0.0
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.rto = initial_timeout if initial_timeout else INIT_TIMEOUT
+        self.estimated_rtt = None
+        self.dev_rtt = 0
+        self.retransmissions = 0
+        self.timeouts = 0
+        self.probes = 0
+        self.spurious_retransmissions = 0  # resent segments the server reported as duplicates
+        self.spurious_timeouts = 0
+        self.file_end = False
+
+        # After an RTO, [resend_next, resend_end) still has to be resent as the window opens again
+        self.resend_next = 0
+        self.resend_end = 0
+        # RTO recovery lasts until everything sent before the first timeout is ACKed. undo holds
+        # cwnd and ssthresh from before it, put back if the timeout turns out to be spurious.
+        self.recovery_point = None
+        self.undo = None
+        self.undo_retrans = 0  # retransmissions since the timeout not yet reported as duplicates
+        self.frto = 0  # F-RTO step, 1 waits for the first ACK after the timeout, 2 for the second
+        self.timeout_tsval = None  # TSval of the first retransmission after the timeout, for Eifel
+
+        # With SACK negotiated, holes the server reports are resent ahead of new data
+        self.scoreboard = SackScoreboard()
+
+        # Only an ACK for base - 1 can be a duplicate worth counting, older ones are stale
+        self.duplicate_acks = 0
+
+        # Time based loss detection and tail loss probes, None counts duplicate ACKs only
+        self.rack = RackTlp() if rack else None
+
+        # Decides how cwnd and ssthresh move, may replace the initial ssthresh
+        self.controller = create_controller(congestion_protocol, self)
+
+        # History data for plotting
+        self.start_time = time.monotonic()
+        self.cwnd_history = [(0, self.cwnd)]
+        self.rtt_history = []
+        # With kernel arrival times, the same samples as Python alone would have measured them
+        self.python_rtt_history = []
+        self.receive_delay = None  # how long the current ACK waited between the kernel and on_ack_datagram()
+        self.rto_history = [(0, self.rto)]
+
+        # The SYN's round trip is the first RTT sample (RFC 6298 section 2.2), unless the caller
+        # asked for a particular initial_timeout
+        if handshake_rtt is not None and not initial_timeout:
+            self.update_rto(handshake_rtt, self.start_time)
+
+    def stats(self):
+        return SenderStats(self.timeouts, self.probes, self.spurious_retransmissions, self.spurious_timeouts)
+
+    @property
+    def done(self):
+        return self.file_end and self.base == self.next_seq
+
+    @property
+    def timer_deadline(self):
+        """Time at which check_timeout() will fire, or None when nothing is outstanding."""
+        deadline = self.timer + self.rto if self.timer is not None else None
+        if self.rack is not None:
+            for rack_deadline in (self.rack.reorder_deadline, self.rack.probe_deadline(self)):
+                if rack_deadline is not None and (deadline is None or rack_deadline < deadline):
+                    deadline = rack_deadline
+        return deadline
+
+    @property
+    def pacing_deadline(self):
+        """Time at which poll_segments() may release the next paced segment, None if it is not waiting on pacing."""
+        if self.pacing_interval() is None or self.file_end or self.next_seq >= self.base + self.window():
+            return None
+        return self.next_send_time
+
+    def pacing_interval(self):
+        """Seconds between paced segments, None when pacing is off or there is no RTT estimate yet."""
+        rate = self.controller.pacing_rate()
+        if rate is not None:
+            return 1 / rate  # model based controllers pace at their own estimate
+        if self.pacing_gain is None or self.estimated_rtt is None:
+            return None
+        return self.estimated_rtt / (self.window() * self.pacing_gain)
+
+    def segment(self, seq, now):
+        segment = self.packet_source.segment(seq, self.wire_version, self.data_flags)
+        if segment is None or not self.timestamps:
+            return segment
+        header, payload = segment
+        return header + TIMESTAMP.pack(timestamp_value(now)), payload
+
+    def in_flight(self, seq):
+        return self.base <= seq < self.next_seq
+
+    def window(self):
+        """Segments allowed in flight: cwnd, capped at max_window."""
+        return min(self.cwnd, self.max_window)
+
+    def retransmit(self, seq, now):
+        """Resend a segment that already went out once, returns it for the caller to send."""
+        self.scoreboard.retransmitted.add(seq)
+        self.send_times[seq & self.ring_mask] = now
+        self.retransmitted[seq & self.ring_mask] = 1
+        self.retransmissions += 1
+        if self.recovery_point is not None:
+            self.undo_retrans += 1
+        if self.rack is not None:
+            self.rack.on_send(seq, now)
+        self.controller.on_send(seq, now, True)
+        return self.segment(seq, now)
+
+    def send_new(self, count, now):
+        """Up to count new segments past the window (F-RTO and probes), as long as the send ring has room."""
+        out = []
+        while len(out) < count and not self.file_end and self.next_seq < self.base + self.max_window:
+            segment = self.segment(self.next_seq, now)
+            if segment is None:
+                self.file_end = True
+                break
+            out.append(segment)
+            self.send_times[self.next_seq & self.ring_mask] = now
+            self.retransmitted[self.next_seq & self.ring_mask] = 0
+            if self.rack is not None:
+                self.rack.on_send(self.next_seq, now)
+            self.controller.on_send(self.next_seq, now, False)
+            self.next_seq += 1
+        return out
+
+    def poll_segments(self, now=None):
+        """
+        Record cwnd, then return SACK holes to resend and new segments the window allows.
+        When pacing, new segments are only released once their send slot has come.
+        """
+        now = time.monotonic() if now is None else now
+        self.cwnd_history.append((now - self.start_time, self.cwnd))
+
+        # slot is the send time of the next segment, a sender that fell behind may catch up by PACING_BURST
+        interval = self.pacing_interval()
+        slot = now if interval is None else max(self.next_send_time, now - interval * (PACING_BURST - 1))
+
+        burst = []
+        if self.resend_next < self.resend_end and not self.frto:
+            # Going back after an RTO: resend what is still unacknowledged as far as the window reaches
+            self.resend_next = max(self.resend_next, self.base)
+            limit = min(self.resend_end, self.base + int(self.window()))
+            while self.resend_next < limit:
+                seq = self.resend_next
+                self.resend_next += 1
+                if not self.scoreboard.is_sacked(seq):
+                    burst.append(self.retransmit(seq, now))
+                    if interval is not None:
+                        slot += interval
+        if self.sack_enabled:
+            for seq in self.scoreboard.lost_holes(self.base, self.base + int(self.window())):
+                logger.debug(f"SACK: retransmitting hole {seq}")
+                burst.append(self.retransmit(seq, now))
+                if interval is not None:
+                    slot += interval
+        while self.next_seq < self.base + self.window() and not self.file_end and slot <= now:
+            segment = self.segment(self.next_seq, now)
+            if segment is None:
+                self.file_end = True
+                break
+            burst.append(segment)
+            self.send_times[self.next_seq & self.ring_mask] = now
+            self.retransmitted[self.next_seq & self.ring_mask] = 0
+            if self.base == self.next_seq:
+                self.timer = now
+            if self.rack is not None:
+                self.rack.probe_start = now
+                self.rack.on_send(self.next_seq, now)
+            self.controller.on_send(self.next_seq, now, False)
+            logger.debug(f"Sent packet {self.next_seq}")
+            self.next_seq += 1
+            if interval is not None:
+                slot += interval
+        if interval is not None:
+            self.next_send_time = slot
+        return burst
+
+    def on_ack_datagram(self, ack_data, now=None, arrival=None):
+        """
+        Process one ACK datagram, returns segments that must go out right away.
+        arrival is the kernel's receive time for it on the time.monotonic() clock, if known.
+        """
+        now = time.monotonic() if now is None else now
+        self.receive_delay = max(now - arrival, 0.0) if arrival is not None else None
+        frame = parse_ack(ack_data, self.wire_version)
+        ack, blocks, echo = frame if frame is not None else (None, (), None)
+
+        if self.simulation_mode == 2 and random.random() < self.error_rate:
+            logger.warning("Simulating ACK bit - error")
+            ack = random.randint(0, max(0, self.base - 1))
+            blocks = ()
+            echo = None
+
+        if self.simulation_mode == 4 and random.random() < self.error_rate:
+            logger.warning("Simulating ACK loss error (skipping this ACK)")
+            return []
+
+        if ack is None or ack < 0:
+            return []
+        if self.sack_enabled:
+            dsack = dsack_block(ack, blocks)
+            if dsack is not None:
+                self.on_dsack(*dsack)
+                blocks = blocks[1:]
+            newly_sacked = self.scoreboard.update(blocks, self.base, self.next_seq)
+            if self.rack is not None:
+                for seq in newly_sacked:
+                    self.rack_delivered(seq, now)
+        if ack < self.base:  # Any ACK that doesn't advance the window could be a duplicate
+            if echo is not None:
+                # Still a valid RTT sample, but only an ACK for new data may end an RTO backoff
+                self.rtt_sample(timestamp_age(echo, now), now, keep_backoff=self.recovery_point is not None)
+            return self.on_duplicate_ack(ack, now)
+        return self.on_new_ack(ack, now, echo)
+
+    def on_duplicate_ack(self, ack, now):
+        out = []
+        if ack != self.base - 1:
+            return out  # stale ACK from before the last advance
+        self.duplicate_acks += 1
+        if self.frto:
+            # F-RTO: a duplicate ACK after the timeout means it was genuine, go back as usual
+            self.frto = 0
+
+        # The most likely lost packet is the one right after the ACK, and there is only
+        # something to react to while it is still missing
+        lost_packet_seq = ack + 1
+        if self.in_flight(lost_packet_seq) and not self.scoreboard.is_sacked(lost_packet_seq):
+            # The controller adjusts cwnd for every duplicate, and says when to Fast Retransmit
+            if self.controller.on_dupack(self.duplicate_acks, now):
+                logger.debug(f"Triple duplicate ACK for {ack}, triggering Fast Retransmit")
+                out.append(self.retransmit(lost_packet_seq, now))
+
+                # Reset the timer after retransmission
+                self.timer = now
+
+        if self.rack is not None:
+            if not self.sack_enabled and self.in_flight(self.base + 1):
+                # Something above base arrived, take it to be the next segment not yet counted
+                self.rack_delivered(min(self.base + self.duplicate_acks, self.next_seq - 1), now)
+            out += self.rack_detect(now)
+        return out
+
+    def on_new_ack(self, ack, now, echo=None):
+        # Calculate how many new segments were acknowledged
+        newly_acked = ack - self.base + 1
+        self.duplicate_acks = 0
+
+        # Calculate RTT and update RTO. An echoed TSval times the very datagram this ACK answers.
+        # Without one, a segment the server had already SACKed was delivered long before this
+        # ACK covered it, and one that was resent may be ACKed for either copy (Karn's rule).
+        # Nor does an ACK that covers a resent segment below ack time ack itself: the server
+        # buffers what arrives after a hole, so the repair releases segments sent long before.
+        sample_rtt = None
+        if echo is not None:
+            sample_rtt = timestamp_age(echo, now)
+        elif self.in_flight(ack) and not self.scoreboard.is_sacked(ack) and not any(
+                self.retransmitted[seq & self.ring_mask] for seq in range(self.base, ack + 1)):
+            sample_rtt = now - self.send_times[ack & self.ring_mask]
+        if sample_rtt is not None:
+            sample_rtt = self.rtt_sample(sample_rtt, now)
+            logger.debug(f"ACK {ack} received. RTT={sample_rtt:.4f}s, RTO={self.rto:.4f}s")
+
+        out = []
+        if self.frto == 1 and echo is not None and timestamp_before(echo, self.timeout_tsval):
+            # Eifel: the first ACK after the timeout answers a copy sent before it, so the original got through
+            self.frto = 0
+            self.undo_timeout(now, "Eifel")
+        elif self.frto == 1:
+            # F-RTO: the first ACK after the timeout moved base. Unless it covers everything, send two
+            # new segments instead of going back; whether their ACKs move base decides the timeout.
+            self.frto = 0
+            if ack < self.recovery_point:
+                out = self.send_new(2, now)
+                self.frto = 2 if out else 0
+        elif self.frto == 2:
+            # The second ACK moved base as well, so the segments sent before the timeout were not lost
+            self.frto = 0
+            self.undo_timeout(now, "F-RTO")
+        if self.recovery_point is not None and ack >= self.recovery_point:
+            # End of RTO recovery. If the server reported every segment resent since as a duplicate,
+            # nothing had been lost.
+            if self.undo is not None and self.sack_enabled and self.undo_retrans <= 0:
+                self.undo_timeout(now, "D-SACK")
+            self.recovery_point = None
+            self.undo = None
+
+        if self.rack is not None:
+            for seq in range(self.base, min(ack + 1, self.next_seq)):
+                if not self.scoreboard.is_sacked(seq):  # SACKed ones were counted when they were SACKed
+                    self.rack_delivered(seq, now)
+            self.rack.probe_start = now
+            if self.rack.probe_seq is not None and ack >= self.rack.probe_seq:
+                if self.rack.probe_retransmit:
+                    # Without DSACK there is no telling whether the probe repaired a loss, so assume
+                    # it did and respond as to a fast retransmit (RFC 8985 section 7.4)
+                    logger.debug(f"Tail loss probe of {self.rack.probe_seq} ACKed, reducing cwnd")
+                    self.controller.on_dupack(DUPLICATE_ACK_THRESHOLD, now)
+                self.rack.probe_seq = None
+
+        # The scoreboard moves first, so the controller's SACKed count is of segments above this ACK
+        self.scoreboard.advance(self.base, ack + 1)
+        resend_base = self.controller.on_ack(ack, newly_acked, sample_rtt, now)
+
+        # Update base and manage the send window
+        self.base = ack + 1
+        # Reset timer if there are unacknowledged packets
+        self.timer = now if self.base != self.next_seq else None
+
+        # A partial ACK in NewReno recovery: the new base was lost as well
+        if resend_base and self.in_flight(self.base) and not self.scoreboard.is_sacked(self.base):
+            out.append(self.retransmit(self.base, now))
+        if self.rack is not None:
+            out += self.rack_detect(now)
+        return out
+
+    def rtt_sample(self, sample_rtt, now, keep_backoff=False):
+        """Record an RTT sample measured up to now and feed it to the RTO estimator, returns the sample used."""
+        if self.receive_delay is not None:
+            # Kernel timestamped ACK: the wait in the socket buffer and the interpreter is not network time
+            self.python_rtt_history.append((now - self.start_time, sample_rtt))
+            sample_rtt -= self.receive_delay
+        self.rtt_history.append((now - self.start_time, sample_rtt))
+        # With timestamps the server's ACK for every segment is a sample, rather than about one
+        # per RTT, so the gains are spread over a window's worth (RFC 7323 appendix G)
+        samples = max(self.next_seq - self.base, 1) if self.timestamps else 1
+        self.update_rto(sample_rtt, now, samples, keep_backoff)
+        return sample_rtt
+
+    def update_rto(self, sample_rtt, now, samples=1, keep_backoff=False):
+        # RFC 6298 section 2. RTTVAR goes first, it is measured against the SRTT from before this sample.
+        if self.estimated_rtt is None:
+            self.estimated_rtt = sample_rtt
+            self.dev_rtt = sample_rtt / 2
+        else:
+            alpha, beta = ALPHA / samples, BETA / samples
+            self.dev_rtt = (1 - beta) * self.dev_rtt + beta * abs(self.estimated_rtt - sample_rtt)
+            self.estimated_rtt = (1 - alpha) * self.estimated_rtt + alpha * sample_rtt
+        # Recomputing from a fresh sample also drops any backoff, unless the caller keeps it
+        rto = min(max(self.estimated_rtt + 4 * self.dev_rtt, self.min_rto), self.max_rto)
+        self.rto = max(rto, self.rto) if keep_backoff else rto
+        self.rto_history.append((now - self.start_time, self.rto))
+
+    def on_dsack(self, start, end):
+        # The server already had these segments, so resending them was unnecessary
+        logger.debug(f"D-SACK: segments {start} to {end - 1} were resent needlessly")
+        self.spurious_retransmissions += end - start
+        if self.recovery_point is not None:
+            self.undo_retrans -= end - start
+
+    def undo_timeout(self, now, reason):
+        """The last RTO was spurious: put cwnd and ssthresh back and stop going back."""
+        self.cwnd, self.ssthresh = self.undo
+        self.undo = None
+        self.spurious_timeouts += 1
+        self.resend_next = self.resend_end
+        if self.estimated_rtt is not None:
+            self.rto = min(max(self.estimated_rtt + 4 * self.dev_rtt, self.min_rto), self.max_rto)
+            self.rto_history.append((now - self.start_time, self.rto))
+        self.cwnd_history.append((now - self.start_time, self.cwnd))
+        logger.debug(f"{reason}: spurious timeout, restored cwnd={self.cwnd}, ssthresh={self.ssthresh}")
+
+    def rack_delivered(self, seq, now):
+        self.rack.delivered(seq, self.send_times[seq & self.ring_mask], self.retransmitted[seq & self.ring_mask], now)
+
+    def rack_detect(self, now):
+        """Retransmit whatever RACK now finds lost, the first loss of an episode counts as a triple duplicate."""
+        lost = self.rack.detect_loss(self, now)
+        if not lost:
+            return []
+        logger.debug(f"RACK: segments {lost} lost")
+        if self.duplicate_acks < DUPLICATE_ACK_THRESHOLD:
+            # Later duplicates then count on from the threshold, as in Fast Recovery
+            self.duplicate_acks = DUPLICATE_ACK_THRESHOLD
+            self.controller.on_dupack(DUPLICATE_ACK_THRESHOLD, now)
+        self.rack.probe_retransmit = False  # this episode already got its congestion response
+        self.timer = now
+        return [self.retransmit(seq, now) for seq in lost]
+
+    def send_probe(self, now):
+        """Tail Loss Probe: a new segment if the window has room for one, otherwise the last one again."""
+        new = self.send_new(1, now)
+        if new:
+            segment = new[0]
+            self.rack.probe_retransmit = False
+        else:
+            segment = self.retransmit(self.next_seq - 1, now)
+            self.rack.probe_retransmit = True
+        self.rack.probe_seq = self.next_seq - 1
+        self.probes += 1
+        logger.debug(f"Tail loss probe, highest segment sent {self.rack.probe_seq}")
+        self.timer = now  # the RTO counts from the probe
+        return segment
+
+    def check_rack_timers(self, now):
+        out = []
+        if self.rack.reorder_deadline is not None and now >= self.rack.reorder_deadline:
+            out += self.rack_detect(now)
+        if self.duplicate_acks < DUPLICATE_ACK_THRESHOLD:  # no probes during recovery
+            probe_deadline = self.rack.probe_deadline(self)
+            if probe_deadline is not None and now >= probe_deadline:
+                out.append(self.send_probe(now))
+        return out
+
+    def check_timeout(self, now=None):
+        """
+        If the RTO expired, apply the protocol's timeout reaction and return the segments to resend.
+        With RACK, a due reorder timer or tail loss probe is handled here as well.
+        """
+        now = time.monotonic() if now is None else now
+        if self.timer is None or now < self.timer + self.rto:
+            return self.check_rack_timers(now) if self.rack is not None else []
+        logger.warning(f"Timeout: retransmitting {self.base}, RTO {self.rto:.3f}s")
+        self.timeouts += 1
+        if self.recovery_point is None:
+            # First timeout of this recovery: remember the window for an undo, and try F-RTO
+            self.undo = (self.cwnd, self.ssthresh)
+            self.undo_retrans = 0
+            self.frto = 1
+            self.timeout_tsval = timestamp_value(now)
+        else:
+            self.frto = 0  # timed out again, F-RTO only judges the first one
+        self.recovery_point = self.next_seq - 1
+        self.controller.on_timeout(now)
+        if self.rack is not None:
+            self.rack.on_timeout()
+
+        # Back off (RFC 6298 section 5.5), until a new RTT sample brings it down again
+        self.rto = min(self.rto * 2, self.max_rto)
+        self.rto_history.append((now - self.start_time, self.rto))
+
+        # Record the window change due to timeout
+        self.cwnd_history.append((now - self.start_time, self.cwnd))
+
+        # Resend only the oldest unacknowledged segment now (section 5.4), poll_segments() goes back
+        # over the rest, skipping any the server has SACKed, as ACKs open the window again
+        self.scoreboard.on_timeout()
+        self.resend_next = self.base + 1
+        self.resend_end = self.next_seq
+        self.timer = now
+        return [self.retransmit(self.base, now)]
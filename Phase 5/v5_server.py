@@ -8,13 +8,29 @@ v5_server.py for Phase 5 EECE 4830 Project
 This server file simulates a simplified TCP receiver for phase 5. Simulated error is
 present in this file for use with the harness script to run simulation tests.
 
+run_server() handles a single client. run_multi_server() runs many transfers at
+once from one selectors loop, each client getting its own Connection keyed by
+(address, connection id). ShardedServer forks several run_multi_server workers
+that share the port through SO_REUSEPORT, so the kernel spreads the clients
+across cores.
+
 """
 import socket
 import os
 import time
 import random
 import logging
-from v5_helpers import checksum, flip_bit
+import selectors
+import multiprocessing
+from queue import Empty
+from itertools import repeat
+from collections import namedtuple
+from v5_helpers import checksum, flip_bit, SegmentSink
+from v5_io import BatchSender, BatchReceiver, GROReceiver, TimestampReceiver
+from v5_sack import sack_blocks
+from v5_wire import (SUPPORTED_VERSIONS, SUPPORTED_FLAGS, FLAG_SACK, FLAG_TIMESTAMP, FRAME_DATA, FRAME_SYN,
+                     FRAME_SYN_ACK, FRAME_ACK, FRAME_FIN, FRAME_FIN_ACK, encode_control, encode_ack, parse_handshake,
+                     parse_frame, frame_timestamp, timestamp_age)
 
 random.seed(123)
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s [SERVER] %(message)s', handlers=[logging.FileHandler("tcp_simulation.log")])
@@ -22,91 +38,433 @@ logger = logging.getLogger("Server")
 
 SERVER_PORT = 12000
 BUFFER_SIZE = 2048
+PACKET_SIZE = 1024  # segment size, must match the client's PACKET_SIZE so seq * PACKET_SIZE is the file offset
 OUTPUT_FOLDER = "cat"
+REORDER_WINDOW = 65536  # out-of-order segments accepted beyond expected_seq, covers the largest client max_window
+IDLE_TIMEOUT = 30.0  # seconds without a datagram before a multi-server connection is evicted
+IDLE_CHECK_INTERVAL = 1.0  # how often the multi-server looks for idle connections
+MULTI_RCVBUF = 4 * 1024 * 1024  # socket receive buffer shared by every multi-server client
+WORKER_START_TIMEOUT = 10.0  # seconds to wait for the sharded workers to bind
+
+# Outcome of one transfer, worker is the shard that served it. one_way_delays holds
+# (seconds into the transfer, client to server delay) samples, taken with kernel timestamps only.
+TransferStats = namedtuple("TransferStats", ["addr", "connection_id", "output_file", "bytes", "duration", "completed",
+                                             "worker", "one_way_delays"], defaults=(0, ()))
+
+
+class Connection:
+    """
+    Receiver state for one transfer: negotiated wire version and options, the
+    next expected segment, the out-of-order set and the output sink.
+    run_server drives a single Connection, run_multi_server one per client.
+    """
+
+    def __init__(self, addr, connection_id, wire_version, options, output_file):
+        self.addr = addr
+        self.connection_id = connection_id
+        self.wire_version = wire_version
+        self.options = options
+        self.sack_enabled = bool(options & FLAG_SACK)
+        self.timestamps = bool(options & FLAG_TIMESTAMP)
+        self.echo = None  # TSval of the last accepted datagram, echoed in every ACK (TS.Recent)
+        self.one_way_delays = []
+        self.output_file = output_file
+        # Segments are streamed to their file offset as they arrive, so memory stays bounded by the
+        # sink's write queue and the set of out-of-order sequence numbers, not by the file size
+        self.sink = SegmentSink(output_file, PACKET_SIZE)
+        self.expected_seq = 0
+        self.out_of_order = set()  # seqs already written above the gap at expected_seq
+        self.last_valid_ack = -1
+        self.start_time = time.time()
+        self.last_active = self.start_time
+
+    def current_ack(self, latest_seq=-1, duplicate=False):
+        # Cumulative ACK, plus the out-of-order ranges when SACK was negotiated. A segment
+        # that had already arrived goes first as a D-SACK block, so the client can tell
+        if self.sack_enabled and (self.out_of_order or duplicate):
+            blocks = sack_blocks(self.out_of_order, latest_seq)
+            if duplicate:
+                blocks.insert(0, (latest_seq, latest_seq + 1))
+            return encode_ack(self.wire_version, self.last_valid_ack, blocks, self.echo)
+        return encode_ack(self.wire_version, self.last_valid_ack, timestamp=self.echo)
+
+    def on_datagram(self, data, simulation_mode, error_rate, arrival=None):
+        """
+        Handle one datagram received after the handshake. Returns (ack, finished):
+        the ACK owed to the client (None if nothing is owed) and True once FIN arrives.
+        arrival is the kernel's receive time for it on the time.monotonic() clock, if known.
+        """
+        frame = parse_frame(data, self.wire_version)
+        if frame is None:
+            return self.current_ack(), False
+
+        frame_type, seq, chksum, payload = frame
+        if frame_type == FRAME_FIN:
+            return None, True
+        elif frame_type != FRAME_DATA:
+            return None, False
+
+        if simulation_mode == 5 and random.random() < error_rate:
+            logger.debug(f"Simulating loss for packet {seq}")
+            return self.current_ack(), False
+
+        if simulation_mode == 3 and random.random() < error_rate:
+            payload = flip_bit(payload)
+
+        if checksum(payload) != chksum:
+            logger.debug(f"Checksum mismatch for {seq}")
+            return self.current_ack(), False
+
+        # The ACK echoes the TSval of the segment it answers, whichever copy that was. A lost or
+        # corrupted one is not accepted (RFC 7323), so its ACK keeps the echo from before.
+        echo = frame_timestamp(data) if self.timestamps else None
+        if echo is not None:
+            self.echo = echo
+            if arrival is not None:
+                # The TSval is the client's monotonic clock, the same clock as ours on one host
+                self.one_way_delays.append((time.time() - self.start_time, timestamp_age(echo, arrival)))
+
+        if seq == self.expected_seq:
+            self.sink.write(seq, payload)
+            self.last_valid_ack = seq
+            self.expected_seq += 1
+            # Segments already written above the gap may now be in order
+            while self.expected_seq in self.out_of_order:
+                self.out_of_order.remove(self.expected_seq)
+                self.last_valid_ack = self.expected_seq
+                self.expected_seq += 1
+        elif self.expected_seq < seq < self.expected_seq + REORDER_WINDOW and seq not in self.out_of_order:
+            self.sink.write(seq, payload)
+            self.out_of_order.add(seq)
+        elif seq < self.expected_seq or seq in self.out_of_order:
+            return self.current_ack(seq, duplicate=True), False
+        return self.current_ack(seq), False
+
+    def close(self, completed=True):
+        """Flush the output file and return the TransferStats for this connection."""
+        self.sink.close()
+        return TransferStats(self.addr, self.connection_id, self.output_file, self.sink.length,
+                             time.time() - self.start_time, completed, one_way_delays=self.one_way_delays)
+
 
-# TCP flags
-SYN = "SYN"
-SYN_ACK = "SYN-ACK"
-ACK = "ACK"
-FIN = "FIN"
+class ConnectionTable:
+    """
+    The live Connections of a multi-client server, keyed by (address, connection id).
+    dispatch() routes one datagram: a SYN with a new id opens a Connection (replacing
+    any older one from the same address), a repeated SYN is answered again and
+    anything else goes to the address's live Connection. Ended connections are
+    closed and their TransferStats appended to results.
+    Shared by run_multi_server and the asyncio server in v5_async.
+    """
+
+    def __init__(self, simulation_mode, error_rate, on_transfer=None):
+        self.simulation_mode = simulation_mode
+        self.error_rate = error_rate
+        self.on_transfer = on_transfer
+        self.connections = {}  # (addr, connection_id) -> Connection
+        self.by_address = {}  # addr -> key of the live connection from that address
+        self.results = []
+
+    def end_connection(self, key, completed):
+        connection = self.connections.pop(key)
+        if self.by_address.get(connection.addr) == key:
+            del self.by_address[connection.addr]
+        stats = connection.close(completed)
+        self.results.append(stats)
+        if self.on_transfer is not None:
+            self.on_transfer(stats)
+        logger.debug(f"{'Finished' if completed else 'Evicted'} {connection.addr} id {connection.connection_id:#x}: "
+                     f"{stats.bytes} bytes in {stats.duration:.2f}s")
+
+    def dispatch(self, data, addr, now, reply):
+        """Handle one datagram from addr, sending any answer through reply(message, addr)."""
+        handshake = parse_handshake(data)
+        if handshake is not None and handshake.frame_type == FRAME_SYN:
+            key = (addr, handshake.connection_id)
+            connection = self.connections.get(key)
+            if connection is None:
+                if addr in self.by_address:
+                    self.end_connection(self.by_address[addr], completed=False)
+                wire_version = max(v for v in SUPPORTED_VERSIONS if v <= handshake.version)
+                suffix = f"_{addr[0]}_{addr[1]}_{handshake.connection_id:08x}"
+                connection = Connection(addr, handshake.connection_id, wire_version,
+                                        handshake.flags & SUPPORTED_FLAGS,
+                                        output_path(self.simulation_mode, self.error_rate, suffix))
+                self.connections[key] = connection
+                self.by_address[addr] = key
+            connection.last_active = now
+            reply(encode_control(connection.wire_version, FRAME_SYN_ACK, connection.options,
+                                 connection.connection_id), addr)
+            return
+
+        key = self.by_address.get(addr)
+        if key is None:
+            return  # no handshake from this address, or it already finished
+        connection = self.connections[key]
+        connection.last_active = now
+        if handshake is not None:
+            return  # handshake ACK, nothing to answer
+
+        try:
+            ack, finished = connection.on_datagram(data, self.simulation_mode, self.error_rate)
+        except Exception as e:
+            logger.debug(f"Server error on {addr}: {e}")
+            self.end_connection(key, completed=False)
+            return
+        if ack is not None:
+            reply(ack, addr)
+        if finished:
+            reply(encode_control(connection.wire_version, FRAME_FIN_ACK), addr)
+            self.end_connection(key, completed=True)
+
+    def sweep(self, now, idle_timeout):
+        """Evict connections idle for more than idle_timeout seconds."""
+        for key in [key for key, c in self.connections.items() if now - c.last_active > idle_timeout]:
+            self.end_connection(key, completed=False)
+
+    def close_all(self):
+        for key in list(self.connections):
+            self.end_connection(key, completed=False)
+
+
+def output_path(simulation_mode, error_rate, suffix=""):
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    return os.path.join(OUTPUT_FOLDER, f"tcp_output_mode{simulation_mode}_error{int(error_rate * 100)}{suffix}.bmp")
 
 def tcp_handshake(sock):
+    # Returns the client address plus the wire version and option flags agreed on in the SYN/SYN-ACK exchange
     logger.debug("Waiting for client handshake")
+    wire_version = None
+    options = 0
     while True:
         data, addr = sock.recvfrom(BUFFER_SIZE)
-        msg = data.decode(errors='ignore')
-        if msg == SYN:
-            sock.sendto(SYN_ACK.encode(), addr)
-        elif msg == ACK:
-            logger.debug("Handshake complete")
-            return addr
-
-def tcp_teardown(sock, addr):
+        message = parse_handshake(data)
+        if message is None:
+            continue
+        if message.frame_type == FRAME_SYN:
+            wire_version = max(v for v in SUPPORTED_VERSIONS if v <= message.version)
+            options = message.flags & SUPPORTED_FLAGS
+            sock.sendto(encode_control(wire_version, FRAME_SYN_ACK, options, message.connection_id), addr)
+        elif message.frame_type == FRAME_ACK and wire_version is not None:
+            logger.debug(f"Handshake complete, using wire version {wire_version}, options {options:#x}")
+            return addr, wire_version, options
+
+def tcp_teardown(sock, wire_version):
     try:
-        sock.sendto(ACK.encode(), addr)
+        sock.send(encode_control(wire_version, FRAME_FIN_ACK))
         logger.debug("Connection teardown acknowledged")
     except Exception as e:
         logger.debug(f"Teardown error: {e}")
 
-def run_server(simulation_mode, error_rate):
+def run_server(simulation_mode, error_rate, batch_io=True, offload=False, kernel_timestamps=False, on_transfer=None):
+    # kernel_timestamps reads the kernel's receive time of every segment (Linux) to measure the one-way delay,
+    # on_transfer(stats) gets the connection's TransferStats once it ends
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind(("", SERVER_PORT))
-    addr = tcp_handshake(sock)
+    addr, wire_version, options = tcp_handshake(sock)
+    # Single peer from here on, so connect and stop passing its address on every call
+    sock.connect(addr)
 
-    expected_seq = 0
-    file_data = bytearray()
-    last_valid_ack = -1
-    start_time = time.time()
+    # Queued datagrams are drained with one recvmmsg and their ACKs sent with one sendmmsg (Linux).
+    # With offload, UDP GRO reads are split back into frames before checksum/sequence processing.
+    # With kernel_timestamps (and no offload) each segment gets its own recvmsg, carrying its receive time.
+    receiver = GROReceiver(sock) if offload else None
+    if receiver is None and kernel_timestamps:
+        receiver = TimestampReceiver(sock, slot_size=BUFFER_SIZE)
+    kernel_arrivals = isinstance(receiver, TimestampReceiver) and receiver.enabled
+    if receiver is None or not receiver.enabled:
+        receiver = BatchReceiver(sock, slot_size=BUFFER_SIZE, enabled=batch_io, addresses=False)
+    sender = BatchSender(sock, enabled=batch_io)
+    connection = Connection(addr, 0, wire_version, options, output_path(simulation_mode, error_rate))
+    finished = False
 
-    while True:
+    while not finished:
         try:
-            data, _ = sock.recvfrom(BUFFER_SIZE)
-            msg = data.decode(errors='ignore')
+            acks = []
+            # data is a memoryview into the receive ring, payloads are only copied into the sink's queue
+            batch = receiver.recv_batch()
+            arrivals = receiver.arrivals if kernel_arrivals else repeat(None)
+            for (data, _), arrival in zip(batch, arrivals):
+                ack, finished = connection.on_datagram(data, simulation_mode, error_rate, arrival)
+                if finished:
+                    break
+                if ack is not None:
+                    acks.append(ack)
+            sender.send_batch([(ack,) for ack in acks])
+        except Exception as e:
+            logger.debug(f"Server error: {e}")
+            break
+    if finished:
+        tcp_teardown(sock, wire_version)
 
-            if msg in [SYN, ACK]:
-                continue
-            elif msg == FIN:
-                tcp_teardown(sock, addr)
-                break
+    stats = connection.close()
+    sock.close()
+    logger.debug(f"Saved file {stats.output_file} in {stats.duration:.2f} seconds")
+    if on_transfer is not None:
+        on_transfer(stats)
+    return stats.duration
 
-            parts = data.split(b"|", 2)
-            if len(parts) < 3:
-                sock.sendto(str(last_valid_ack).encode(), addr)
-                continue
-            seq = int(parts[0])
-            chksum = int(parts[1])
-            payload = parts[2]
+def run_multi_server(simulation_mode, error_rate, max_transfers=None, idle_timeout=IDLE_TIMEOUT, batch_io=True,
+                     reuse_port=False, stop_event=None, on_ready=None, on_transfer=None):
+    """
+    Serve any number of clients at once from one selectors loop on SERVER_PORT.
+    Each SYN opens a Connection keyed by (address, connection id); a SYN with a new
+    id from a known address replaces the old connection, a repeated one is answered
+    again. Connections idle for idle_timeout seconds are evicted.
+    Returns the list of TransferStats once max_transfers connections have ended
+    (None serves forever) or stop_event is set.
 
-            if simulation_mode == 5 and random.random() < error_rate:
-                logger.debug(f"Simulating loss for packet {seq}")
-                sock.sendto(str(last_valid_ack).encode(), addr)
-                continue
+    reuse_port binds with SO_REUSEPORT so several processes can share the port.
+    on_ready() is called once the socket is bound and on_transfer(stats) each
+    time a connection ends.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MULTI_RCVBUF)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("", SERVER_PORT))
+    if on_ready is not None:
+        on_ready()
+    sock.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ)
+    # Addresses are needed to demultiplex, so the receiver decodes them for every datagram
+    receiver = BatchReceiver(sock, slot_size=BUFFER_SIZE, enabled=batch_io)
 
-            if simulation_mode == 3 and random.random() < error_rate:
-                payload = flip_bit(payload)
+    table = ConnectionTable(simulation_mode, error_rate, on_transfer)
+    last_sweep = time.time()
+    logger.debug(f"Multi-client server listening on port {SERVER_PORT}")
 
-            if checksum(payload) == chksum:
-                if seq == expected_seq:
-                    file_data.extend(payload)
-                    last_valid_ack = seq
-                    expected_seq += 1
-                sock.sendto(str(last_valid_ack).encode(), addr)
-            else:
-                logger.debug(f"Checksum mismatch for {seq}")
-                sock.sendto(str(last_valid_ack).encode(), addr)
-        except Exception as e:
-            logger.debug(f"Server error: {e}")
+    def reply(message, addr):
+        try:
+            sock.sendto(message, addr)
+        except BlockingIOError:
+            pass  # send buffer full, the client recovers as if the reply was lost
+
+    while max_transfers is None or len(table.results) < max_transfers:
+        if stop_event is not None and stop_event.is_set():
             break
+        ready = selector.select(IDLE_CHECK_INTERVAL)
+        now = time.time()
+        if ready:
+            try:
+                batch = receiver.recv_batch()
+            except (BlockingIOError, InterruptedError, socket.timeout):
+                batch = []
+            for data, addr in batch:
+                table.dispatch(data, addr, now, reply)
 
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    output_file = os.path.join(OUTPUT_FOLDER, f"tcp_output_mode{simulation_mode}_error{int(error_rate * 100)}.bmp")
-    with open(output_file, "wb") as f:
-        f.write(file_data)
+        if now - last_sweep >= IDLE_CHECK_INTERVAL:
+            last_sweep = now
+            table.sweep(now, idle_timeout)
 
+    table.close_all()
+    selector.close()
     sock.close()
-    duration = time.time() - start_time
-    logger.debug(f"Saved file {output_file} in {duration:.2f} seconds")
-    return duration
+    return table.results
+
+
+def _shard_worker(index, simulation_mode, error_rate, idle_timeout, events, stop_event):
+    # Runs in a child process: one run_multi_server sharing the port, reporting back through events
+    run_multi_server(simulation_mode, error_rate, idle_timeout=idle_timeout, reuse_port=True, stop_event=stop_event,
+                     on_ready=lambda: events.put(("ready", index)),
+                     on_transfer=lambda stats: events.put(("done", stats._replace(worker=index))))
+
+class ShardedServer:
+    """
+    Launcher for several run_multi_server worker processes bound to SERVER_PORT
+    with SO_REUSEPORT. The kernel hashes each client's flow to one worker, which
+    owns that connection completely. Workers send their TransferStats back to
+    the parent over a queue, collect() gathers them.
+
+        server = ShardedServer(1, 0.0, workers=4)
+        server.start()
+        results = server.collect(max_transfers=100)
+        server.stop()
+    """
+
+    def __init__(self, simulation_mode, error_rate, workers=None, idle_timeout=IDLE_TIMEOUT):
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise OSError("SO_REUSEPORT is not available on this platform")
+        self.simulation_mode = simulation_mode
+        self.error_rate = error_rate
+        self.workers = workers or os.cpu_count() or 1
+        self.idle_timeout = idle_timeout
+        self.results = []
+        self.processes = []
+        self._context = multiprocessing.get_context()
+        self._events = self._context.Queue()
+        self._stop_event = self._context.Event()
+
+    def start(self):
+        """Fork the workers and wait until every one of them has bound the port."""
+        for index in range(self.workers):
+            process = self._context.Process(target=_shard_worker, name=f"v5-shard-{index}", daemon=True,
+                                            args=(index, self.simulation_mode, self.error_rate, self.idle_timeout,
+                                                  self._events, self._stop_event))
+            process.start()
+            self.processes.append(process)
+        ready = 0
+        while ready < self.workers:
+            kind, value = self._events.get(timeout=WORKER_START_TIMEOUT)
+            if kind == "ready":
+                ready += 1
+            else:
+                self.results.append(value)
+        logger.debug(f"Sharded server running {self.workers} workers on port {SERVER_PORT}")
+
+    def collect(self, max_transfers, timeout=None):
+        """Wait until max_transfers connections have ended, or timeout seconds pass. Returns all stats so far."""
+        deadline = None if timeout is None else time.time() + timeout
+        while len(self.results) < max_transfers:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                kind, value = self._events.get(timeout=remaining)
+            except Empty:
+                break
+            if kind == "done":
+                self.results.append(value)
+        return self.results
+
+    def stop(self):
+        """Ask the workers to finish, they close their remaining connections and exit."""
+        self._stop_event.set()
+        # Keep draining while they exit: a child blocks on exit until its queued stats are read.
+        # Connections that were still open are reported as the workers shut down.
+        deadline = time.time() + IDLE_CHECK_INTERVAL + 5
+        while any(process.is_alive() for process in self.processes) and time.time() < deadline:
+            try:
+                kind, value = self._events.get(timeout=0.1)
+            except Empty:
+                continue
+            if kind == "done":
+                self.results.append(value)
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        while True:
+            try:
+                kind, value = self._events.get(timeout=0.1)
+            except Empty:
+                break
+            if kind == "done":
+                self.results.append(value)
+        per_worker = [sum(1 for stats in self.results if stats.worker == index) for index in range(self.workers)]
+        logger.debug(f"Sharded server stopped, transfers per worker: {per_worker}")
+        return self.results
+
+def run_sharded_server(simulation_mode, error_rate, workers=None, max_transfers=None, idle_timeout=IDLE_TIMEOUT):
+    """Blocking helper: run a ShardedServer until max_transfers connections have ended."""
+    server = ShardedServer(simulation_mode, error_rate, workers, idle_timeout)
+    server.start()
+    try:
+        server.collect(max_transfers if max_transfers is not None else float("inf"))
+    finally:
+        results = server.stop()
+    return results
 
 if __name__ == "__main__":
     run_server(1, 0.0)
@@ -0,0 +1,222 @@
+"""
+Benjamin Dearden
+Michael Smith
+Peter Dingue
+Kathy Doan
+v5_wire.py for Phase 5 EECE 4830 Project
+
+Wire formats shared by the phase 5 client and server.
+
+WIRE_V1 is the ASCII format used since phase 2: data packets are
+"seq|chksum|" + payload, ACKs are str(last_acked_seq) and the control
+messages are the strings SYN, SYN-ACK, ACK, FIN and END.
+
+WIRE_V2 is a fixed-width binary frame. Every frame starts with HEADER:
+
+    version  (1 byte)   wire version, 2
+    type     (1 byte)   FRAME_* below
+    flags    (1 byte)   option bits
+    reserved (1 byte)   zero
+    seq      (4 bytes)  sequence number (cumulative ACK number for FRAME_ACK,
+                        connection id for FRAME_SYN and FRAME_SYN_ACK)
+    checksum (2 bytes)  Internet checksum of the payload
+    length   (2 bytes)  payload length in bytes
+
+all in network byte order. Both ends parse it with struct.unpack_from and
+never decode the payload.
+
+The version is negotiated during the handshake. A V1 client sends the ASCII
+SYN and gets the ASCII SYN-ACK back. A V2 client sends a binary FRAME_SYN
+carrying the highest version it speaks, and the server answers with a
+FRAME_SYN_ACK carrying the version both ends will use. The SYN also carries a
+random connection id in its seq field, echoed in the SYN-ACK, so a server
+handling many clients can tell a new connection from a retransmitted SYN
+and from a stale one on the same address. V1 connections always use id 0.
+
+Options are negotiated the same way: the client sets the FLAG_* bits it wants
+in the SYN and the server echoes the ones it accepts in the SYN-ACK. With
+FLAG_SACK agreed, an ACK frame may set FLAG_SACK and carry up to
+MAX_SACK_BLOCKS (start, end) pairs of 32-bit sequence numbers as its payload.
+Each pair is a half-open range of segments the receiver holds above the
+cumulative ACK. When the ACK answers a segment the receiver already had, the
+first pair is a D-SACK block (RFC 2883) naming that duplicate: it lies at or
+below the cumulative ACK, or inside the pair after it.
+
+With FLAG_TIMESTAMP agreed, every data frame sets FLAG_TIMESTAMP and carries
+a 32-bit TSval right after HEADER, ahead of the payload: the sender's clock
+in microseconds, modulo 2**32, when that copy of the segment went out. Every
+ACK the receiver sends back echoes the TSval of the last segment it accepted
+(normally the one it answers) in the same place, ahead of any SACK blocks,
+so the sender gets one RTT sample per ACK even for retransmitted segments
+(RFC 7323). The timestamp is not counted in the length field and not covered
+by the checksum.
+
+"""
+import struct
+from collections import namedtuple
+
+WIRE_V1 = 1
+WIRE_V2 = 2
+SUPPORTED_VERSIONS = (WIRE_V1, WIRE_V2)
+DEFAULT_WIRE_VERSION = WIRE_V2
+
+# Frame types
+FRAME_DATA = 1
+FRAME_ACK = 2
+FRAME_SYN = 3
+FRAME_SYN_ACK = 4
+FRAME_FIN = 5
+FRAME_FIN_ACK = 6
+FRAME_END = 7
+
+# Option flags
+FLAG_SACK = 0x01  # SYN/SYN-ACK: selective ACKs permitted, ACK: payload carries SACK blocks
+FLAG_TIMESTAMP = 0x02  # SYN/SYN-ACK: timestamps permitted, DATA/ACK: TSval or echoed TSval follows the header
+SUPPORTED_FLAGS = FLAG_SACK | FLAG_TIMESTAMP
+
+HEADER = struct.Struct("!BBBxIHH")
+HEADER_SIZE = HEADER.size
+SACK_BLOCK = struct.Struct("!II")
+MAX_SACK_BLOCKS = 4
+TIMESTAMP = struct.Struct("!I")
+TIMESTAMP_SIZE = TIMESTAMP.size
+TIMESTAMP_HZ = 1000000  # TSval ticks per second
+TIMESTAMP_MASK = 0xFFFFFFFF
+
+# Parsed ACK frame: cumulative ack (last in-order seq), a tuple of (start, end) SACK blocks
+# and the echoed TSval (None without FLAG_TIMESTAMP)
+Ack = namedtuple("Ack", ["ack", "sack_blocks", "timestamp"], defaults=(None,))
+# Parsed handshake message
+Handshake = namedtuple("Handshake", ["frame_type", "version", "flags", "connection_id"])
+
+# V1 control messages. After the handshake the only bare "ACK" a V1 peer
+# sends is the reply to FIN, so it parses as FRAME_FIN_ACK.
+V1_CONTROL = {
+    FRAME_SYN: b"SYN",
+    FRAME_SYN_ACK: b"SYN-ACK",
+    FRAME_ACK: b"ACK",
+    FRAME_FIN: b"FIN",
+    FRAME_FIN_ACK: b"ACK",
+    FRAME_END: b"END",
+}
+V1_CONTROL_FRAMES = {
+    b"SYN": FRAME_SYN,
+    b"ACK": FRAME_FIN_ACK,
+    b"FIN": FRAME_FIN,
+    b"END": FRAME_END,
+}
+V1_HANDSHAKE_FRAMES = {
+    b"SYN": FRAME_SYN,
+    b"SYN-ACK": FRAME_SYN_ACK,
+    b"ACK": FRAME_ACK,
+}
+
+
+def timestamp_value(now):
+    """TSval for a time.monotonic() reading."""
+    return int(now * TIMESTAMP_HZ) & TIMESTAMP_MASK
+
+
+def timestamp_age(echo, now):
+    """Seconds from the TSval echo to now, correct across the 32-bit wrap."""
+    return ((timestamp_value(now) - echo) & TIMESTAMP_MASK) / TIMESTAMP_HZ
+
+
+def timestamp_before(a, b):
+    """True if TSval a was taken before TSval b (serial number arithmetic)."""
+    return 0 < ((b - a) & TIMESTAMP_MASK) < 0x80000000
+
+
+def encode_data_header(version, seq, chksum, length, flags=0):
+    """
+    Header that goes in front of a data payload. With FLAG_TIMESTAMP in flags the
+    sender appends the TSval to it each time the segment goes out.
+    """
+    if version == WIRE_V1:
+        return f"{seq}|{chksum}|".encode()
+    return HEADER.pack(WIRE_V2, FRAME_DATA, flags, seq, chksum, length)
+
+
+def encode_control(version, frame_type, flags=0, connection_id=0):
+    """SYN, SYN-ACK, ACK (handshake), FIN, FIN-ACK or END for the given version."""
+    if version == WIRE_V1:
+        return V1_CONTROL[frame_type]
+    return HEADER.pack(version, frame_type, flags, connection_id, 0, 0)
+
+
+def encode_ack(version, ack, sack_blocks=(), timestamp=None):
+    """
+    Cumulative ACK for the last in-order sequence number (-1 before the first
+    segment), optionally followed by SACK blocks and an echoed TSval (V2 only).
+    """
+    if version == WIRE_V1:
+        return str(ack).encode()
+    # The wire carries the next expected sequence number so -1 fits in an unsigned field
+    flags = 0 if timestamp is None else FLAG_TIMESTAMP
+    echo = b"" if timestamp is None else TIMESTAMP.pack(timestamp)
+    if not sack_blocks:
+        return HEADER.pack(WIRE_V2, FRAME_ACK, flags, ack + 1, 0, 0) + echo
+    blocks = sack_blocks[:MAX_SACK_BLOCKS]
+    return (HEADER.pack(WIRE_V2, FRAME_ACK, flags | FLAG_SACK, ack + 1, 0, len(blocks) * SACK_BLOCK.size) + echo
+            + b"".join(SACK_BLOCK.pack(start, end) for start, end in blocks))
+
+
+def parse_handshake(data):
+    """Return a Handshake for a handshake message, or None if it is not one."""
+    if len(data) in (3, 7):
+        frame_type = V1_HANDSHAKE_FRAMES.get(bytes(data))
+        return Handshake(frame_type, WIRE_V1, 0, 0) if frame_type is not None else None
+    if len(data) < HEADER_SIZE:
+        return None
+    version, frame_type, flags, connection_id, _, _ = HEADER.unpack_from(data)
+    if version < WIRE_V2 or frame_type not in (FRAME_SYN, FRAME_SYN_ACK, FRAME_ACK):
+        return None
+    return Handshake(frame_type, version, flags, connection_id)
+
+
+def parse_frame(data, version):
+    """
+    Parse a datagram received after the handshake.
+    Returns (frame_type, seq, chksum, payload) or None if the datagram is malformed.
+    """
+    if version == WIRE_V1:
+        if len(data) == 3 and bytes(data) in V1_CONTROL_FRAMES:
+            return V1_CONTROL_FRAMES[bytes(data)], 0, 0, b""
+        parts = bytes(data).split(b"|", 2)
+        if len(parts) < 3 or not parts[0].isdigit() or not parts[1].isdigit():
+            return None
+        return FRAME_DATA, int(parts[0]), int(parts[1]), parts[2]
+
+    if len(data) < HEADER_SIZE:
+        return None
+    frame_version, frame_type, flags, seq, chksum, length = HEADER.unpack_from(data)
+    offset = HEADER_SIZE + TIMESTAMP_SIZE if flags & FLAG_TIMESTAMP else HEADER_SIZE
+    if frame_version != version or len(data) < offset + length:
+        return None
+    return frame_type, seq, chksum, data[offset:offset + length]
+
+
+def frame_timestamp(data):
+    """TSval carried by a V2 data frame, or None if it has none."""
+    if len(data) < HEADER_SIZE + TIMESTAMP_SIZE or not data[2] & FLAG_TIMESTAMP:
+        return None
+    return TIMESTAMP.unpack_from(data, HEADER_SIZE)[0]
+
+
+def parse_ack(data, version):
+    """Return an Ack for an ACK datagram, or None if it is not one."""
+    if version == WIRE_V1:
+        data = bytes(data)
+        return Ack(int(data), ()) if data.isdigit() else None
+    if len(data) < HEADER_SIZE:
+        return None
+    frame_version, frame_type, flags, seq, _, length = HEADER.unpack_from(data)
+    start = HEADER_SIZE + TIMESTAMP_SIZE if flags & FLAG_TIMESTAMP else HEADER_SIZE
+    if frame_version != version or frame_type != FRAME_ACK or len(data) < start + length:
+        return None
+    timestamp = TIMESTAMP.unpack_from(data, HEADER_SIZE)[0] if flags & FLAG_TIMESTAMP else None
+    sack_blocks = ()
+    if flags & FLAG_SACK:
+        sack_blocks = tuple(SACK_BLOCK.unpack_from(data, offset)
+                            for offset in range(start, start + length - length % SACK_BLOCK.size, SACK_BLOCK.size))
+    return Ack(seq - 1, sack_blocks, timestamp)